@@ -0,0 +1,163 @@
+"""
+Micro-benchmark for the git blame --porcelain parser.
+
+Compares git_utils.parse_blame_porcelain() with the previous regex-based parser on
+synthetic porcelain output and reports the parse time and the memory held by the
+resulting blame maps. That both parsers give the same result is checked by
+tests/test_blame_parser.py, on real git output as well.
+
+Usage:
+    python benchmarks/bench_blame_parser.py [--lines N] [--commits N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git_utils
+
+def generate_porcelain(line_count, commit_count, seed=1):
+    """
+    Build git blame --porcelain output for a file of line_count lines
+    touched by commit_count commits.
+    """
+    rng = random.Random(seed)
+    commits = [f"{rng.getrandbits(160):040x}" for _ in range(commit_count)]
+    seen = set()
+    out = []
+    for line_no in range(1, line_count + 1):
+        commit = rng.choice(commits)
+        out.append(f"{commit} {line_no} {line_no} 1")
+        if commit not in seen:
+            seen.add(commit)
+            name = f"Developer {commit[:6]}"
+            out += [
+                f"author {name}", f"author-mail <{commit[:6]}@example.com>",
+                "author-time 1700000000", "author-tz +0000",
+                f"committer {name}", f"committer-mail <{commit[:6]}@example.com>",
+                "committer-time 1700000000", "committer-tz +0000",
+                f"summary Change {commit[:6]}", "filename pam32/dll/pfsproc/proreden.cpp",
+            ]
+        out.append(f"\tint value_{line_no} = compute({line_no}); // source line")
+    return "\n".join(out) + "\n"
+
+def legacy_parse(stdout):
+    """
+    The regex-based parser used before parse_blame_porcelain(), kept as reference
+    (also for tests/test_blame_parser.py).
+    """
+    blame_map = {}
+    commit_info_cache = {}
+    lines = stdout.splitlines()
+    current_line = 0
+    pending_commit = None
+    pending_author = None
+    pending_email = None
+    line_index = 0
+
+    while line_index < len(lines):
+        line = lines[line_index]
+        if re.match(r'^[0-9a-f]{40} ', line):
+            parts = line.split()
+            if len(parts) >= 3:
+                pending_commit = parts[0]
+                try:
+                    current_line = int(parts[2])
+                except ValueError:
+                    current_line = 0
+
+            # Check if we already have info for this commit in our cache
+            if pending_commit in commit_info_cache:
+                pending_author, pending_email = commit_info_cache[pending_commit]
+                line_index += 1  # Increment line index to process next line
+            else:
+                pending_author = "N/A"
+                pending_email = "N/A"
+                line_index += 1  # Increment line index to process next line
+
+                # Save current line index for backtracking
+                start_index = line_index
+
+                # Look for committer and email information
+                committer_found = False
+                email_found = False
+                committer_value = "N/A"
+                email_value = "N/A"
+
+                # First scan through to find committer and email info
+                scan_index = start_index
+                while scan_index < len(lines) and not lines[scan_index].startswith('\t'):
+                    current_line_content = lines[scan_index]
+
+                    if current_line_content.startswith("committer "):
+                        committer_value = current_line_content[10:].strip()
+                        committer_found = True
+                    elif current_line_content.startswith("committer-mail "):
+                        email_value = current_line_content[15:].strip().strip('<>')
+                        email_found = True
+
+                    scan_index += 1
+
+                # Update committer and email information
+                if committer_found:
+                    pending_author = committer_value
+                if email_found:
+                    pending_email = email_value
+
+                # Store author and email info in commit cache
+                commit_info_cache[pending_commit] = (pending_author, pending_email)
+
+                # Continue processing other header information
+                while line_index < len(lines) and not lines[line_index].startswith('\t'):
+                    line_index += 1
+
+            if line_index < len(lines) and lines[line_index].startswith('\t'):
+                if current_line > 0 and pending_commit:
+                    blame_map[current_line] = (pending_author, pending_email, pending_commit)
+                current_line += 1
+                line_index += 1
+            elif current_line > 0 and pending_commit:
+                # If no content line is found but we have line number and commit, add to blame_map anyway
+                blame_map[current_line] = (pending_author, pending_email, pending_commit)
+        else:
+            line_index += 1
+    return blame_map
+
+def measure(func, arg, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = func(arg)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, size
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the git blame porcelain parser.")
+    parser.add_argument("--lines", type=int, default=50000, help="Number of blamed lines (default: 50000)")
+    parser.add_argument("--commits", type=int, default=200, help="Number of distinct commits (default: 200)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions, best is reported (default: 5)")
+    args = parser.parse_args()
+
+    stdout = generate_porcelain(args.lines, args.commits)
+    _, legacy_time, legacy_size = measure(legacy_parse, stdout, args.repeat)
+    _, new_time, new_size = measure(
+        lambda text: git_utils.parse_blame_porcelain(text.splitlines(keepends=True)), stdout, args.repeat)
+
+    print(f"{args.lines} lines, {args.commits} commits, {len(stdout) / 1024 / 1024:.1f} MB of porcelain output")
+    print(f"{'parser':<10} {'time (ms)':>10} {'map memory (KB)':>16}")
+    print(f"{'legacy':<10} {legacy_time * 1000:>10.1f} {legacy_size / 1024:>16.0f}")
+    print(f"{'streaming':<10} {new_time * 1000:>10.1f} {new_size / 1024:>16.0f}")
+    print(f"Speedup: {legacy_time / new_time:.2f}x, memory: {legacy_size / max(new_size, 1):.1f}x smaller")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark for the warning format matcher.
+
+Builds synthetic log lines for every format in warning_parser.WARNING_FORMATS,
+mixed with non-warning build output, and times per format:
+
+    combined     warning_parser.match_warning() (prefilter + one combined regex)
+    sequential   every format's own regex tried in turn, without the prefilter
+
+Both are checked to find the same warnings before anything is reported.
+
+Usage:
+    python benchmarks/bench_formats.py [--lines N] [--warning-density F] [--repeat N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import warning_parser
+
+import log_generator
+
+# Builds one warning line of a format from a random generator
+LINE_BUILDERS = {
+    "msvc": lambda rng, code, message: (
+        f"{log_generator.DRIVE_PREFIX}\\src\\module{rng.randrange(50)}\\file{rng.randrange(500)}.cpp"
+        f"({rng.randrange(1, 5000)},{rng.randrange(1, 80)}): warning {code}: {message} "
+        f"[{log_generator.DRIVE_PREFIX}\\src\\module{rng.randrange(50)}\\module.vcxproj]"),
+    "csc": lambda rng, code, message: (
+        f"CSC : warning CS{rng.randrange(1000, 9999)}: {message} "
+        f"[{log_generator.DRIVE_PREFIX}\\src\\app{rng.randrange(20)}\\app.csproj]"),
+    "cl": lambda rng, code, message: (
+        f"cl : command line warning D90{rng.randrange(10, 99)}: overriding '/W3' with '/W4' "
+        f"[{log_generator.DRIVE_PREFIX}\\src\\module{rng.randrange(50)}\\module.vcxproj]"),
+    "gcc": lambda rng, code, message: (
+        f"src/module{rng.randrange(50)}/file{rng.randrange(500)}.cpp:{rng.randrange(1, 5000)}:"
+        f"{rng.randrange(1, 80)}: warning: {message} [-Wunused-variable]"),
+}
+
+def generate_lines(format_name, line_count, warning_density, seed=1):
+    """
+    Return line_count log lines, a warning_density fraction of them warnings of
+    format_name and the rest ordinary build output.
+    """
+    rng = random.Random(seed)
+    build = LINE_BUILDERS[format_name]
+    lines = []
+    for _ in range(line_count):
+        if rng.random() < warning_density:
+            code = rng.choice(log_generator.WARNING_CODES)
+            line = build(rng, code, log_generator.WARNING_MESSAGES[code])
+        else:
+            line = rng.choice(log_generator.NOISE_LINES).format(
+                source=f"file{rng.randrange(500)}.cpp", project=f"module{rng.randrange(50)}")
+        lines.append(line + "\n")
+    return lines
+
+def match_sequential(patterns, fields, line):
+    """
+    Reference matcher: try every format's own regex in turn.
+    """
+    for name, pattern in patterns:
+        match = pattern.search(line)
+        if match is not None:
+            return tuple((match.group(group) or "N/A").strip() if group else "N/A" for group in fields[name])
+    return None
+
+def measure(func, lines, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [func(line) for line in lines]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the warning format matcher.")
+    parser.add_argument("--lines", type=int, default=200000, help="Log lines per format (default: 200000)")
+    parser.add_argument("--warning-density", type=float, default=0.05,
+                        help="Fraction of lines that are warnings (default: 0.05)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions, best is reported (default: 3)")
+    args = parser.parse_args()
+
+    patterns = [(name, re.compile(regex)) for name, regex in warning_parser.WARNING_FORMATS.items()]
+    fields = warning_parser.warning_format_fields
+    sequential = lambda line: match_sequential(patterns, fields, line)
+
+    print(f"{args.lines} lines per format, warning density {args.warning_density}")
+    print(f"{'format':<8} {'warnings':>9} {'combined (ms)':>14} {'sequential (ms)':>16} {'speedup':>8}")
+    for format_name in LINE_BUILDERS:
+        lines = generate_lines(format_name, args.lines, args.warning_density)
+        combined_keys, combined_time = measure(warning_parser.match_warning, lines, args.repeat)
+        sequential_keys, sequential_time = measure(sequential, lines, args.repeat)
+        if combined_keys != sequential_keys:
+            print(f"Error: matchers disagree on {format_name} lines", file=sys.stderr)
+            sys.exit(1)
+        warnings = sum(key is not None for key in combined_keys)
+        print(f"{format_name:<8} {warnings:>9} {combined_time * 1000:>14.1f} {sequential_time * 1000:>16.1f} "
+              f"{sequential_time / combined_time:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Memory benchmark for the interned warning counts (warning_table.py).
+
+Writes a pair of synthetic MSBuild logs (see log_generator.py) with about --warnings
+warnings each and counts them twice: with the dicts of tuple keys used before
+warning_table.py, kept here as reference, and with comparison.count_warnings().
+Both results are checked to be equal, then the memory held by the counts of both
+logs, the peak memory while counting and the time of counting and diffing are reported.
+With --spill-memory MB, the logs are also compared through sorted runs on disk
+(see external_sort.py) once the counts take more than MB megabytes.
+
+Usage:
+    python benchmarks/bench_warning_table.py [--warnings N] [--files N] [--spill-memory MB] [--work-dir DIR]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import external_sort
+import log_utils
+import warning_parser
+import warning_table
+
+import log_generator
+
+# Fraction of the synthetic log lines that are warnings
+WARNING_DENSITY = 0.5
+
+def legacy_count(log):
+    """
+    The dict-based counting used before warning_table.py, kept as reference.
+    """
+    counts = {}
+    details = {}
+    total = 0
+    for key, text in warning_parser.iter_warnings(log):
+        counts[key] = counts.get(key, 0) + 1
+        total += 1
+        if key not in details:
+            details[key] = text
+    return counts, details, total
+
+def legacy_compare(old_log, new_log):
+    counts1, _, _ = legacy_count(old_log)
+    counts2, details2, _ = legacy_count(new_log)
+    added = [(key, details2[key], count - counts1.get(key, 0))
+             for key, count in counts2.items() if count > counts1.get(key, 0)]
+    return (counts1, counts2, details2), added
+
+def table_compare(old_log, new_log):
+    strings = warning_table.StringTable()
+    counts1, _, _ = comparison.count_warnings(old_log, strings=strings)
+    counts2, details2, _ = comparison.count_warnings(new_log, keep_details=True, strings=strings)
+    return (counts1, counts2, details2), comparison.diff_counts(counts1, counts2, details2)
+
+def external_compare(old_log, new_log, spill_memory_mb):
+    limits = external_sort.SpillLimits(max_memory_mb=spill_memory_mb)
+    added, counts2, _, _ = comparison.compare_logs(old_log, new_log, spill_limits=limits)
+    return (None, counts2, None), added
+
+def measure(func, old_log, new_log):
+    """
+    Run func(old_log, new_log) once untraced for the time, then once under
+    tracemalloc. Returns (result, seconds, retained bytes, peak bytes).
+    """
+    start = time.perf_counter()
+    func(old_log, new_log)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func(old_log, new_log)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, retained, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory of interned warning counts.")
+    parser.add_argument("--warnings", type=int, default=1000000, help="Warnings per synthetic log (default: 1000000)")
+    parser.add_argument("--files", type=int, default=200, help="Source files the warnings are spread over (default: 200)")
+    parser.add_argument("--file-lines", type=int, default=2000, help="Lines per source file (default: 2000)")
+    parser.add_argument("--new-warnings", type=int, default=1000, help="Warnings added to the new log (default: 1000)")
+    parser.add_argument("--spill-memory", type=float, default=0, metavar="MB",
+                        help="Also compare through sorted runs above MB megabytes of counts (default: 0 = not measured)")
+    parser.add_argument("--work-dir", default=None, help="Directory for the generated logs (default: a temporary directory)")
+    args = parser.parse_args()
+    log_utils.setup_logging("quiet")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="comparewarning_table_")
+    try:
+        old_log = os.path.join(work_dir, "old.log")
+        new_log = os.path.join(work_dir, "new.log")
+        paths = [f"src/proj{index % 8}/module{index}.cpp" for index in range(args.files)]
+        line_count = int(args.warnings / WARNING_DENSITY)
+        common = dict(line_count=line_count, warning_density=WARNING_DENSITY, lines_per_file=args.file_lines)
+        if not (os.path.exists(old_log) and os.path.exists(new_log)):
+            print(f"Generating logs ({line_count} lines each)...")
+            log_generator.generate_log(old_log, paths, **common)
+            log_generator.generate_log(new_log, paths, extra_warnings=args.new_warnings, **common)
+
+        (legacy_counts, legacy_added), legacy_time, legacy_retained, legacy_peak = measure(
+            legacy_compare, old_log, new_log)
+        (table_counts, table_added), table_time, table_retained, table_peak = measure(
+            table_compare, old_log, new_log)
+
+        if (table_added != legacy_added or list(table_counts[1].items()) != list(legacy_counts[1].items())
+                or list(table_counts[2].items()) != list(legacy_counts[2].items())):
+            print("Error: dict and table counts disagree", file=sys.stderr)
+            sys.exit(1)
+
+        print(f"{table_counts[1].total} warnings in the new log, {len(table_counts[1])} unique, "
+              f"{len(table_added)} increased")
+        print(f"{'counts':<8} {'time (s)':>9} {'retained (MB)':>14} {'peak (MB)':>10}")
+        print(f"{'dict':<8} {legacy_time:>9.2f} {legacy_retained / 1e6:>14.1f} {legacy_peak / 1e6:>10.1f}")
+        print(f"{'table':<8} {table_time:>9.2f} {table_retained / 1e6:>14.1f} {table_peak / 1e6:>10.1f}")
+        if args.spill_memory > 0:
+            (external_counts, external_added), external_time, external_retained, external_peak = measure(
+                lambda old, new: external_compare(old, new, args.spill_memory), old_log, new_log)
+            if external_added != legacy_added:
+                print("Error: external and dict comparisons disagree", file=sys.stderr)
+                sys.exit(1)
+            print(f"{'external':<8} {external_time:>9.2f} {external_retained / 1e6:>14.1f} {external_peak / 1e6:>10.1f}"
+                  f"  ({len(external_counts[1].runs.paths) if isinstance(external_counts[1], external_sort.ExternalCounts) else 0} runs)")
+        print(f"Memory: {legacy_retained / max(table_retained, 1):.1f}x less retained, "
+              f"{legacy_peak / max(table_peak, 1):.1f}x lower peak")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Synthetic MSBuild/cl build log and git repository generator for benchmarks.
+
+The logs mimic what Visual Studio builds write: "NN>" project prefixes, warnings of the
+form "D:\\bench\\src\\file.cpp(line,col): warning C4267: ... [D:\\bench\\proj.vcxproj]",
+"compiling source file" follow-up lines for warnings in headers, and plenty of
+non-warning noise. The repository contains the source files the warnings point at,
+with a configurable number of commits so git blame has history to walk.
+"""
+import os
+import random
+import subprocess
+
+# Windows root the synthetic log paths start with; maps to the repository root
+DRIVE_PREFIX = "D:\\bench"
+
+WARNING_CODES = ["C4267", "C4244", "C4996", "C4101", "C4018", "C4100", "C4189", "C4305", "C4456", "C4702"]
+
+WARNING_MESSAGES = {
+    "C4267": "'argument': conversion from 'size_t' to 'int', possible loss of data",
+    "C4244": "'=': conversion from 'double' to 'float', possible loss of data",
+    "C4996": "'strcpy': This function or variable may be unsafe. Consider using strcpy_s instead.",
+    "C4101": "'result': unreferenced local variable",
+    "C4018": "'<': signed/unsigned mismatch",
+    "C4100": "'context': unreferenced formal parameter",
+    "C4189": "'count': local variable is initialized but not referenced",
+    "C4305": "'initializing': truncation from 'double' to 'float'",
+    "C4456": "declaration of 'i' hides previous local declaration",
+    "C4702": "unreachable code",
+}
+
+NOISE_LINES = [
+    "  {source}",
+    "  Generating Code...",
+    "  Compiling...",
+    "  {project}.vcxproj -> D:\\bench\\bin\\{project}.dll",
+    "  Creating library D:\\bench\\lib\\{project}.lib and object D:\\bench\\lib\\{project}.exp",
+    "Build started 2/19/2025 1:02:03 AM.",
+    "  All outputs are up-to-date.",
+]
+
+def _run_git(args, cwd):
+    subprocess.run(["git"] + args, cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def generate_repo(root, file_count=50, lines_per_file=2000, history_depth=20, header_ratio=0.2, seed=1):
+    """
+    Create a git repository under root with file_count source files of lines_per_file
+    lines each, and history_depth commits that each rewrite random lines of random files.
+    Returns the list of repository-relative file paths (using '/').
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    _run_git(["init", "-q"], root)
+    _run_git(["config", "user.name", "Bench Author 0"], root)
+    _run_git(["config", "user.email", "author0@example.com"], root)
+    _run_git(["config", "commit.gpgsign", "false"], root)
+
+    paths = []
+    contents = {}
+    header_count = max(1, int(file_count * header_ratio))
+    for index in range(file_count):
+        project = f"proj{index % 8}"
+        if index < header_count:
+            path = f"src/inc/header{index}.hpp"
+        else:
+            path = f"src/{project}/module{index}.cpp"
+        paths.append(path)
+        contents[path] = [f"int value_{index}_{line} = {line}; // line {line}" for line in range(1, lines_per_file + 1)]
+
+    def write_files(changed):
+        for path in changed:
+            full_path = os.path.join(root, *path.split('/'))
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w", encoding="utf-8", newline="\n") as f:
+                f.write("\n".join(contents[path]) + "\n")
+
+    write_files(paths)
+    _run_git(["add", "-A"], root)
+    _run_git(["commit", "-q", "-m", "Initial import"], root)
+
+    for commit in range(1, history_depth + 1):
+        author = commit % 10
+        changed = rng.sample(paths, max(1, len(paths) // 5))
+        for path in changed:
+            lines = contents[path]
+            for _ in range(max(1, len(lines) // 50)):
+                line = rng.randrange(len(lines))
+                lines[line] = f"int changed_{commit}_{line} = {commit}; // commit {commit}"
+        write_files(changed)
+        _run_git(["add", "-A"], root)
+        _run_git(["-c", f"user.name=Bench Author {author}", "-c", f"user.email=author{author}@example.com",
+                  "commit", "-q", "-m", f"Change {commit}"], root)
+    return paths
+
+def to_log_path(path):
+    """
+    Convert a repository-relative path to the Windows path used in the synthetic logs.
+    """
+    return DRIVE_PREFIX + "\\" + path.replace('/', '\\')
+
+def _warning_lines(rng, paths, lines_per_file, compiling_source_ratio):
+    path = rng.choice(paths)
+    code = rng.choice(WARNING_CODES)
+    project = f"proj{rng.randrange(8)}"
+    prefix = f"{rng.randint(1, 99)}>"
+    line = rng.randint(1, lines_per_file)
+    column = rng.randint(1, 80)
+    lines = [f"{prefix}{to_log_path(path)}({line},{column}): warning {code}: {WARNING_MESSAGES[code]} "
+             f"[{DRIVE_PREFIX}\\{project}\\{project}.vcxproj]"]
+    if path.endswith(".hpp") and rng.random() < compiling_source_ratio:
+        source = rng.choice([p for p in paths if p.endswith(".cpp")] or paths)
+        lines.append(f"{prefix}  {to_log_path(source)}: message : compiling source file "
+                     f"'{to_log_path(source)}' [{DRIVE_PREFIX}\\{project}\\{project}.vcxproj]")
+    return lines
+
+def generate_log(filename, paths, line_count=100000, warning_density=0.05, lines_per_file=2000,
+                 compiling_source_ratio=0.5, seed=1, extra_warnings=0):
+    """
+    Write a synthetic MSBuild log of about line_count lines to filename, in which
+    roughly warning_density of the lines are warnings on the given repository paths.
+    extra_warnings additional warnings are appended at random positions, which
+    simulates a newer build that introduced new warnings.
+    Returns the number of warning lines written.
+    """
+    rng = random.Random(seed)
+    extra_rng = random.Random(seed + 1000003)
+    extra_positions = set(extra_rng.sample(range(line_count), min(extra_warnings, line_count)))
+    source_files = [to_log_path(p) for p in paths if p.endswith(".cpp")] or [to_log_path(paths[0])]
+    warning_count = 0
+    with open(filename, "w", encoding="utf-8", newline="\r\n") as f:
+        for index in range(line_count):
+            if rng.random() < warning_density:
+                lines = _warning_lines(rng, paths, lines_per_file, compiling_source_ratio)
+                warning_count += 1
+            else:
+                project = f"proj{rng.randrange(8)}"
+                template = rng.choice(NOISE_LINES)
+                source = os.path.basename(rng.choice(source_files).replace('\\', '/'))
+                lines = [f"{rng.randint(1, 99)}>" + template.format(project=project, source=source)]
+            if index in extra_positions:
+                lines += _warning_lines(extra_rng, paths, lines_per_file, compiling_source_ratio)
+                warning_count += 1
+            f.write("\n".join(lines) + "\n")
+    return warning_count
@@ -0,0 +1,216 @@
+"""
+Benchmark harness for the warning comparator.
+
+Generates a synthetic git repository and a pair of synthetic MSBuild logs (see
+log_generator.py), then times each stage of a comparison separately:
+
+    parse           warning_parser.parse_warnings() on the new log
+    parse_mmap      the same with the memory-mapped scanner
+    parse_parallel  comparison.count_warnings() with the new log split into byte
+                    ranges parsed by --parse-workers processes
+    compare         comparison.compare_warnings() on the old/new pair
+    blame           git_utils.prefetch_blame_maps() for every file with new warnings
+    csv_write       compare_warnings.write_comparison_csv() with blame already cached
+
+Results are written as JSON so runs of different versions can be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--log-lines N] [--warning-density F] [--output FILE]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import blame_cache
+import compare_warnings
+import comparison
+import config
+import git_utils
+import log_utils
+import warning_parser
+
+import log_generator
+
+# Version of the JSON result format
+RESULT_FORMAT_VERSION = 1
+
+def time_stage(func, repeat, setup=None):
+    """
+    Run func repeat times (calling setup before each run, untimed) and return
+    (seconds of every run, result of the last run).
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def summarize(timings, **extra):
+    summary = {
+        "seconds": [round(t, 6) for t in timings],
+        "best": round(min(timings), 6),
+        "mean": round(sum(timings) / len(timings), 6),
+    }
+    summary.update(extra)
+    return summary
+
+def get_tool_revision():
+    """
+    Return the git commit of the comparator itself, so results can be tied to a version.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=False)
+        return result.stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+def clear_blame_caches():
+    git_utils.global_blame_cache.clear()
+    git_utils.global_blame_covered_lines.clear()
+
+def run(args, work_dir):
+    repo_root = os.path.join(work_dir, "repo")
+    old_log = os.path.join(work_dir, "old.log")
+    new_log = os.path.join(work_dir, "new.log")
+    output_folder = os.path.join(work_dir, "output")
+    os.makedirs(output_folder, exist_ok=True)
+
+    print(f"Generating repository ({args.repo_files} files, {args.history_depth} commits)...")
+    paths = log_generator.generate_repo(repo_root, args.repo_files, args.file_lines, args.history_depth, seed=args.seed)
+    print(f"Generating logs ({args.log_lines} lines, warning density {args.warning_density})...")
+    common = dict(line_count=args.log_lines, warning_density=args.warning_density,
+                  lines_per_file=args.file_lines, compiling_source_ratio=args.compiling_source_ratio, seed=args.seed)
+    old_warnings = log_generator.generate_log(old_log, paths, **common)
+    new_warnings = log_generator.generate_log(new_log, paths, extra_warnings=args.new_warnings, **common)
+    log_bytes = os.path.getsize(new_log)
+
+    results = {}
+    repeat = args.repeat
+
+    timings, parsed = time_stage(lambda: warning_parser.parse_warnings(new_log), repeat)
+    results["parse"] = summarize(timings, lines=args.log_lines, warnings=len(parsed),
+                                 mb_per_s=round(log_bytes / 1e6 / min(timings), 2))
+
+    timings, parsed_mmap = time_stage(lambda: warning_parser.parse_warnings(new_log, use_mmap=True), repeat)
+    results["parse_mmap"] = summarize(timings, lines=args.log_lines, warnings=len(parsed_mmap),
+                                      mb_per_s=round(log_bytes / 1e6 / min(timings), 2))
+
+    chunks = len(warning_parser.split_log(new_log, args.parse_workers))
+    timings, counted = time_stage(
+        lambda: comparison.count_warnings(new_log, keep_details=True, parse_workers=args.parse_workers), repeat)
+    results["parse_parallel"] = summarize(timings, workers=args.parse_workers, chunks=chunks, warnings=counted[2],
+                                          mb_per_s=round(log_bytes / 1e6 / min(timings), 2))
+
+    timings, added = time_stage(lambda: comparison.compare_warnings(old_log, new_log), repeat)
+    results["compare"] = summarize(timings, new_warning_types=len(added))
+
+    # The synthetic Windows paths map to the generated repository
+    prefix_length = len(log_generator.DRIVE_PREFIX) + 1
+    lines_by_file = {}
+    for (filepath, line_no, _, _), _, _ in added:
+        lines_by_file.setdefault(filepath, set()).add(line_no)
+    repo_lines = {filepath[prefix_length:].replace('\\', '/'): lines for filepath, lines in lines_by_file.items()}
+
+    timings, _ = time_stage(lambda: git_utils.prefetch_blame_maps(repo_lines, repo_root, args.blame_workers),
+                            repeat, setup=clear_blame_caches)
+    results["blame"] = summarize(timings, files=len(repo_lines))
+
+    # Make the blame maps available under the paths used in the log, so the CSV stage
+    # measures writing only
+    def fill_blame_cache():
+        for filepath in lines_by_file:
+            repo_path = filepath[prefix_length:].replace('\\', '/')
+            git_utils.global_blame_cache[filepath] = git_utils.global_blame_cache.get(repo_path, {})
+            git_utils.global_blame_covered_lines[filepath] = None
+
+    settings = config.get_settings()
+    timings, _ = time_stage(
+        lambda: compare_warnings.write_comparison_csv("bench.log", added, output_folder, repo_root, settings,
+                                                      show_progress=False),
+        repeat, setup=fill_blame_cache)
+    results["csv_write"] = summarize(timings, rows=len(added))
+
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "tool_revision": get_tool_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "log_lines": args.log_lines,
+            "warning_density": args.warning_density,
+            "compiling_source_ratio": args.compiling_source_ratio,
+            "new_warnings": args.new_warnings,
+            "repo_files": args.repo_files,
+            "file_lines": args.file_lines,
+            "history_depth": args.history_depth,
+            "blame_workers": args.blame_workers,
+            "parse_workers": args.parse_workers,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "old_log_warnings": old_warnings,
+            "new_log_warnings": new_warnings,
+            "log_bytes": log_bytes,
+        },
+        "results": results,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the warning comparator on synthetic data.")
+    parser.add_argument("--log-lines", type=int, default=200000, help="Lines per synthetic log (default: 200000)")
+    parser.add_argument("--warning-density", type=float, default=0.05, help="Fraction of log lines that are warnings (default: 0.05)")
+    parser.add_argument("--compiling-source-ratio", type=float, default=0.5,
+                        help="Fraction of header warnings followed by a compiling source line (default: 0.5)")
+    parser.add_argument("--new-warnings", type=int, default=500, help="Warnings added to the new log (default: 500)")
+    parser.add_argument("--repo-files", type=int, default=50, help="Source files in the synthetic repository (default: 50)")
+    parser.add_argument("--file-lines", type=int, default=2000, help="Lines per source file (default: 2000)")
+    parser.add_argument("--history-depth", type=int, default=20, help="Commits in the synthetic repository (default: 20)")
+    parser.add_argument("--blame-workers", type=int, default=config.DEFAULT_BLAME_WORKERS,
+                        help=f"Concurrent git blame processes (default: {config.DEFAULT_BLAME_WORKERS})")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes of the parse_parallel stage (default: number of CPUs)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (default: 3)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON result file (default: benchmark_results.json)")
+    parser.add_argument("--work-dir", default=None, help="Directory for generated data (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated data")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    # Keep console output from the stages out of the timings
+    log_utils.setup_logging("quiet")
+    config.set_settings(config.load_settings(log_level="quiet"))
+    blame_cache.configure(enabled=False)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="comparewarning_bench_")
+    try:
+        report = run(args, work_dir)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'stage':<14} {'best (s)':>10} {'mean (s)':>10}")
+    for stage, result in report["results"].items():
+        print(f"{stage:<14} {result['best']:>10.4f} {result['mean']:>10.4f}")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import json
+import os
+import sqlite3
+import subprocess
+import time
+import zlib
+
+import log_utils
+
+logger = log_utils.get_logger("blame_cache")
+
+# Default location of the persistent blame cache database
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.blame_cache')
+CACHE_FILENAME = 'blame_cache.sqlite3'
+
+# Default size limit of the cache database in MB; least recently used entries are evicted above it
+DEFAULT_MAX_CACHE_MB = 256
+
+# Number of paths passed to one git ls-tree / git diff call
+GIT_PATH_BATCH_SIZE = 500
+
+# Persistent cache settings, changed by configure()
+cache_settings = {
+    'enabled': False,
+    'cache_dir': DEFAULT_CACHE_DIR,
+    'max_bytes': DEFAULT_MAX_CACHE_MB * 1024 * 1024,
+}
+
+# Hit/miss counters for the current process
+cache_stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+# SQLite connection of the current process, opened on first use
+_connection = None
+_connection_pid = None
+
+def configure(cache_dir=None, max_mb=DEFAULT_MAX_CACHE_MB, enabled=True):
+    """
+    Enable or disable the persistent blame cache and set its location and size limit.
+    The database itself is opened lazily, so this is safe to call before forking workers.
+    """
+    global _connection
+    cache_settings['enabled'] = enabled
+    cache_settings['cache_dir'] = cache_dir or DEFAULT_CACHE_DIR
+    cache_settings['max_bytes'] = int(max_mb * 1024 * 1024)
+    _connection = None
+
+def is_enabled():
+    return cache_settings['enabled']
+
+def get_cache_path():
+    return os.path.join(cache_settings['cache_dir'], CACHE_FILENAME)
+
+def _get_connection():
+    """
+    Return the SQLite connection of this process, creating the database if needed.
+    Returns None (and disables the cache) if the database cannot be opened.
+    """
+    global _connection, _connection_pid
+    if _connection is not None and _connection_pid == os.getpid():
+        return _connection
+    try:
+        os.makedirs(cache_settings['cache_dir'], exist_ok=True)
+        connection = sqlite3.connect(get_cache_path(), timeout=30)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS blame ("
+            " cache_key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " covered TEXT,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS blame_last_used ON blame (last_used)")
+        connection.commit()
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Warning: Could not open blame cache '{get_cache_path()}': {e}. Persistent blame cache disabled.")
+        cache_settings['enabled'] = False
+        return None
+    _connection = connection
+    _connection_pid = os.getpid()
+    return _connection
+
+def _run_git(args, repo_root):
+    """
+    Run a git command in repo_root and return its stdout, or None on failure.
+    """
+    try:
+        result = subprocess.run(
+            ["git"] + args,
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            check=False,
+            stdin=subprocess.DEVNULL,
+        )
+    except (OSError, ValueError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+def get_blob_ids(paths_for_git, repo_root):
+    """
+    Look up the git blob ID at HEAD of each repository-relative path with batched
+    git ls-tree calls. Paths that are not tracked, lie outside the repository or have
+    uncommitted changes in the working tree are left out, because their blame can
+    differ from the blame of the blob at HEAD.
+    Returns a map: path -> blob ID.
+    """
+    paths = sorted({path for path in paths_for_git
+                    if path and not os.path.isabs(path) and not path.startswith('../')})
+    blob_ids = {}
+    modified = set()
+    for start in range(0, len(paths), GIT_PATH_BATCH_SIZE):
+        batch = paths[start:start + GIT_PATH_BATCH_SIZE]
+        output = _run_git(["ls-tree", "-z", "--full-name", "HEAD", "--"] + batch, repo_root)
+        if output is None:
+            continue
+        for entry in output.split('\0'):
+            if not entry or '\t' not in entry:
+                continue
+            info, path = entry.split('\t', 1)
+            parts = info.split()
+            if len(parts) == 3 and parts[1] == 'blob':
+                blob_ids[path] = parts[2]
+        output = _run_git(["diff", "--name-only", "-z", "HEAD", "--"] + batch, repo_root)
+        if output:
+            modified.update(path for path in output.split('\0') if path)
+
+    # Only keep files whose working tree matches HEAD
+    result = {}
+    for path in paths:
+        blob_id = blob_ids.get(path)
+        if blob_id and path not in modified:
+            result[path] = blob_id
+    return result
+
+def make_cache_key(path_for_git, blob_id):
+    """
+    Build the cache key of a file. The blob ID changes whenever the content changes;
+    the path is part of the key because files with identical content can still have
+    different histories and therefore different blame.
+    """
+    return f"{blob_id}:{path_for_git}"
+
+def _encode(blame_map):
+    commits = {}
+    lines = {}
+    for line_no, (author, email, commit_hash) in blame_map.items():
+        commits[commit_hash] = [author, email]
+        lines[line_no] = commit_hash
+    return zlib.compress(json.dumps({'commits': commits, 'lines': lines}).encode('utf-8'))
+
+def _decode(data):
+    decoded = json.loads(zlib.decompress(data).decode('utf-8'))
+    # Share one record per commit between all lines blamed to it
+    records = {commit_hash: (author, email, commit_hash)
+               for commit_hash, (author, email) in decoded['commits'].items()}
+    return {int(line_no): records[commit_hash] for line_no, commit_hash in decoded['lines'].items()}
+
+def lookup(cache_key, lines=None):
+    """
+    Look up the cached blame of a file by its cache key.
+    lines is the set of line numbers needed, or None if the whole file is needed.
+    Returns (blame_map, covered_lines) or None, where covered_lines is None if the whole
+    file is cached. The lookup counts as a hit only if all needed lines are cached; a
+    partial entry is still returned so only the missing lines have to be blamed.
+    """
+    connection = _get_connection() if is_enabled() else None
+    if connection is None:
+        return None
+    try:
+        row = connection.execute("SELECT data, covered FROM blame WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row is None:
+            cache_stats['misses'] += 1
+            return None
+        blame_map = _decode(row[0])
+        covered = None if row[1] is None else set(json.loads(row[1]))
+        connection.execute("UPDATE blame SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+        connection.commit()
+    except (sqlite3.Error, ValueError, zlib.error) as e:
+        logger.warning(f"Warning: Error reading blame cache: {e}")
+        cache_stats['misses'] += 1
+        return None
+
+    if covered is None or (lines is not None and lines <= covered):
+        cache_stats['hits'] += 1
+    else:
+        cache_stats['misses'] += 1
+    return blame_map, covered
+
+def store(cache_key, blame_map, covered=None):
+    """
+    Save the blame map of a file under its cache key. covered is the set of line numbers the map covers,
+    or None if the whole file was blamed. Partial entries are merged with lines cached
+    earlier for the same key.
+    """
+    connection = _get_connection() if is_enabled() else None
+    if connection is None:
+        return
+    try:
+        if covered is not None:
+            row = connection.execute("SELECT data, covered FROM blame WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is not None:
+                if row[1] is None:
+                    # The whole file is cached already
+                    return
+                blame_map = {**_decode(row[0]), **blame_map}
+                covered = set(covered) | set(json.loads(row[1]))
+        data = _encode(blame_map)
+        covered_json = None if covered is None else json.dumps(sorted(covered))
+        size = len(data) + len(covered_json or '') + len(cache_key)
+        connection.execute(
+            "INSERT OR REPLACE INTO blame (cache_key, data, covered, size, last_used) VALUES (?, ?, ?, ?, ?)",
+            (cache_key, data, covered_json, size, time.time()),
+        )
+        connection.commit()
+        cache_stats['stored'] += 1
+    except (sqlite3.Error, ValueError, zlib.error) as e:
+        logger.warning(f"Warning: Error writing blame cache: {e}")
+
+def evict():
+    """
+    Delete the least recently used entries until the cache is below its size limit.
+    """
+    connection = _get_connection() if is_enabled() else None
+    if connection is None:
+        return
+    try:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM blame").fetchone()[0]
+        if total <= cache_settings['max_bytes']:
+            return
+        to_delete = []
+        for cache_key, size in connection.execute("SELECT cache_key, size FROM blame ORDER BY last_used"):
+            if total <= cache_settings['max_bytes']:
+                break
+            to_delete.append((cache_key,))
+            total -= size
+        connection.executemany("DELETE FROM blame WHERE cache_key = ?", to_delete)
+        connection.commit()
+        cache_stats['evicted'] += len(to_delete)
+    except sqlite3.Error as e:
+        logger.warning(f"Warning: Error evicting blame cache entries: {e}")
+
+def reset_stats():
+    for name in cache_stats:
+        cache_stats[name] = 0
+
+def add_stats(stats):
+    """
+    Add counters collected in another process to this process's counters.
+    """
+    for name, value in stats.items():
+        cache_stats[name] = cache_stats.get(name, 0) + value
+
+def format_stats():
+    return (f"Blame cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['stored']} stored, {cache_stats['evicted']} evicted ({get_cache_path()})")
@@ -1,29 +1,601 @@
+import argparse
+import contextlib
+import cProfile
 import csv
+import dataclasses
+import io
+import json
+import logging
 import sys
 import os
+import sqlite3
 import datetime
-import configparser
+import functools
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from log_utils import ProgressReporter
 # Removed subprocess, re imports as they are now in other modules
 
 # Import the new utility modules
 import git_utils
 import warning_parser
 import comparison
+import blame_cache
+import config
+import diff_attribution
+import follow
+import external_sort
+import snapshot
+import history
+import log_utils
+import path_resolver
+import warning_filter
 
-def read_config():
-    config = configparser.ConfigParser()
+logger = log_utils.get_logger("compare_warnings")
+
+# Column header of the output CSV files
+CSV_HEADER = ["Committer", "E-Mail", "Commit URL", "Warning keyword", "Message", "Project", "Compiling Source", "File path", "Line", "Column", "Repeat Count"]
+
+# Names of the log files to compare, read from the current directory
+LOG_LIST_FILENAME = "compare.config"
+
+# Files written to the output folder by --profile and --profile-cprofile
+METRICS_FILENAME = "metrics.json"
+CPROFILE_FILENAME = "profile.pstats"
+
+# Minimum number of seconds between two rewrites of a live CSV file in --follow mode;
+# a change is written at most this long after it happened
+LIVE_CSV_INTERVAL = 2.0
+
+def parse_args(argv=None):
+    """
+    Parse command-line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Compare warnings between two folders of build logs.",
+        usage="python compare_warnings.py [options] <old_folder> <new_folder>",
+    )
+    parser.add_argument("old_folder", help="Folder containing the original log files")
+    parser.add_argument("new_folder", help="Folder containing the updated log files")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Scan logs with the memory-mapped fast path (faster on logs that are mostly non-warning lines)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="Number of worker processes used to compare log files in parallel (0 = number of CPUs, default: 1)")
+    parser.add_argument("--parse-workers", type=int, default=None, metavar="N",
+                        help="Split each large log into byte ranges parsed by N worker processes "
+                             "(0 = number of CPUs, default: 1); not used with --jobs or --follow")
+    parser.add_argument("--spill-keys", type=int, default=None, metavar="N",
+                        help="Compare through sorted runs on disk once both logs together have more than N distinct "
+                             "warnings (default: 0 = no key limit); not used with --jobs, --follow or --match-moved")
+    parser.add_argument("--spill-memory", dest="spill_memory_mb", type=float, default=None, metavar="MB",
+                        help="Compare through sorted runs on disk once the warning counts of both logs take more "
+                             f"than MB megabytes (default: {external_sort.DEFAULT_SPILL_MEMORY_MB}, 0 = no memory limit)")
+    parser.add_argument("--spill-dir", default=None, metavar="DIR",
+                        help="Directory for the temporary sorted runs (default: the system temporary directory)")
+    parser.add_argument("--blame-workers", type=int, default=None, metavar="N",
+                        help=f"Maximum number of concurrent git blame processes (default: {config.DEFAULT_BLAME_WORKERS})")
+    parser.add_argument("--no-blame-cache", action="store_true",
+                        help="Do not read or write the persistent git blame cache")
+    parser.add_argument("--blame-cache-dir", default=blame_cache.DEFAULT_CACHE_DIR, metavar="DIR",
+                        help="Directory of the persistent git blame cache (default: .blame_cache next to this script)")
+    parser.add_argument("--blame-cache-size", type=float, default=blame_cache.DEFAULT_MAX_CACHE_MB, metavar="MB",
+                        help=f"Size limit of the persistent git blame cache in MB (default: {blame_cache.DEFAULT_MAX_CACHE_MB})")
+    parser.add_argument("--config", dest="common_config", default=None, metavar="PATH",
+                        help=f"Path of the global settings file (default: common.config next to this script, or ${config.ENV_CONFIG_PATH})")
+    parser.add_argument("--debug", action="store_true", default=None,
+                        help="Enable debug output (overrides enableDebug in common.config)")
+    parser.add_argument("--log-level", choices=list(log_utils.LOG_LEVELS), default=None,
+                        help="Console verbosity: quiet (warnings and errors only), normal (default), "
+                             "verbose (also every parsed warning) or debug")
+    parser.add_argument("-q", "--quiet", dest="log_level", action="store_const", const="quiet",
+                        help="Same as --log-level quiet")
+    parser.add_argument("-v", "--verbose", dest="log_level", action="store_const", const="verbose",
+                        help="Same as --log-level verbose")
+    parser.add_argument("--commit-url-prefix", default=None, metavar="URL",
+                        help="Prefix for commit URLs in the CSV (overrides COMMIT_URL_PREFIX in common.config)")
+    parser.add_argument("--path-map", action="append", default=None, metavar="FROM=TO",
+                        help="Map build machine paths starting with FROM to TO (relative to the repository root), "
+                             "e.g. \"D:\\pam=.\"; can be repeated (default: PATH_PREFIX_MAP in common.config)")
+    parser.add_argument("--old-rev", default=None, metavar="REV",
+                        help="Revision the old logs were built from. Attributes new warnings from the changes "
+                             "in OLD_REV..NEW_REV with a single git log call instead of git blame")
+    parser.add_argument("--new-rev", default=None, metavar="REV",
+                        help="Revision the new logs were built from (default: HEAD, used with --old-rev)")
+    parser.add_argument("--follow", action="store_true",
+                        help="Follow the new logs while the build is still writing them and report new warnings as soon as "
+                             "they exceed the old log's count. Stops at the end of the MSBuild summary or after --follow-timeout")
+    parser.add_argument("--follow-timeout", type=float, default=follow.DEFAULT_IDLE_TIMEOUT, metavar="SECONDS",
+                        help=f"Stop following a log when nothing was written to it for SECONDS (default: {follow.DEFAULT_IDLE_TIMEOUT})")
+    parser.add_argument("--history-db", nargs="?", const=history.DEFAULT_HISTORY_PATH, default=None, metavar="PATH",
+                        help="Also record the parsed warnings, new warnings and committers of this run in a SQLite "
+                             "history database (default PATH: .history/warnings.sqlite3 next to this script); see history.py")
+    parser.add_argument("--match-moved", action="store_true", default=None,
+                        help="Do not report warnings that only moved to another line (e.g. after lines were inserted above them) "
+                             "as new. With --old-rev, old line numbers are first mapped through git diff OLD_REV NEW_REV")
+    parser.add_argument("--include-path", action="append", default=None, metavar="PATH",
+                        help="Only compare warnings in files under PATH, e.g. pam32/dll/pfsproc (whole path components, "
+                             "matched anywhere in the path); can be repeated (default: INCLUDE_PATHS in common.config)")
+    parser.add_argument("--exclude-path", action="append", default=None, metavar="PATH",
+                        help="Do not compare warnings in files under PATH; can be repeated "
+                             "(default: EXCLUDE_PATHS in common.config)")
+    parser.add_argument("--include-project", action="append", default=None, metavar="PROJECT",
+                        help="Only compare warnings of projects under PROJECT, e.g. pfsproc.vcxproj or pam32/dll; "
+                             "can be repeated (default: INCLUDE_PROJECTS in common.config)")
+    parser.add_argument("--exclude-project", action="append", default=None, metavar="PROJECT",
+                        help="Do not compare warnings of projects under PROJECT; can be repeated "
+                             "(default: EXCLUDE_PROJECTS in common.config)")
+    parser.add_argument("--include-code", action="append", default=None, metavar="CODE",
+                        help="Only compare warnings with the code CODE, e.g. C4267; can be repeated "
+                             "(default: INCLUDE_CODES in common.config)")
+    parser.add_argument("--exclude-code", action="append", default=None, metavar="CODE",
+                        help="Do not compare warnings with the code CODE; can be repeated "
+                             "(default: EXCLUDE_CODES in common.config)")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Write the wall and CPU time of every stage, counters and the peak memory to "
+                             f"{METRICS_FILENAME} in the output folder (memory tracing slows the run down)")
+    parser.add_argument("--profile-cprofile", action="store_true",
+                        help=f"With --profile, also write a cProfile dump of this process to {CPROFILE_FILENAME} "
+                             "in the output folder (read it with python -m pstats)")
+    return parser.parse_args(argv)
+
+def parse_rule_args(values):
+    """
+    Return the filter rules given with a repeatable flag (each value may hold several
+    rules, see warning_filter.parse_rules()), or None if the flag was not used.
+    """
+    return warning_filter.parse_rules(";".join(values)) if values else None
+
+def read_log_names(config_filename=None):
+    """
+    Read the log file names to compare from config_filename (default: LOG_LIST_FILENAME
+    in the current directory): one or more comma-separated names per line, with
+    empty lines and lines starting with '#' skipped. Raises OSError if it cannot be read.
+    """
+    with open(config_filename or LOG_LIST_FILENAME, "r", encoding="utf-8") as f:
+        config_content = f.read()
+    files = []
+    for line in config_content.splitlines():
+        line = line.strip()
+        if line == "" or line.startswith("#"): # Skip empty lines and comments
+            continue
+        # Support comma-separated values in one line.
+        if "," in line:
+            parts = line.split(",")
+            for part in parts:
+                part_stripped = part.strip()
+                if part_stripped: # Avoid adding empty strings if there are trailing commas
+                    files.append(part_stripped)
+        else:
+            if line: # Avoid adding empty strings from blank lines
+                files.append(line)
+    return files
+
+def make_csv_row(key, text, extra, blame_map, commit_url_prefix, info=None):
+    """
+    Build the CSV row of one new warning, taking the committer from blame_map.
+    info is the (project path, compiling source) stored with the warning when it was
+    parsed (see comparison.diff_counts()); if None, they are extracted from text.
+    """
+    filepath, line_no, column, warning_code = key
+    if info is None:
+        info = warning_parser.extract_warning_info(text)
+    project, compiling_source = info
+
+    author = "N/A"
+    email = "N/A"
+    commit_hash = "N/A"
+    if filepath != "N/A" and line_no != "N/A":
+        try:
+            line_int = int(line_no)
+            if line_int in blame_map:
+                author, email, commit_hash = blame_map[line_int]
+        except Exception:
+            pass
+    # else: Git not found or N/A path/line, author/email/commit remain "N/A"
+
+    # Prepare the commit information for display (either hash or full URL)
+    commit_display_info = commit_hash # Default to hash or "N/A"
+    if commit_url_prefix and commit_hash != "N/A":
+        commit_display_info = commit_url_prefix + commit_hash
+
+    return [author, email, commit_display_info, warning_code, text, project, compiling_source, filepath, line_no, column, extra]
+
+def iter_csv_rows(added_warnings, repo_root, settings, infos=None):
+    """
+    Yield the CSV row of every new warning in added_warnings, in order, looking up
+    the committer of each warning line with git blame. infos maps keys to their
+    (project path, compiling source), as filled by comparison.diff_counts().
+    Blame information for all affected files is prefetched concurrently,
+    using up to settings.blame_workers git processes, before the first row.
+    If settings.old_rev is set, committers come from the changes in
+    old_rev..new_rev instead (see diff_attribution) and git blame is not run.
+    """
+    if not added_warnings:
+        return
+    infos = infos or {}
+    debug_enabled = settings.enable_debug
+    commit_url_prefix = settings.commit_url_prefix
+    # Blame every affected file up front so the row loop never waits on git
+    # Only the lines that have new warnings are blamed in each file
+    lines_by_file = {}
+    for (filepath, line_no, _, _), _, _ in added_warnings:
+        lines_by_file.setdefault(filepath, set()).add(line_no)
+    if not settings.old_rev:
+        logger.info(f"Prefetching git blame info for {len(lines_by_file)} files...")
+        git_utils.prefetch_blame_maps(lines_by_file, repo_root, settings.blame_workers)
+
+    # Create a cache dictionary to store blame information for files
+    local_blame_cache = {}
+    logger.info(f"Starting to process warnings, creating local blame cache...")
+
+    # Iterate through the identified new/increased warnings
+    for key, text, extra in added_warnings:
+        filepath = key[0]
+        # Get blame map from cache, if not exists then load and cache it
+        if filepath != "N/A" and filepath not in local_blame_cache:
+            if debug_enabled:
+                logger.debug(f"Local cache miss: File '{filepath}' not in local cache, calling git_utils to get blame info")
+            if settings.old_rev:
+                local_blame_cache[filepath] = diff_attribution.get_blame_map_for_file(
+                    filepath, repo_root, settings.old_rev, settings.new_rev)
+            else:
+                local_blame_cache[filepath] = git_utils.get_blame_map_for_file(filepath, repo_root, lines_by_file[filepath])
+        elif filepath != "N/A" and debug_enabled:
+            logger.debug(f"Local cache hit: Getting blame info for file '{filepath}' from local cache")
+
+        # The row includes author, email, and the commit display info
+        yield make_csv_row(key, text, extra, local_blame_cache.get(filepath, {}), commit_url_prefix, infos.get(key))
+
+def write_comparison_csv(log_filename, added_warnings, output_folder, repo_root, settings, show_progress=True,
+                         infos=None):
+    """
+    Write the new warnings of one log file to a CSV file in output_folder,
+    with the committer of each warning line (see iter_csv_rows(), also for infos).
+    Returns the rows written (without the header), or None if writing failed.
+    """
+    total_added_count = sum(extra for _, _, extra in added_warnings) # Sum of counts, not types
+
+    # Construct output filename with .csv extension.
+    base = os.path.splitext(warning_parser.strip_compressed_extension(log_filename))[0]
+    # Use total count in filename
+    output_filename = f"{base}_new_warning_{total_added_count}.csv"
+    output_filepath = os.path.join(output_folder, output_filename)
+
+    logger.info(f"Writing results to {output_filepath}...")
+    rows = []
+
+    # Write the CSV content into the output file.
     try:
-        # Use absolute path to read config file
-        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common.config')
-        config.read(config_path)
-        commit_url_prefix = config.get('DEFAULT', 'COMMIT_URL_PREFIX', fallback="")
-        # Remove quotes if present
-        if commit_url_prefix.startswith('"') and commit_url_prefix.endswith('"'):
-            commit_url_prefix = commit_url_prefix[1:-1]
-        return {'COMMIT_URL_PREFIX': commit_url_prefix}
+        with log_utils.Stage("write", logger, log=log_filename) as stage, open(output_filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+            # Header remains the same conceptually, but the content will be a URL if prefix is set
+            writer.writerow(CSV_HEADER)
+
+            # Only the header is written if there are no new warnings
+            if added_warnings:
+                progress = ProgressReporter(len(added_warnings), enabled=show_progress and logger.isEnabledFor(logging.INFO))
+                for processed_count, row in enumerate(iter_csv_rows(added_warnings, repo_root, settings, infos), 1):
+                    writer.writerow(row)
+                    rows.append(row)
+                    # Display progress bar (redrawn at most a few times per second)
+                    progress.update(processed_count)
+                progress.finish()
+            log_utils.add_counts(rows_written=len(rows))
+            blamed_files = {key[0] for key, _, _ in added_warnings if key[0] != "N/A"}
+            stage.counts.update(rows=len(added_warnings), files=len(blamed_files))
+
+        logger.info(f"Comparison result for '{log_filename}' ({total_added_count} total new warnings across {len(added_warnings)} types) written to '{output_filepath}'.")
+
+    except IOError as e:
+        logger.error(f"Error writing output file '{output_filepath}': {e}")
+        return None
     except Exception as e:
-        print(f"Warning: Error reading common.config: {e}", file=sys.stderr)
-        return {'COMMIT_URL_PREFIX': ""}
+        logger.error(f"An unexpected error occurred while processing '{log_filename}': {e}")
+        return None
+    return rows
+
+def run_captured(log_level, func, *args, **kwargs):
+    """
+    Run func and return (result, output, metrics), where output is everything the
+    call logged or printed to stdout and stderr. Collecting the output per worker task
+    keeps the console readable when several logs are processed at once.
+    metrics are the stage timings and counters of the call, for log_utils.merge_metrics().
+    Logging is set up with log_level first, since worker processes may start fresh.
+    """
+    log_utils.setup_logging(log_level)
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        result, metrics = log_utils.call_with_metrics(func, *args, **kwargs)
+    return result, buffer.getvalue(), metrics
+
+def write_comparison_csv_worker(cache_settings, log_filename, added_warnings, output_folder, repo_root, settings,
+                                return_rows=False, infos=None):
+    """
+    Worker-process entry point for write_comparison_csv(). Applies the settings and
+    blame cache settings of the main process and returns the blame cache counters of
+    this task, and the written rows if return_rows is True (otherwise None).
+    """
+    config.set_settings(settings)
+    blame_cache.cache_settings.update(cache_settings)
+    blame_cache.reset_stats()
+    rows = write_comparison_csv(log_filename, added_warnings, output_folder, repo_root, settings, show_progress=False,
+                                infos=infos)
+    return dict(blame_cache.cache_stats), rows if return_rows else None
+
+def print_prefixed(prefix, output):
+    """
+    Print collected worker output with a per-log prefix on every line.
+    """
+    for line in output.splitlines():
+        if line.strip():
+            print(f"[{prefix}] {line}")
+
+def compare_pairs_serial(pairs, output_folder, repo_root, settings, line_map=None, recorder=None):
+    """
+    Compare log file pairs one after another in this process.
+    line_map is passed on to comparison.match_counts() if settings.match_moved is set.
+    recorder, if given, is called for every pair as
+    recorder(log_filename, old_file, new_file, counts2, total1, total2, rows) (see history.py).
+    """
+    spill_limits = external_sort.SpillLimits(settings.spill_keys, settings.spill_memory_mb, settings.spill_dir or None)
+    # Process each log file specified in the configuration file.
+    for log_filename, old_file, new_file in pairs:
+        logger.info(f"\nComparing '{log_filename}':")
+        logger.info(f"  Old log: {old_file}")
+        logger.info(f"  New log: {new_file}")
+
+        # Call the function from the comparison module
+        infos = {}
+        added_warnings, counts2, total1, total2 = comparison.compare_logs(
+            old_file, new_file, use_mmap=settings.use_mmap, match_moved=settings.match_moved, line_map=line_map,
+            parse_workers=settings.parse_workers, spill_limits=spill_limits,
+            warning_filter=warning_filter.get_filter(settings), infos=infos)
+
+        if not added_warnings:
+            logger.info(f"No new warnings found for '{log_filename}'.")
+            # Let's create the CSV even if empty for consistency
+
+        rows = write_comparison_csv(log_filename, added_warnings, output_folder, repo_root, settings, infos=infos)
+        if recorder is not None and rows is not None:
+            recorder(log_filename, old_file, new_file, counts2, total1, total2, rows)
+
+def compare_pairs_parallel(pairs, output_folder, repo_root, settings, jobs, line_map=None, recorder=None):
+    """
+    Compare several log file pairs using a pool of worker processes.
+    The old and new log of every pair are parsed as separate tasks, so all logs
+    are parsed concurrently. Once both sides of a pair are parsed, the counts are
+    compared and the CSV writing (including git blame) is queued as another task.
+    Console output of every task is collected and printed with a per-log prefix.
+    line_map and recorder are used as in compare_pairs_serial().
+    """
+    logger.info(f"\nComparing {len(pairs)} log file(s) using {jobs} worker processes...")
+    rules = warning_filter.get_filter(settings)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # Queue parsing of every old and new log up front.
+        parse_futures = []
+        for log_filename, old_file, new_file in pairs:
+            old_future = executor.submit(run_captured, settings.log_level, comparison.count_warnings, old_file, settings.use_mmap, settings.match_moved,
+                                         warning_filter=rules)
+            new_future = executor.submit(run_captured, settings.log_level, comparison.count_warnings, new_file, settings.use_mmap, True,
+                                         warning_filter=rules)
+            parse_futures.append((log_filename, old_file, new_file, old_future, new_future))
+
+        # Compare each pair once both of its logs are parsed and queue the CSV writing.
+        write_futures = []
+        for log_filename, old_file, new_file, old_future, new_future in parse_futures:
+            (counts1, details1, total1), old_output, old_metrics = old_future.result()
+            (counts2, details2, total2), new_output, new_metrics = new_future.result()
+            log_utils.merge_metrics(old_metrics)
+            log_utils.merge_metrics(new_metrics)
+            logger.info(f"\nComparing '{log_filename}':")
+            logger.info(f"  Old log: {old_file}")
+            logger.info(f"  New log: {new_file}")
+            print_prefixed(log_filename, old_output)
+            logger.info(f"[{log_filename}] Found {total1} warnings in {old_file}.")
+            print_prefixed(log_filename, new_output)
+            logger.info(f"[{log_filename}] Found {total2} warnings in {new_file}.")
+
+            # Only the project and compiling source of the new warnings go to the CSV task
+            infos = {}
+            if settings.match_moved:
+                added_warnings = comparison.match_counts(counts1, details1, counts2, details2, line_map, infos)
+            else:
+                added_warnings = comparison.diff_counts(counts1, counts2, details2, infos)
+            logger.info(f"[{log_filename}] Found {len(added_warnings)} types of warnings with increased counts in {os.path.basename(new_file)}.")
+            if not added_warnings:
+                logger.info(f"[{log_filename}] No new warnings found for '{log_filename}'.")
+
+            write_future = executor.submit(
+                run_captured, settings.log_level, write_comparison_csv_worker, dict(blame_cache.cache_settings),
+                log_filename, added_warnings, output_folder, repo_root, settings, recorder is not None, infos)
+            write_futures.append((log_filename, old_file, new_file, counts2 if recorder else None, total1, total2, write_future))
+
+        for log_filename, old_file, new_file, counts2, total1, total2, write_future in write_futures:
+            (cache_stats, rows), output, metrics = write_future.result()
+            log_utils.merge_metrics(metrics)
+            print_prefixed(log_filename, output)
+            blame_cache.add_stats(cache_stats)
+            if recorder is not None and rows is not None:
+                recorder(log_filename, old_file, new_file, counts2, total1, total2, rows)
+
+def get_live_blame_map(filepath, repo_root, settings):
+    """
+    Return the blame information of filepath available without waiting on git:
+    the attribution index with --old-rev, otherwise what has been blamed so far.
+    """
+    if settings.old_rev:
+        return diff_attribution.get_blame_map_for_file(filepath, repo_root, settings.old_rev, settings.new_rev)
+    return git_utils.global_blame_cache.get(filepath, {})
+
+def write_live_csv(output_filepath, added_warnings, repo_root, settings, infos=None):
+    """
+    Rewrite the live CSV file of a followed log with the current new warnings.
+    The file is replaced atomically, so readers never see a half-written file.
+    infos is used as in iter_csv_rows().
+    """
+    infos = infos or {}
+    temp_filepath = output_filepath + ".tmp"
+    try:
+        with open(temp_filepath, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+            writer.writerow(CSV_HEADER)
+            for key, text, extra in added_warnings:
+                blame_map = get_live_blame_map(key[0], repo_root, settings) if key[0] != "N/A" else {}
+                writer.writerow(make_csv_row(key, text, extra, blame_map, settings.commit_url_prefix, infos.get(key)))
+        os.replace(temp_filepath, output_filepath)
+    except OSError as e:
+        logger.error(f"Error writing live output file '{output_filepath}': {e}")
+
+def write_live_csv_of(live, output_filepath, repo_root, settings):
+    """
+    Rewrite the live CSV file with the current new warnings of live (a follow.LiveComparison).
+    """
+    write_live_csv(output_filepath, live.added_warnings(), repo_root, settings, live.infos)
+
+def follow_pair(log_filename, old_file, new_file, output_folder, repo_root, settings, blamer, stop_event, idle_timeout,
+                line_map=None, infos=None):
+    """
+    Compare a new log that is still being written against its old log.
+    The old log is parsed first as the baseline; the new log is then read as it grows.
+    As soon as a warning's count exceeds the baseline it is printed, queued for
+    blaming in the background, and the live CSV file of the log is updated.
+    Returns (added, counts2, total1, total2) like comparison.compare_logs(); with
+    settings.match_moved, moved warnings are matched once the log is complete.
+    infos is filled like in comparison.compare_logs().
+    """
+    rules = warning_filter.get_filter(settings)
+    counts1, details1, total1 = comparison.count_warnings(old_file, settings.use_mmap, settings.match_moved,
+                                                          warning_filter=rules)
+    logger.info(f"[{log_filename}] Found {total1} warnings in {old_file}. Following {new_file}...")
+
+    live = follow.LiveComparison(counts1)
+    base = os.path.splitext(warning_parser.strip_compressed_extension(log_filename))[0]
+    live_filepath = os.path.join(output_folder, f"{base}_new_warning_live.csv")
+    # The live CSV file is rewritten in the background when a warning goes above the
+    # baseline or one of its files has been blamed, without waiting for the next log line
+    writer = follow.LiveWriter(functools.partial(write_live_csv_of, live, live_filepath, repo_root, settings),
+                               LIVE_CSV_INTERVAL)
+    # Files of the new warnings, whose blame results update the live CSV file
+    new_files = set()
+
+    def on_blamed(filepath):
+        if filepath in new_files:
+            writer.notify()
+
+    if blamer is not None:
+        blamer.add_listener(on_blamed)
+    try:
+        with log_utils.Stage("follow", logger, log=new_file) as stage:
+            if os.path.exists(new_file) and warning_parser.get_compressed_opener(new_file) is not None:
+                # A compressed log is complete already and cannot be tailed
+                warnings = warning_parser.iter_warnings(new_file, warning_filter=rules)
+            else:
+                lines = follow.tail_lines(new_file, stop_event, idle_timeout=idle_timeout)
+                warnings = warning_parser.iter_warnings_from_lines(new_file, lines, rules)
+            for key, text in warnings:
+                extra = live.add(key, text)
+                if extra:
+                    logger.info(f"[{log_filename}] New warning (+{extra}): {text}")
+                    new_files.add(key[0])
+                    if blamer is not None:
+                        blamer.request(key[0], key[1])
+                    writer.notify()
+            stage.counts.update(warnings=live.total, increased=len(live.added_warnings()))
+    finally:
+        if blamer is not None:
+            blamer.remove_listener(on_blamed)
+        writer.close()
+
+    logger.info(f"[{log_filename}] Found {live.total} warnings in {new_file}.")
+    if settings.match_moved:
+        added_warnings = comparison.match_counts(counts1, details1, live.counts, live.details, line_map)
+    else:
+        added_warnings = comparison.diff_counts(counts1, live.counts, live.details)
+    if infos is not None:
+        for key, _, _ in added_warnings:
+            infos[key] = live.infos[key]
+    if os.path.exists(live_filepath):
+        os.remove(live_filepath)
+    return added_warnings, live.counts, total1, live.total
+
+def compare_pairs_follow(pairs, output_folder, repo_root, settings, idle_timeout=follow.DEFAULT_IDLE_TIMEOUT,
+                         line_map=None, recorder=None):
+    """
+    Follow the new logs of all pairs at the same time, one thread per log, while
+    git blame runs in a shared background pool. When every log is finished (or on
+    Ctrl+C), the final CSV files are written as in a normal run.
+    line_map and recorder are used as in compare_pairs_serial().
+    """
+    logger.info(f"\nFollowing {len(pairs)} log file(s); press Ctrl+C to stop early.")
+    stop_event = threading.Event()
+    blamer = None
+    if not settings.old_rev and repo_root is not None:
+        blamer = follow.AsyncBlamer(repo_root, settings.blame_workers)
+    results = {}
+    infos = {log_filename: {} for log_filename, _, _ in pairs}
+    with ThreadPoolExecutor(max_workers=max(1, len(pairs))) as executor:
+        futures = [(log_filename, executor.submit(follow_pair, log_filename, old_file, new_file, output_folder,
+                                                  repo_root, settings, blamer, stop_event, idle_timeout, line_map,
+                                                  infos[log_filename]))
+                   for log_filename, old_file, new_file in pairs]
+        try:
+            for log_filename, future in futures:
+                results[log_filename] = future.result()
+        except KeyboardInterrupt:
+            logger.warning("Warning: Interrupted, stopping to follow the logs.")
+            stop_event.set()
+            for log_filename, future in futures:
+                results[log_filename] = future.result()
+    if blamer is not None:
+        blamer.shutdown()
+
+    for log_filename, old_file, new_file in pairs:
+        added_warnings, counts2, total1, total2 = results[log_filename]
+        logger.info(f"\nComparing '{log_filename}':")
+        if not added_warnings:
+            logger.info(f"No new warnings found for '{log_filename}'.")
+        rows = write_comparison_csv(log_filename, added_warnings, output_folder, repo_root, settings,
+                                    infos=infos[log_filename])
+        if recorder is not None and rows is not None:
+            recorder(log_filename, old_file, new_file, counts2, total1, total2, rows)
+
+def write_metrics(output_folder, settings, started_at, start_times):
+    """
+    Write the metrics of this run (see log_utils.metrics_snapshot()) to METRICS_FILENAME
+    in output_folder: totals, per-stage sums, every stage run and the counters.
+    start_times is (perf_counter, process_time) at the start of the run.
+    Stages of worker processes are included; the peak memory is that of this process.
+    """
+    metrics = log_utils.metrics_snapshot()
+    stages = {}
+    for record in metrics["stages"]:
+        summary = stages.setdefault(record["stage"], {"runs": 0, "wall": 0.0, "cpu": 0.0, "child_cpu": 0.0})
+        summary["runs"] += 1
+        for name in ("wall", "cpu", "child_cpu"):
+            summary[name] = round(summary[name] + record[name], 6)
+        if record.get("memory_peak") is not None:
+            summary["memory_peak"] = max(summary.get("memory_peak", 0), record["memory_peak"])
+    counters = dict(metrics["counters"])
+    for name, value in blame_cache.cache_stats.items():
+        counters[f"blame_cache_{name}"] = value
+    result = {
+        "started_at": started_at,
+        "wall": round(time.perf_counter() - start_times[0], 6),
+        "cpu": round(time.process_time() - start_times[1], 6),
+        "memory_peak": metrics["memory_peak"],
+        "settings": dataclasses.asdict(settings),
+        "counters": counters,
+        "stages": stages,
+        "stage_runs": metrics["stages"],
+    }
+    metrics_path = os.path.join(output_folder, METRICS_FILENAME)
+    try:
+        with open(metrics_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"Profile metrics written to '{metrics_path}'.")
+    except OSError as e:
+        logger.error(f"Error writing metrics file '{metrics_path}': {e}")
 
 def main():
     """
@@ -33,41 +605,63 @@ def main():
     Writes the comparison results to output CSV files, including author info and commit hash from git blame.
     Attempts to run git blame within the detected repository root.
     """
-    if len(sys.argv) < 3:
-        print("Usage: python compare_warnings.py <old_folder> <new_folder>")
-        sys.exit(1)
-    old_folder = sys.argv[1]
-    new_folder = sys.argv[2]
+    args = parse_args()
+    old_folder = args.old_folder
+    new_folder = args.new_folder
+
+    profiler = None
+    if args.profile:
+        started_at = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+        start_times = (time.perf_counter(), time.process_time())
+        log_utils.start_memory_tracing()
+        if args.profile_cprofile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    # Load settings once: common.config, then environment variables, then command-line flags
+    settings = config.load_settings(
+        args.common_config,
+        enable_debug=args.debug,
+        commit_url_prefix=args.commit_url_prefix,
+        use_mmap=args.mmap,
+        parse_workers=args.parse_workers,
+        spill_keys=args.spill_keys,
+        spill_memory_mb=args.spill_memory_mb,
+        spill_dir=args.spill_dir,
+        path_maps=path_resolver.parse_prefix_maps(";".join(args.path_map)) if args.path_map else None,
+        blame_workers=args.blame_workers,
+        log_level=args.log_level,
+        old_rev=args.old_rev,
+        new_rev=args.new_rev,
+        match_moved=args.match_moved,
+        include_paths=parse_rule_args(args.include_path),
+        exclude_paths=parse_rule_args(args.exclude_path),
+        include_projects=parse_rule_args(args.include_project),
+        exclude_projects=parse_rule_args(args.exclude_project),
+        include_codes=parse_rule_args(args.include_code),
+        exclude_codes=parse_rule_args(args.exclude_code),
+    )
+    if settings.parse_workers <= 0:
+        settings.parse_workers = os.cpu_count() or 1
+    config.set_settings(settings)
+    log_utils.setup_logging(settings.log_level)
+    rules = warning_filter.get_filter(settings)
+    if rules is not None:
+        logger.info(f"Filtering warnings ({rules.describe()}).")
 
     # Read log filenames from configuration file "compare.config"
-    config_filename = "compare.config"
+    config_filename = LOG_LIST_FILENAME
     try:
-        with open(config_filename, "r", encoding="utf-8") as f:
-            config_content = f.read()
-        files = []
-        for line in config_content.splitlines():
-            line = line.strip()
-            if line == "" or line.startswith("#"): # Skip empty lines and comments
-                continue
-            # Support comma-separated values in one line.
-            if "," in line:
-                parts = line.split(",")
-                for part in parts:
-                    part_stripped = part.strip()
-                    if part_stripped: # Avoid adding empty strings if there are trailing commas
-                        files.append(part_stripped)
-            else:
-                if line: # Avoid adding empty strings from blank lines
-                    files.append(line)
+        files = read_log_names(config_filename)
     except FileNotFoundError:
-         print(f"Error: Configuration file '{config_filename}' not found.")
-         sys.exit(1)
+        logger.error(f"Error: Configuration file '{config_filename}' not found.")
+        sys.exit(1)
     except Exception as e:
-        print(f"Error reading config file {config_filename}: {e}")
+        logger.error(f"Error reading config file {config_filename}: {e}")
         sys.exit(1)
 
     if not files:
-        print(f"Warning: No log files specified in '{config_filename}'.")
+        logger.warning(f"Warning: No log files specified in '{config_filename}'.")
         sys.exit(0)
 
 
@@ -84,122 +678,88 @@ def main():
     try:
         os.makedirs(output_folder, exist_ok=True)
     except OSError as e:
-        print(f"Error creating output directory '{output_folder}': {e}")
+        logger.error(f"Error creating output directory '{output_folder}': {e}")
         sys.exit(1)
 
-    # Process each log file specified in the configuration file.
+    # Collect the log file pairs to compare, skipping files missing on either side.
+    pairs = []
     for log_filename in files:
-        old_file = os.path.join(old_folder, log_filename)
-        new_file = os.path.join(new_folder, log_filename)
+        # A log may also be archived compressed, e.g. core.log.gz for core.log
+        old_file = warning_parser.find_log_file(os.path.join(old_folder, log_filename))
+        new_file = warning_parser.find_log_file(os.path.join(new_folder, log_filename))
+        # A baseline snapshot saved next to the old log is loaded instead of parsing it
+        old_file = snapshot.find_snapshot(old_file) or old_file
 
         # Check if both old and new log files exist
         old_exists = os.path.exists(old_file)
         new_exists = os.path.exists(new_file)
 
         if not old_exists:
-            print(f"Warning: File {old_file} does not exist, skipping comparison for '{log_filename}'.")
+            logger.warning(f"Warning: File {old_file} does not exist, skipping comparison for '{log_filename}'.")
             continue # Skip this file pair
-        if not new_exists:
-            print(f"Warning: File {new_file} does not exist, skipping comparison for '{log_filename}'.")
+        if not new_exists and not args.follow:
+            logger.warning(f"Warning: File {new_file} does not exist, skipping comparison for '{log_filename}'.")
             continue # Skip this file pair
+        pairs.append((log_filename, old_file, new_file))
 
+    if args.new_rev and not settings.old_rev:
+        logger.error("Error: --new-rev requires --old-rev.")
+        sys.exit(1)
+    if settings.old_rev:
+        # Build the attribution index once, before any worker processes are started
+        if repo_root is None:
+            logger.error("Error: --old-rev requires the logs' source code to be in a Git repository.")
+            sys.exit(1)
+        logger.info(f"Attributing warnings from the changes in {settings.old_rev}..{settings.new_rev} instead of git blame.")
+        if diff_attribution.load_index(repo_root, settings.old_rev, settings.new_rev) is None:
+            sys.exit(1)
 
-        print(f"\nComparing '{log_filename}':")
-        print(f"  Old log: {old_file}")
-        print(f"  New log: {new_file}")
+    # Line numbers of the old logs are mapped to the new source before moved warnings are matched
+    line_map = None
+    if settings.match_moved and settings.old_rev:
+        diff_line_map = diff_attribution.build_line_map(repo_root, settings.old_rev, settings.new_rev)
+        if diff_line_map is None:
+            sys.exit(1)
+        line_map = diff_line_map.map_line
 
-        # Call the function from the comparison module
-        added_warnings = comparison.compare_warnings(old_file, new_file)
-        total_added_count = sum(extra for _, _, extra in added_warnings) # Sum of counts, not types
+    # The persistent blame cache needs a repository to look up blob IDs, and is not used without git blame
+    blame_cache.configure(args.blame_cache_dir, args.blame_cache_size,
+                          enabled=not args.no_blame_cache and repo_root is not None and not settings.old_rev)
 
-        if not added_warnings:
-            print(f"No new warnings found for '{log_filename}'.")
-            # Optionally create an empty CSV or skip file creation
-            # continue # Skip CSV creation if no new warnings
-            # Let's create the CSV even if empty for consistency
-            pass
+    # Optional history database that keeps the results of every run
+    store = None
+    recorder = None
+    if args.history_db:
+        try:
+            store = history.HistoryStore(args.history_db)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error: Cannot open history database '{args.history_db}': {e}")
+            sys.exit(1)
+        run_id = store.start_run(old_folder, new_folder, settings)
+        recorder = functools.partial(store.record_log, run_id, commit_url_prefix=settings.commit_url_prefix)
 
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.follow:
+        compare_pairs_follow(pairs, output_folder, repo_root, settings, args.follow_timeout, line_map, recorder)
+    elif jobs > 1 and pairs:
+        compare_pairs_parallel(pairs, output_folder, repo_root, settings, jobs, line_map, recorder)
+    else:
+        compare_pairs_serial(pairs, output_folder, repo_root, settings, line_map, recorder)
 
-        # Construct output filename with .csv extension.
-        base = os.path.splitext(log_filename)[0]
-        # Use total count in filename
-        output_filename = f"{base}_new_warning_{total_added_count}.csv"
-        output_filepath = os.path.join(output_folder, output_filename)
+    if store is not None:
+        logger.info(f"\nRecorded this run in the history database '{store.path}'.")
+        store.close()
 
-        print(f"Writing results to {output_filepath}...")
+    if blame_cache.is_enabled():
+        logger.info(f"\n{blame_cache.format_stats()}")
 
-        # Write the CSV content into the output file.
-        try:
-            with open(output_filepath, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
-                # Header remains the same conceptually, but the content will be a URL if prefix is set
-                writer.writerow(["Committer", "E-Mail", "Commit URL", "Warning keyword", "Message", "Project", "Compiling Source", "File path", "Line", "Column", "Repeat Count"]) # Updated header slightly
-
-                if not added_warnings:
-                    # Write only header if no new warnings
-                    pass
-                else:
-                    processed_count = 0
-                    # Create a cache dictionary to store blame information for files
-                    blame_cache = {}
-                    print(f"\nStarting to process warnings, creating local blame cache...")
-                    
-                    # Iterate through the identified new/increased warnings
-                    for key, text, extra in added_warnings:
-                        filepath, line_no, column, warning_code = key
-                        # Get blame map from cache, if not exists then load and cache it
-                        if filepath != "N/A" and filepath not in blame_cache:
-                            if git_utils.is_debug_enabled():
-                                print(f"Local cache miss: File '{filepath}' not in local cache, calling git_utils to get blame info")
-                            blame_cache[filepath] = git_utils.get_blame_map_for_file(filepath, repo_root)
-                        elif filepath != "N/A" and git_utils.is_debug_enabled():
-                            print(f"Local cache hit: Getting blame info for file '{filepath}' from local cache")
-                        
-                        # Call functions from warning_parser module
-                        project = warning_parser.extract_project_path(text)
-                        compiling_source = warning_parser.extract_compiling_source(text)
-
-                        author = "N/A"
-                        email = "N/A"
-                        commit_hash = "N/A"
-                        if filepath != "N/A" and line_no != "N/A":
-                            try:
-                                line_int = int(line_no)
-                                blame_map = blame_cache.get(filepath, {})
-                                if line_int in blame_map:
-                                    author, email, commit_hash = blame_map[line_int]
-                            except Exception:
-                                pass
-                        # else: Git not found or N/A path/line, author/email/commit remain "N/A"
-
-                        # Get COMMIT_URL_PREFIX from config
-                        commit_url_prefix = read_config()['COMMIT_URL_PREFIX']
-                        
-                        # Prepare the commit information for display (either hash or full URL)
-                        commit_display_info = commit_hash # Default to hash or "N/A"
-                        if commit_url_prefix and commit_hash != "N/A":
-                            commit_display_info = commit_url_prefix + commit_hash
-
-                        # Write the row including author, email, and the commit display info
-                        writer.writerow([author, email, commit_display_info, warning_code, text, project, compiling_source, filepath, line_no, column, extra])
-                        processed_count += 1
-                        
-                        # Display progress bar
-                        if processed_count % 10 == 0:
-                            total = len(added_warnings)
-                            percent = int(processed_count / total * 100)
-                            bar_length = 30
-                            filled_length = int(bar_length * processed_count / total)
-                            bar = '█' * filled_length + '░' * (bar_length - filled_length)
-                            print(f"\rProgress: [{bar}] {percent}% ({processed_count}/{total})", end='', flush=True)
-
-
-            print(f"\nComparison result for '{log_filename}' ({total_added_count} total new warnings across {len(added_warnings)} types) written to '{output_filepath}'.")
-
-        except IOError as e:
-            print(f"Error writing output file '{output_filepath}': {e}")
-        except Exception as e:
-             print(f"An unexpected error occurred while processing '{log_filename}': {e}")
+    if profiler is not None:
+        profiler.disable()
+        profile_path = os.path.join(output_folder, CPROFILE_FILENAME)
+        profiler.dump_stats(profile_path)
+        logger.info(f"cProfile dump written to '{profile_path}'.")
+    if args.profile:
+        write_metrics(output_folder, settings, started_at, start_times)
 
 
 if __name__ == "__main__":
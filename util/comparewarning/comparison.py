@@ -1,45 +1,375 @@
+import heapq
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 import warning_parser # Import the parser module
+import external_sort
+import log_utils
+import snapshot
+import warning_table
 
-def compare_warnings(log1, log2):
+logger = log_utils.get_logger("comparison")
+
+def _count(warnings, keep_details, strings=None):
+    counts = warning_table.WarningCounts(strings, keep_details)
+    # The first encountered text of every key is kept
+    counts.count(warnings)
+    return counts
+
+def count_warnings_range(log, start, end, keep_details=False, warning_filter=None):
     """
-    Compare the warning messages from two log files.
-    Returns a list of tuples: (key, warning_text, additional_count),
-    where additional_count is the number of extra occurrences of this warning
-    in log2 compared to log1.
+    Count the warnings of the byte range [start, end) of a log into a WarningCounts.
+    Entry point of the worker processes of a parallel parse.
     """
-    print(f"Parsing warnings from {log1}...")
-    # Use the parser from the imported module
-    warnings1 = warning_parser.parse_warnings(log1)
-    print(f"Found {len(warnings1)} warnings in {log1}.")
-    print(f"Parsing warnings from {log2}...")
-    # Use the parser from the imported module
-    warnings2 = warning_parser.parse_warnings(log2)
-    print(f"Found {len(warnings2)} warnings in {log2}.")
+    return _count(warning_parser.iter_warnings_range(log, start, end, warning_filter), keep_details)
 
-    # Count occurrences in log1 using the warning's unique key.
-    counts1 = {}
-    for key, text in warnings1:
-        counts1[key] = counts1.get(key, 0) + 1
+def count_warnings_parallel(log, ranges, keep_details=False, strings=None, spill=None, warning_filter=None):
+    """
+    Count the warnings of a log split into byte ranges by warning_parser.split_log(),
+    one worker process per range. The counts of the ranges are merged in log order,
+    so the key order and the first text of every key are those of a serial parse.
+    Returns a WarningCounts (the last one if spill is given, see count_warnings()).
+    """
+    counts = warning_table.WarningCounts(strings, keep_details)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [executor.submit(log_utils.call_with_metrics, count_warnings_range, log, start, end, keep_details,
+                                   warning_filter)
+                   for start, end in ranges]
+        for future in futures:
+            range_counts, metrics = future.result()
+            log_utils.merge_metrics(metrics)
+            counts.merge(range_counts)
+            if spill is not None:
+                counts = spill.check(counts)
+    return counts
 
-    # Count occurrences in log2 and store a representative message.
-    counts2 = {}
-    details2 = {} # Store one representative text for each key in log2
-    for key, text in warnings2:
-        counts2[key] = counts2.get(key, 0) + 1
-        # Keep the first encountered text for this key
-        if key not in details2:
-            details2[key] = text
+def count_warnings(log, use_mmap=False, keep_details=False, parse_workers=1, strings=None, spill=None,
+                   warning_filter=None):
+    """
+    Count the occurrences of each warning key in a log file.
+    Returns a tuple (counts, details, total), where counts maps each key to its
+    number of occurrences, details maps each key to the first encountered warning
+    text (only filled if keep_details is True) and total is the number of warnings.
+    counts is a warning_table.WarningCounts and details its WarningTexts: keys are
+    interned in the StringTable strings (a new one if None), which logs that are
+    compared with each other should share.
+    Warnings are streamed from the parser, so the full warning list is never held in memory.
+    log may also be a baseline snapshot (see snapshot.py); its counts are loaded
+    instead, unless it is stale, in which case its log is parsed.
+    If parse_workers is greater than 1, a large uncompressed log is split into byte
+    ranges that are parsed in parallel (see count_warnings_parallel()).
+    spill is the external_sort.LogSpill of a comparison with spill limits, which
+    provides the StringTable and may write the counts to sorted runs; counts is
+    then an external_sort.ExternalCounts if the comparison spilled.
+    Only the warnings accepted by warning_filter (a warning_filter.WarningFilter, or
+    None for all warnings) are counted, also when they are loaded from a snapshot.
+    """
+    if spill is not None:
+        strings = spill.strings()
+    if snapshot.is_snapshot(log):
+        with log_utils.Stage("load", logger, snapshot=log) as stage:
+            loaded = snapshot.load_snapshot(log, keep_details, strings, warning_filter)
+            if loaded is not None:
+                stage.counts.update(warnings=loaded[2], unique=len(loaded[0]))
+        if loaded is not None and spill is not None:
+            counts = spill.finish(loaded[0])
+            return counts, counts.details(), counts.total
+        if loaded is not None:
+            return loaded
+        source_path = snapshot.get_source_path(log)
+        if not source_path or not os.path.exists(source_path):
+            logger.error(f"Error: Snapshot '{log}' cannot be used and its log was not found.")
+            if spill is not None:
+                counts = spill.finish(warning_table.WarningCounts(strings, keep_details))
+                return counts, counts.details(), 0
+            return {}, {}, 0
+        logger.info(f"Parsing '{source_path}' instead of snapshot '{log}'.")
+        log = source_path
+
+    ranges = None
+    if parse_workers > 1 and os.path.isfile(log):
+        ranges = warning_parser.split_log(log, parse_workers)
+    with log_utils.Stage("parse", logger, log=log) as stage:
+        if ranges and len(ranges) > 1:
+            counts = count_warnings_parallel(log, ranges, keep_details, strings, spill, warning_filter)
+            stage.counts.update(chunks=len(ranges))
+        elif spill is not None:
+            counts = spill.count(warning_parser.iter_warnings(log, use_mmap, warning_filter),
+                                 warning_table.WarningCounts(strings, keep_details))
+        else:
+            counts = _count(warning_parser.iter_warnings(log, use_mmap, warning_filter), keep_details, strings)
+        if spill is not None:
+            counts = spill.finish(counts)
+        if isinstance(counts, external_sort.ExternalCounts):
+            stage.counts.update(warnings=counts.total, runs=len(counts.runs.paths))
+        else:
+            stage.counts.update(warnings=counts.total, unique=len(counts))
+    return counts, counts.details(), counts.total
 
+def store_infos(infos, added, details):
+    """
+    Store the project path and compiling source of every key of added in infos, if
+    infos is a dict and details keeps them (see warning_table.WarningTexts.info()).
+    Keys whose texts come from elsewhere are left out; their CSV rows extract the
+    project and compiling source from the text (see compare_warnings.make_csv_row()).
+    """
+    if infos is None or not isinstance(details, warning_table.WarningTexts):
+        return
+    for key, _, _ in added:
+        info = details.info(key)
+        if info is not None:
+            infos[key] = info
+
+def diff_counts(counts1, counts2, details2, infos=None):
+    """
+    Compare warning counts of two logs.
+    Returns a list of tuples: (key, warning_text, additional_count) for every key
+    that occurs more often in counts2 than in counts1.
+    If both are WarningCounts, they are compared on their integer keys and only the
+    keys with an increased count are turned into tuples.
+    If infos is a dict, the project path and compiling source stored with the text
+    of every returned key are put in it as key -> (project, compiling source).
+    """
+    if isinstance(counts1, warning_table.WarningCounts) and isinstance(counts2, warning_table.WarningCounts):
+        return _diff_tables(counts1, counts2, details2, infos)
+    added = []
+    with log_utils.Stage("compare", logger) as stage:
+        # Compare counts for each warning found in log2.
+        for key, count2 in counts2.items():
+            count1 = counts1.get(key, 0) # Get count from log1, default to 0 if not present
+            if count2 > count1:
+                # If count in log2 is greater, calculate the difference
+                extra = count2 - count1
+                # Use the representative text stored for this key
+                added.append((key, details2[key], extra))
+        stage.counts.update(keys=len(counts2), increased=len(added))
+    store_infos(infos, added, details2)
+    return added
+
+def _diff_tables(counts1, counts2, details2, infos):
     added = []
-    # Compare counts for each warning found in log2.
-    for key, count2 in counts2.items():
-        count1 = counts1.get(key, 0) # Get count from log1, default to 0 if not present
-        if count2 > count1:
-            # If count in log2 is greater, calculate the difference
-            extra = count2 - count1
-            # Use the representative text stored for this key
-            added.append((key, details2[key], extra))
-
-    print(f"Found {len(added)} types of warnings with increased counts in {os.path.basename(log2)}.")
+    with log_utils.Stage("compare", logger) as stage:
+        old_counts = counts2.counts_in(counts1)
+        # Texts can be read by row if details2 is the table's own view
+        own_texts = isinstance(details2, warning_table.WarningTexts) and details2.table is counts2
+        for row, count2 in enumerate(counts2.counts):
+            count1 = old_counts[row]
+            if count2 > count1:
+                key = counts2.key_of(row)
+                text = counts2.text_of(row) if own_texts else details2[key]
+                added.append((key, text, count2 - count1))
+                if own_texts and infos is not None:
+                    infos[key] = counts2.info_of(row)
+        stage.counts.update(keys=len(counts2), increased=len(added))
+    if not own_texts:
+        store_infos(infos, added, details2)
+    return added
+
+# Whitespace runs, collapsed when messages are normalized
+_whitespace_pattern = re.compile(r'\s+')
+
+def normalize_message(text, code):
+    """
+    Return the part of a warning text that stays the same when the warning moves to
+    another line: the message after "<code>:", without the project path, the
+    compiling source info and repeated whitespace.
+    """
+    start = text.find(f"{code}:")
+    message = text[start + len(code) + 1:] if start >= 0 else text
+    for marker in (" [", "(compiling source file"):
+        end = message.find(marker)
+        if end >= 0:
+            message = message[:end]
+    return _whitespace_pattern.sub(" ", message).strip()
+
+def _line_number(line_no):
+    # Warnings without a location ("N/A") all sort at line 0
+    return int(line_no) if line_no.isdigit() else 0
+
+def _remap_key(key, line_map):
+    filepath, line_no, column, code = key
+    if filepath == "N/A" or not line_no.isdigit():
+        return key
+    new_line = line_map(filepath, int(line_no))
+    if new_line is None:
+        # The line itself changed; keep its old number for nearest-line matching
+        return key
+    return (filepath, str(new_line), column, code)
+
+def _match_nearest(old_items, new_items):
+    """
+    Pair the occurrences of one (file, code, message) bucket by nearest line.
+    old_items and new_items are lists of [line, count]; matched occurrences are
+    subtracted from the counts. The closest old and new items are paired first, and
+    of equally close pairs the one with the lowest lines, so a block of warnings
+    shifted by the same number of lines is paired one to one.
+    Both sides are merged into one list sorted by line. Once used-up items are unlinked
+    from it, the closest pair left is always two neighbours, so only neighbours are
+    candidates: every item is unlinked once and adds at most one candidate, which
+    keeps the matching at O(n log n) for n items, however far the lines moved.
+    Returns the number of matched occurrences.
+    """
+    # (line, side, item) with side 0 for old and 1 for new items, in line order
+    entries = [(item[0], 0, item) for item in old_items] + [(item[0], 1, item) for item in new_items]
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+    size = len(entries)
+    # Neighbours of every entry among the entries that are not used up
+    next_index = list(range(1, size + 1))
+    prev_index = list(range(-1, size - 1))
+    candidates = [(entries[index + 1][0] - entries[index][0], index, index + 1)
+                  for index in range(size - 1) if entries[index][1] != entries[index + 1][1]]
+    heapq.heapify(candidates)
+
+    matched = 0
+    while candidates:
+        _, left, right = heapq.heappop(candidates)
+        left_item = entries[left][2]
+        right_item = entries[right][2]
+        # Skip candidates whose items were used up or are no longer neighbours
+        if not left_item[1] or not right_item[1] or next_index[left] != right:
+            continue
+        paired = min(left_item[1], right_item[1])
+        left_item[1] -= paired
+        right_item[1] -= paired
+        matched += paired
+        # Unlink the used-up items; their outer neighbours become a candidate if they are
+        # of different sides
+        if not left_item[1]:
+            before = prev_index[left]
+            if before >= 0:
+                next_index[before] = right
+            prev_index[right] = before
+            left = before
+        if not right_item[1]:
+            after = next_index[right]
+            if after < size:
+                prev_index[after] = left
+            if left >= 0:
+                next_index[left] = after
+            right = after
+        if left >= 0 and right < size and entries[left][1] != entries[right][1]:
+            heapq.heappush(candidates, (entries[right][0] - entries[left][0], left, right))
+    return matched
+
+def match_counts(counts1, details1, counts2, details2, line_map=None, infos=None):
+    """
+    Compare warning counts of two logs, tolerating warnings that moved to another line.
+    Keys are first paired exactly. What is left on both sides is grouped into buckets of
+    (file, code, normalized message) and paired by nearest line within each bucket, so
+    inserting lines above existing warnings does not report them as new.
+    line_map, if given, is called as line_map(filepath, line) and returns the line number
+    the old line has in the new source (or None if it changed); old keys are remapped
+    with it before the exact pairing.
+    Runs in O(n log n) for n keys: all grouping uses hashed buckets, and the keys of
+    a bucket are paired in one pass over them sorted by line (see _match_nearest()).
+    Returns a list of tuples: (key, warning_text, additional_count), in the same form and
+    order as diff_counts(), and fills infos like diff_counts().
+    """
+    with log_utils.Stage("compare", logger) as stage:
+        remaining1 = {}
+        texts1 = {}
+        for key, count in counts1.items():
+            text = details1[key]
+            if line_map is not None:
+                key = _remap_key(key, line_map)
+            remaining1[key] = remaining1.get(key, 0) + count
+            texts1.setdefault(key, text)
+
+        # Exact pairs
+        remaining2 = {}
+        exact = 0
+        for key, count2 in counts2.items():
+            count1 = remaining1.get(key, 0)
+            paired = min(count1, count2)
+            if paired:
+                remaining1[key] = count1 - paired
+                exact += paired
+            if count2 > paired:
+                remaining2[key] = count2 - paired
+
+        # Nearest-line pairs within each (file, code, message) bucket
+        buckets1 = {}
+        for key, count in remaining1.items():
+            if count:
+                filepath, line_no, _, code = key
+                bucket = (filepath, code, normalize_message(texts1[key], code))
+                buckets1.setdefault(bucket, []).append([_line_number(line_no), count])
+        buckets2 = {}
+        new_items = {}
+        for key, count in remaining2.items():
+            filepath, line_no, _, code = key
+            bucket = (filepath, code, normalize_message(details2[key], code))
+            if bucket in buckets1:
+                item = [_line_number(line_no), count]
+                buckets2.setdefault(bucket, []).append(item)
+                new_items[key] = item
+        moved = sum(_match_nearest(buckets1[bucket], items) for bucket, items in buckets2.items())
+        for key, item in new_items.items():
+            remaining2[key] = item[1]
+
+        added = [(key, details2[key], remaining2[key]) for key in counts2 if remaining2.get(key, 0) > 0]
+        stage.counts.update(keys=len(counts2), exact=exact, moved=moved, increased=len(added))
+    store_infos(infos, added, details2)
     return added
+
+def compare_logs(log1, log2, use_mmap=False, match_moved=False, line_map=None, parse_workers=1, spill_limits=None,
+                 warning_filter=None, infos=None):
+    """
+    Compare the warning messages from two log files like compare_warnings(), and
+    also return what was parsed: (added, counts2, total1, total2), where counts2
+    maps every warning key of log2 to its number of occurrences.
+    infos is filled like in diff_counts().
+    """
+    external = None
+    if spill_limits is not None and spill_limits.enabled:
+        if match_moved:
+            logger.log(log_utils.VERBOSE, "Moved warnings are matched in memory; the spill limits are not used.")
+        else:
+            external = external_sort.ExternalComparison(spill_limits)
+    # Both logs share one string table, so their keys are compared as integers
+    # (with spill limits, the comparison provides it)
+    strings = warning_table.StringTable() if external is None else None
+    logger.info(f"Parsing warnings from {log1}...")
+    counts1, details1, total1 = count_warnings(log1, use_mmap, keep_details=match_moved,
+                                               parse_workers=parse_workers, strings=strings,
+                                               spill=external.old if external else None, warning_filter=warning_filter)
+    logger.info(f"Found {total1} warnings in {log1}.")
+    if external is not None:
+        # The comparison holds the old counts, and writes them to runs if the new log spills
+        counts1 = details1 = None
+
+    logger.info(f"Parsing warnings from {log2}...")
+    # Count occurrences in log2 and store a representative message.
+    counts2, details2, total2 = count_warnings(log2, use_mmap, keep_details=True,
+                                               parse_workers=parse_workers, strings=strings,
+                                               spill=external.new if external else None, warning_filter=warning_filter)
+    logger.info(f"Found {total2} warnings in {log2}.")
+    if external is not None:
+        counts1 = external.counts(0)
+
+    if match_moved:
+        added = match_counts(counts1, details1, counts2, details2, line_map, infos)
+    elif isinstance(counts2, external_sort.ExternalCounts):
+        added = external_sort.diff_external(counts1, counts2, infos)
+    else:
+        added = diff_counts(counts1, counts2, details2, infos)
+    logger.info(f"Found {len(added)} types of warnings with increased counts in {os.path.basename(log2)}.")
+    return added, counts2, total1, total2
+
+def compare_warnings(log1, log2, use_mmap=False, match_moved=False, line_map=None, parse_workers=1,
+                     spill_limits=None, warning_filter=None):
+    """
+    Compare the warning messages from two log files.
+    Returns a list of tuples: (key, warning_text, additional_count),
+    where additional_count is the number of extra occurrences of this warning
+    in log2 compared to log1.
+    If use_mmap is True, logs are read with the memory-mapped scanner.
+    If match_moved is True, warnings that only moved to another line are not
+    counted as new (see match_counts()); line_map is passed on to match_counts().
+    parse_workers is the number of processes each log may be parsed with (see count_warnings()).
+    spill_limits, an external_sort.SpillLimits, lets logs with more warnings than
+    fit in memory be compared through sorted runs on disk (see external_sort.py).
+    warning_filter, a warning_filter.WarningFilter, limits both logs to the warnings it accepts.
+    """
+    return compare_logs(log1, log2, use_mmap, match_moved, line_map, parse_workers, spill_limits,
+                        warning_filter)[0]
@@ -0,0 +1,152 @@
+import configparser
+import os
+from dataclasses import dataclass
+
+import external_sort
+import log_utils
+import path_resolver
+import warning_filter
+
+logger = log_utils.get_logger("config")
+
+# Default location of the global settings file
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common.config')
+
+# Default number of git blame subprocesses run at the same time
+DEFAULT_BLAME_WORKERS = 8
+
+# Environment variables that override values from common.config
+ENV_CONFIG_PATH = "COMPARE_WARNINGS_CONFIG"
+ENV_DEBUG = "COMPARE_WARNINGS_DEBUG"
+ENV_COMMIT_URL_PREFIX = "COMPARE_WARNINGS_COMMIT_URL_PREFIX"
+ENV_LOG_LEVEL = "COMPARE_WARNINGS_LOG_LEVEL"
+ENV_PATH_PREFIX_MAP = "COMPARE_WARNINGS_PATH_PREFIX_MAP"
+
+@dataclass
+class Settings:
+    """
+    Settings of one comparison run. Loaded once at startup by load_settings();
+    nothing on the per-warning path reads configuration files.
+    """
+    enable_debug: bool = False
+    commit_url_prefix: str = ""
+    use_mmap: bool = False
+    blame_workers: int = DEFAULT_BLAME_WORKERS
+    # Console verbosity: quiet, normal, verbose or debug
+    log_level: str = "normal"
+    # Revision range of the two builds; if old_rev is set, warnings are attributed
+    # from the changes in old_rev..new_rev instead of git blame
+    old_rev: str = ""
+    new_rev: str = "HEAD"
+    # Do not report warnings that only moved to another line as new
+    match_moved: bool = False
+    # Processes each log is parsed with, in byte ranges (1 = serial parse)
+    parse_workers: int = 1
+    # (from, to) prefixes that map build machine paths to the repository (see path_resolver.py)
+    path_maps: tuple = ()
+    # Limits above which the warning counts of a comparison are written to sorted
+    # runs on disk (0 = no limit, see external_sort.py), and the directory of the runs
+    spill_keys: int = 0
+    spill_memory_mb: float = external_sort.DEFAULT_SPILL_MEMORY_MB
+    spill_dir: str = ""
+    # Include and exclude rules for the warnings of the logs (see warning_filter.py)
+    include_paths: tuple = ()
+    exclude_paths: tuple = ()
+    include_projects: tuple = ()
+    exclude_projects: tuple = ()
+    include_codes: tuple = ()
+    exclude_codes: tuple = ()
+
+# common.config keys of the filter rules, by setting
+FILTER_KEYS = {
+    'include_paths': 'INCLUDE_PATHS',
+    'exclude_paths': 'EXCLUDE_PATHS',
+    'include_projects': 'INCLUDE_PROJECTS',
+    'exclude_projects': 'EXCLUDE_PROJECTS',
+    'include_codes': 'INCLUDE_CODES',
+    'exclude_codes': 'EXCLUDE_CODES',
+}
+
+# Settings used by modules that are not passed a Settings object explicitly
+_current = None
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+def _strip_quotes(value):
+    # Remove quotes if present
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    return value
+
+def load_settings(config_path=None, environ=None, **overrides):
+    """
+    Build the settings for a run. Values are taken from common.config, then from
+    environment variables, then from overrides (e.g. command-line flags) that are not None.
+    enableDebug selects the debug log level, unless a log level was set by a later
+    source: e.g. -q on the command line wins over enableDebug in common.config.
+    """
+    if environ is None:
+        environ = os.environ
+    config_path = config_path or environ.get(ENV_CONFIG_PATH) or DEFAULT_CONFIG_PATH
+    settings = Settings()
+    # Sources of enableDebug and of the log level: 0 = common.config, 1 = environment, 2 = overrides
+    debug_source = 0
+    level_source = None
+
+    config = configparser.ConfigParser()
+    try:
+        config.read(config_path)
+        settings.enable_debug = config.getboolean('DEFAULT', 'enableDebug', fallback=False)
+        settings.commit_url_prefix = _strip_quotes(config.get('DEFAULT', 'COMMIT_URL_PREFIX', fallback=""))
+        settings.path_maps = path_resolver.parse_prefix_maps(
+            _strip_quotes(config.get('DEFAULT', 'PATH_PREFIX_MAP', fallback="")))
+        for name, key in FILTER_KEYS.items():
+            setattr(settings, name, warning_filter.parse_rules(_strip_quotes(config.get('DEFAULT', key, fallback=""))))
+    except Exception as e:
+        logger.warning(f"Warning: Error reading {config_path}: {e}")
+
+    if ENV_DEBUG in environ:
+        settings.enable_debug = _parse_bool(environ[ENV_DEBUG])
+        debug_source = 1
+    if ENV_COMMIT_URL_PREFIX in environ:
+        settings.commit_url_prefix = _strip_quotes(environ[ENV_COMMIT_URL_PREFIX])
+    if ENV_PATH_PREFIX_MAP in environ:
+        settings.path_maps = path_resolver.parse_prefix_maps(environ[ENV_PATH_PREFIX_MAP])
+    if environ.get(ENV_LOG_LEVEL) in log_utils.LOG_LEVELS:
+        settings.log_level = environ[ENV_LOG_LEVEL]
+        level_source = 1
+
+    for name, value in overrides.items():
+        if value is None:
+            continue
+        if not hasattr(settings, name):
+            raise TypeError(f"Unknown setting '{name}'")
+        setattr(settings, name, value)
+        if name == 'enable_debug':
+            debug_source = 2
+        elif name == 'log_level':
+            level_source = 2
+
+    # enableDebug and the debug log level imply each other; a log level from a later
+    # source than enableDebug wins
+    if settings.enable_debug and (level_source is None or level_source <= debug_source):
+        settings.log_level = "debug"
+    settings.enable_debug = settings.log_level == "debug"
+    return settings
+
+def set_settings(settings):
+    """
+    Make settings the current settings of this process.
+    """
+    global _current
+    _current = settings
+
+def get_settings():
+    """
+    Return the current settings, loading the defaults once if none were set.
+    """
+    global _current
+    if _current is None:
+        _current = load_settings()
+    return _current
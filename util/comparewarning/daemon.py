@@ -0,0 +1,454 @@
+"""
+Long-running comparison service for one repository checkout.
+
+Every run of compare_warnings.py starts cold: it looks up the repository root,
+parses the baseline logs and blames files with an empty cache. The daemon stays
+resident and keeps, from one job to the next:
+
+- the repository root and the settings,
+- the parsed counts of baseline (old) logs, reused while the log file (or the
+  snapshot and its log) has the same size and modification time,
+- the git blame maps and resolved paths of git_utils. They are all dropped when
+  HEAD moves; the blame map of a file that changed since it was blamed is dropped
+  before the next job, and the least recently used blame maps are dropped when
+  more files than --max-blamed-files are blamed.
+
+The metrics of log_utils are reset at the start of every job, so they cover the
+last job only.
+
+Jobs are HTTP requests on a localhost port or a Unix socket:
+
+    python daemon.py --repo /src/pam --port 8765
+    python daemon.py --repo /src/pam --socket /tmp/compare_warnings.sock
+
+    curl -s http://127.0.0.1:8765/compare -d '{"old": "old_logs/core.log", "new": "new_logs/core.log"}'
+    curl -s --unix-socket /tmp/compare_warnings.sock "http://localhost/compare?format=csv" \\
+         -d '{"old": "old_logs/core.log", "new": "new_logs/core.log"}'
+
+POST /compare takes a JSON object with "old" and "new" (log paths, relative to the
+daemon's working directory) and optionally "name" (the log name in the result),
+"match_moved" and "format" ("json", the default, or "csv"; also accepted as the
+?format= query parameter). The JSON result holds the totals and one object per CSV
+row; the CSV result is the file compare_warnings.py writes. GET /status reports
+the warm caches and POST /shutdown stops the daemon. Jobs run one at a time.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import blame_cache
+import compare_warnings
+import comparison
+import config
+import git_utils
+import log_utils
+import path_resolver
+import snapshot
+import warning_filter
+import warning_parser
+
+logger = log_utils.get_logger("daemon")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Parsed baseline logs kept in memory, least recently used are dropped first
+DEFAULT_MAX_BASELINES = 8
+
+# Files whose blame maps are kept in memory, least recently used are dropped first
+DEFAULT_MAX_BLAMED_FILES = 2000
+
+# Largest accepted request body
+MAX_REQUEST_BYTES = 1024 * 1024
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+def _baseline_signature(path):
+    """
+    Return what a cached baseline depends on: the log, or the snapshot and its log.
+    """
+    signature = (_file_signature(path),)
+    if snapshot.is_snapshot(path):
+        source_path = snapshot.get_source_path(path)
+        signature += (_file_signature(source_path) if source_path else None,)
+    return signature
+
+def get_head(repo_root):
+    """
+    Return the commit hash of HEAD in repo_root, or None if it cannot be read.
+    """
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True, text=True,
+                                stdin=subprocess.DEVNULL, check=False)
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+class BaselineCache:
+    """
+    Parsed old logs: (path, keep_details) -> (signature, (counts, details, total)).
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_BASELINES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, path, settings, keep_details):
+        """
+        Return (counts, details, total) of the old log at path, parsing it only if
+        it is not cached or changed since it was parsed, and whether it was cached.
+        """
+        key = (os.path.abspath(path), keep_details)
+        signature = _baseline_signature(path)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == signature:
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1], True
+        self.stats['misses'] += 1
+        parsed = comparison.count_warnings(path, settings.use_mmap, keep_details, settings.parse_workers,
+                                           warning_filter=warning_filter.get_filter(settings))
+        self.entries[key] = (signature, parsed)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return parsed, False
+
+class BlameState:
+    """
+    Keeps the in-memory blame maps of git_utils valid for the working tree of repo_root,
+    and at most max_files of them.
+    """
+    def __init__(self, repo_root, max_files=DEFAULT_MAX_BLAMED_FILES):
+        self.repo_root = repo_root
+        self.max_files = max_files
+        self.head = get_head(repo_root) if repo_root else None
+        # Log file path -> signature of its file before it was blamed, least recently used first
+        self.signatures = OrderedDict()
+        self.stats = {'head_changes': 0, 'changed_files': 0, 'evicted_files': 0}
+
+    def _disk_path(self, filepath):
+        path_for_git = git_utils.get_path_for_git(filepath, self.repo_root)
+        if path_for_git is None:
+            return None
+        return os.path.join(self.repo_root, path_for_git) if self.repo_root else path_for_git
+
+    def refresh(self):
+        """
+        Drop everything cached if HEAD moved, otherwise the blame maps of the files
+        that changed since they were blamed. Called before every job.
+        """
+        if not self.repo_root:
+            return
+        head = get_head(self.repo_root)
+        if head != self.head:
+            logger.info(f"HEAD moved from {self.head} to {head}, dropping the cached blame maps and paths.")
+            git_utils.forget_blame_maps()
+            path_resolver.reset_resolvers()
+            self.signatures.clear()
+            self.head = head
+            self.stats['head_changes'] += 1
+            return
+        changed = [filepath for filepath, signature in self.signatures.items()
+                   if _file_signature(self._disk_path(filepath)) != signature]
+        if changed:
+            logger.info(f"{len(changed)} blamed file(s) changed, dropping their blame maps.")
+            git_utils.forget_blame_maps(changed)
+            for filepath in changed:
+                del self.signatures[filepath]
+            self.stats['changed_files'] += len(changed)
+
+    def read_signatures(self, filepaths):
+        """
+        Return the signatures of the files in filepaths that have no blame map yet.
+        Called before they are blamed: if a file is edited while it is blamed, its
+        signature no longer matches and refresh() drops the blame map.
+        """
+        signatures = {}
+        for filepath in filepaths:
+            if filepath in self.signatures or filepath in signatures:
+                continue
+            disk_path = self._disk_path(filepath)
+            if disk_path is not None:
+                signatures[filepath] = _file_signature(disk_path)
+        return signatures
+
+    def record(self, filepaths, signatures):
+        """
+        Remember the signatures (from read_signatures()) of the files blamed by the
+        last job, whose files are filepaths, and drop the least recently used blame
+        maps beyond max_files.
+        """
+        for filepath in filepaths:
+            if filepath in self.signatures:
+                self.signatures.move_to_end(filepath)
+            elif filepath in signatures and filepath in git_utils.global_blame_cache:
+                self.signatures[filepath] = signatures[filepath]
+        # A blame map without a signature cannot be checked for changes
+        untracked = [filepath for filepath in git_utils.global_blame_cache if filepath not in self.signatures]
+        evicted = []
+        while len(self.signatures) > self.max_files:
+            evicted.append(self.signatures.popitem(last=False)[0])
+        if untracked or evicted:
+            git_utils.forget_blame_maps(untracked + evicted)
+            self.stats['evicted_files'] += len(evicted)
+
+class JobError(Exception):
+    """
+    A job that cannot be run, with the HTTP status to answer with.
+    """
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ComparisonService:
+    """
+    Runs comparison jobs with warm caches. All jobs run on one worker thread, so
+    the caches (and the SQLite connection of the blame cache) are used by one
+    thread at a time.
+    """
+    def __init__(self, settings, repo_root, max_baselines=DEFAULT_MAX_BASELINES,
+                 max_blamed_files=DEFAULT_MAX_BLAMED_FILES):
+        self.settings = settings
+        self.repo_root = repo_root
+        self.baselines = BaselineCache(max_baselines)
+        self.blame_state = BlameState(repo_root, max_blamed_files)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compare-job")
+        self.started_at = time.time()
+        self.jobs = 0
+
+    def submit(self, job):
+        """
+        Run a job (the parsed JSON body of /compare) and return its result dict.
+        """
+        return self.executor.submit(self._run, job).result()
+
+    def _run(self, job):
+        old_file = job.get("old")
+        new_file = job.get("new")
+        if not isinstance(old_file, str) or not isinstance(new_file, str):
+            raise JobError(400, "'old' and 'new' log paths are required.")
+        old_file = warning_parser.find_log_file(old_file)
+        new_file = warning_parser.find_log_file(new_file)
+        old_file = snapshot.find_snapshot(old_file) or old_file
+        for path in (old_file, new_file):
+            if not os.path.exists(path):
+                raise JobError(404, f"Log file '{path}' does not exist.")
+        name = job.get("name") or os.path.basename(new_file)
+        match_moved = bool(job.get("match_moved", self.settings.match_moved))
+
+        start = time.perf_counter()
+        # Metrics are kept per job, so a long-running daemon does not collect them forever
+        log_utils.reset_metrics()
+        logger.info(f"\nJob {self.jobs + 1}: comparing '{old_file}' with '{new_file}'")
+        self.blame_state.refresh()
+        (counts1, details1, total1), cached = self.baselines.get(old_file, self.settings, match_moved)
+        counts2, details2, total2 = comparison.count_warnings(new_file, self.settings.use_mmap, True,
+                                                              self.settings.parse_workers,
+                                                              warning_filter=warning_filter.get_filter(self.settings))
+        infos = {}
+        if match_moved:
+            added = comparison.match_counts(counts1, details1, counts2, details2, infos=infos)
+        else:
+            added = comparison.diff_counts(counts1, counts2, details2, infos)
+        filepaths = {key[0] for key, _, _ in added}
+        signatures = self.blame_state.read_signatures(filepaths)
+        with log_utils.Stage("write", logger, log=name) as stage:
+            rows = list(compare_warnings.iter_csv_rows(added, self.repo_root, self.settings, infos))
+            stage.counts.update(rows=len(rows))
+        self.blame_state.record(filepaths, signatures)
+        self.jobs += 1
+        elapsed = time.perf_counter() - start
+        logger.info(f"Job {self.jobs} finished in {elapsed:.2f}s ({len(rows)} new warning types, "
+                    f"baseline {'cached' if cached else 'parsed'}).")
+        return {
+            "log": name,
+            "old": old_file,
+            "new": new_file,
+            "old_total": total1,
+            "new_total": total2,
+            "new_warnings": sum(extra for _, _, extra in added),
+            "baseline_cached": cached,
+            "elapsed": round(elapsed, 3),
+            "rows": rows,
+        }
+
+    def status(self):
+        return {
+            "repo_root": self.repo_root,
+            "head": self.blame_state.head,
+            "uptime": round(time.time() - self.started_at, 1),
+            "jobs": self.jobs,
+            "baselines": [path for path, _ in self.baselines.entries],
+            "baseline_cache": dict(self.baselines.stats),
+            "blamed_files": len(git_utils.global_blame_cache),
+            "invalidations": dict(self.blame_state.stats),
+        }
+
+def format_csv(rows):
+    """
+    Return rows as the CSV text compare_warnings.py writes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    writer.writerow(compare_warnings.CSV_HEADER)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+def format_json(result):
+    result = dict(result)
+    result["rows"] = [dict(zip(compare_warnings.CSV_HEADER, row)) for row in result["rows"]]
+    return json.dumps(result, indent=2)
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the daemon; self.server.service is the ComparisonService.
+    """
+    server_version = "compare-warnings-daemon"
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({"error": message}))
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/status":
+            self._send(200, json.dumps(self.server.service.status(), indent=2))
+        else:
+            self._send_error(404, f"Unknown endpoint '{self.path}'.")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/shutdown":
+            self._send(200, json.dumps({"stopping": True}))
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if url.path != "/compare":
+            self._send_error(404, f"Unknown endpoint '{self.path}'.")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send_error(413, "Request body too large.")
+            return
+        try:
+            job = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(job, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self._send_error(400, f"Invalid job: {e}")
+            return
+        output_format = parse_qs(url.query).get("format", [job.get("format", "json")])[0]
+        if output_format not in ("json", "csv"):
+            self._send_error(400, f"Unknown format '{output_format}', expected json or csv.")
+            return
+        try:
+            result = self.server.service.submit(job)
+        except JobError as e:
+            self._send_error(e.status, str(e))
+            return
+        except Exception as e:
+            logger.error(f"Error: Job failed: {e}")
+            self._send_error(500, f"Job failed: {e}")
+            return
+        if output_format == "csv":
+            self._send(200, format_csv(result["rows"]), "text/csv")
+        else:
+            self._send(200, format_json(result))
+
+    def log_message(self, format, *args):
+        # Requests are logged at the verbose level; Unix socket clients have no address
+        logger.log(log_utils.VERBOSE, "%s", format % args)
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """
+        HTTP server on a Unix socket.
+        """
+        daemon_threads = True
+else:
+    UnixHTTPServer = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve warning comparisons with warm caches for one repository.")
+    parser.add_argument("--repo", default=None, metavar="DIR",
+                        help="Repository checkout the logs are built from (default: the current directory)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help="Listen on a Unix socket instead of a TCP port")
+    parser.add_argument("--max-baselines", type=int, default=DEFAULT_MAX_BASELINES, metavar="N",
+                        help=f"Parsed old logs kept in memory (default: {DEFAULT_MAX_BASELINES})")
+    parser.add_argument("--max-blamed-files", type=int, default=DEFAULT_MAX_BLAMED_FILES, metavar="N",
+                        help=f"Files whose git blame maps are kept in memory (default: {DEFAULT_MAX_BLAMED_FILES})")
+    parser.add_argument("--config", dest="common_config", default=None, metavar="PATH",
+                        help="Settings file to use instead of common.config")
+    parser.add_argument("--no-blame-cache", action="store_true",
+                        help="Do not read or write the persistent git blame cache")
+    parser.add_argument("--log-level", choices=list(log_utils.LOG_LEVELS), default=None,
+                        help="Console verbosity: quiet (warnings and errors only), normal (default), verbose or debug")
+    parser.add_argument("-q", "--quiet", dest="log_level", action="store_const", const="quiet",
+                        help="Same as --log-level quiet")
+    parser.add_argument("-v", "--verbose", dest="log_level", action="store_const", const="verbose",
+                        help="Same as --log-level verbose")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = config.load_settings(args.common_config, log_level=args.log_level)
+    if settings.parse_workers <= 0:
+        settings.parse_workers = os.cpu_count() or 1
+    config.set_settings(settings)
+    log_utils.setup_logging(settings.log_level)
+
+    repo_root = git_utils.find_git_repo_root(args.repo)
+    blame_cache.configure(enabled=not args.no_blame_cache and repo_root is not None)
+    service = ComparisonService(settings, repo_root, args.max_baselines, args.max_blamed_files)
+
+    if args.socket:
+        if UnixHTTPServer is None:
+            logger.error("Error: Unix sockets are not supported on this system, use --port.")
+            sys.exit(1)
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, RequestHandler)
+        address = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), RequestHandler)
+        address = f"http://{args.host}:{server.server_address[1]}"
+    server.service = service
+    logger.info(f"Serving comparisons for '{repo_root}' on {address} (POST /compare, GET /status, POST /shutdown).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.executor.shutdown()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    logger.info("Daemon stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import bisect
+import codecs
+import io
+import subprocess
+import tempfile
+
+import git_utils
+import log_utils
+
+logger = log_utils.get_logger("diff_attribution")
+
+# Index built by load_index(): repository path -> BlameMap of the lines changed in the range
+_index = None
+# (repo_root, old_rev, new_rev) the index was built for
+_index_key = None
+
+def _unquote_path(path):
+    """
+    Undo git's C-style quoting of unusual path names ("a/caf\\303\\251.cpp").
+    """
+    path = path.rstrip('\t')
+    if len(path) >= 2 and path.startswith('"') and path.endswith('"'):
+        path = codecs.escape_decode(path[1:-1].encode('utf-8'))[0].decode('utf-8', errors='replace')
+    return path
+
+def _strip_prefix(path):
+    # "a/src/file.cpp" or "b/src/file.cpp" -> "src/file.cpp"; "/dev/null" -> None
+    path = _unquote_path(path)
+    if path == "/dev/null":
+        return None
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+def _parse_hunk_header(line):
+    """
+    Parse "@@ -a[,b] +c[,d] @@" into (a, b, c, d). Missing counts default to 1.
+    """
+    old_range, new_range = line.split(' ', 3)[1:3]
+    a, _, b = old_range[1:].partition(',')
+    c, _, d = new_range[1:].partition(',')
+    return int(a), int(b) if b else 1, int(c), int(d) if d else 1
+
+def _skip_hunk_bodies(lines):
+    """
+    Yield the lines of a patch that are not in the body of a hunk. The body of
+    "@@ -a,b +c,d @@" is the next b removed and d added lines (context lines count
+    as both), so a removed line such as "-- comment" or an added "++i;" is never
+    taken for a "--- " or "+++ " file header.
+    """
+    old_left = new_left = 0
+    for line in lines:
+        if old_left > 0 or new_left > 0:
+            marker = line[:1]
+            if marker == '-':
+                old_left -= 1
+                continue
+            if marker == '+':
+                new_left -= 1
+                continue
+            if marker == ' ':
+                old_left -= 1
+                new_left -= 1
+                continue
+            if marker == '\\':
+                # "\ No newline at end of file"
+                continue
+            # Not a hunk line: the counts were wrong, read it as a header line
+            old_left = new_left = 0
+        if line.startswith('@@ '):
+            try:
+                _, old_left, _, new_left = _parse_hunk_header(line)
+            except ValueError:
+                old_left = new_left = 0
+        yield line
+
+def _run_git(command, repo_root, parse):
+    """
+    Run a git command in repo_root and return (parse(lines of its output), None),
+    parsing the output while it is produced, or (None, error message) if git failed.
+    stderr goes to a temporary file, so git never blocks on a full stderr pipe
+    while its output is read. Raises FileNotFoundError if git is not installed.
+    """
+    with tempfile.TemporaryFile() as errors:
+        with subprocess.Popen(
+            command,
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+            stderr=errors,
+            stdin=subprocess.DEVNULL,
+        ) as process:
+            output = io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace', newline='\n')
+            result = parse(output)
+        if process.returncode != 0:
+            errors.seek(0)
+            return None, errors.read().decode('utf-8', errors='replace').strip()
+    return result, None
+
+def apply_hunks(line_map, hunks, record):
+    """
+    Update line_map (line number -> record) for one commit's change to a file.
+    hunks are the (a, b, c, d) ranges of a -U0 diff in file order: b lines removed at
+    line a of the old file, d lines added at line c of the new file.
+    Unchanged lines move by the size difference of the hunks before them, removed
+    lines are dropped and added lines are attributed to record.
+    Returns the new map.
+    """
+    new_map = {}
+    hunk_index = 0
+    offset = 0
+    for line_no in sorted(line_map):
+        while hunk_index < len(hunks):
+            a, b, _, d = hunks[hunk_index]
+            # Last old line touched by the hunk; a pure insertion (b == 0) goes after line a
+            end = a + b - 1 if b else a
+            if end >= line_no:
+                break
+            offset += d - b
+            hunk_index += 1
+        if hunk_index < len(hunks):
+            a, b, _, _ = hunks[hunk_index]
+            if b and a <= line_no:
+                # Removed or replaced by this commit
+                continue
+        new_map[line_no + offset] = line_map[line_no]
+    for _, _, c, d in hunks:
+        for line_no in range(c, c + d):
+            new_map[line_no] = record
+    return new_map
+
+def parse_log_patch(lines):
+    """
+    Parse the output of git log -p -U0 --reverse with the commit header format
+    "%x00%H%x00%cn%x00%ce" in a single streaming pass.
+    lines is any iterable of output lines (e.g. the stdout pipe of git log).
+    Commits are replayed oldest first, so line numbers always refer to the newest
+    version of each file; renames move the lines of a file to its new path.
+    Returns a map: repository path -> {line number: (committer, email, commit_hash)}
+    holding only the lines added by a commit in the range and not changed again since.
+    """
+    index = {}
+    record = None
+    # Path of the file whose diff is being read, and its hunks
+    path = None
+    old_path = None
+    hunks = []
+
+    def finish_file():
+        if path is not None and hunks:
+            index[path] = apply_hunks(index.get(path, {}), hunks, record)
+
+    for line in _skip_hunk_bodies(lines):
+        if line.startswith('\0'):
+            finish_file()
+            path = old_path = None
+            hunks = []
+            parts = line.rstrip('\n').split('\0')
+            if len(parts) >= 4:
+                record = (parts[2] or "N/A", parts[3] or "N/A", parts[1])
+        elif line.startswith('@@ '):
+            if path is not None:
+                try:
+                    hunks.append(_parse_hunk_header(line))
+                except ValueError:
+                    pass
+        elif line.startswith('diff --git '):
+            finish_file()
+            path = old_path = None
+            hunks = []
+        elif line.startswith('--- '):
+            old_path = _strip_prefix(line[4:].rstrip('\n'))
+        elif line.startswith('+++ '):
+            path = _strip_prefix(line[4:].rstrip('\n'))
+            if path is None and old_path is not None:
+                # The file was deleted
+                index.pop(old_path, None)
+        elif line.startswith('rename from '):
+            old_path = _unquote_path(line[12:].rstrip('\n'))
+        elif line.startswith('rename to '):
+            new_path = _unquote_path(line[10:].rstrip('\n'))
+            if old_path in index:
+                index[new_path] = index.pop(old_path)
+        elif line.startswith('Binary files '):
+            # Line numbers of binary files are meaningless
+            index.pop(old_path, None)
+    finish_file()
+    return {path: line_map for path, line_map in index.items() if line_map}
+
+def build_index(repo_root, old_rev, new_rev="HEAD"):
+    """
+    Attribute every line changed between old_rev and new_rev to the commit that
+    introduced it, with a single git log -p -U0 call over the whole range.
+    Merges along the first-parent chain are diffed against their first parent, so
+    changes merged from a branch are attributed to the merge commit.
+    Returns a map: repository path -> BlameMap, or None if git log failed.
+    """
+    command = ["git", "-c", "core.quotepath=off", "log", "-p", "-U0", "-M", "--reverse",
+               "--first-parent", "-m", "--no-color", "--no-ext-diff",
+               "--format=%x00%H%x00%cn%x00%ce", f"{old_rev}..{new_rev}", "--"]
+    try:
+        index, error = _run_git(command, repo_root, parse_log_patch)
+    except FileNotFoundError:
+        git_utils.git_blame_not_found = True
+        logger.error("Error: 'git' command not found. Ensure Git is installed and in your system's PATH.")
+        return None
+    if index is None:
+        logger.error(f"Error: git log {old_rev}..{new_rev} failed: {error}")
+        return None
+    return {path: git_utils.BlameMap(line_map) for path, line_map in index.items()}
+
+def load_index(repo_root, old_rev, new_rev="HEAD"):
+    """
+    Build the attribution index for a revision range once per process and keep it
+    for get_blame_map_for_file(). Returns the index, or None if git log failed.
+    """
+    global _index, _index_key
+    key = (repo_root, old_rev, new_rev)
+    if _index_key != key:
+        with log_utils.Stage("attribute", logger, range=f"{old_rev}..{new_rev}") as stage:
+            _index = build_index(repo_root, old_rev, new_rev)
+            _index_key = key
+            if _index is not None:
+                stage.counts.update(files=len(_index), lines=sum(len(line_map) for line_map in _index.values()))
+    return _index
+
+def get_blame_map_for_file(filepath, repo_root, old_rev, new_rev="HEAD"):
+    """
+    Return the map line number -> (committer, email, commit_hash) of the lines of
+    filepath changed in old_rev..new_rev. Lines not in the map were not changed in the
+    range, so no commit in it can be responsible for their warnings.
+    """
+    if filepath == "N/A":
+        return {}
+    index = load_index(repo_root, old_rev, new_rev)
+    if not index:
+        return {}
+    return index.get(git_utils.get_path_for_git(filepath, repo_root), {})
+
+def parse_diff_hunks(lines):
+    """
+    Parse the output of git diff -U0 --no-renames into a map:
+    repository path -> list of (a, b, c, d) hunks (see apply_hunks()).
+    Added and deleted files are left out, since their lines cannot be mapped.
+    """
+    hunks_by_path = {}
+    old_path = None
+    path = None
+    for line in _skip_hunk_bodies(lines):
+        if line.startswith('diff --git '):
+            old_path = path = None
+        elif line.startswith('--- '):
+            old_path = _strip_prefix(line[4:].rstrip('\n'))
+        elif line.startswith('+++ '):
+            path = _strip_prefix(line[4:].rstrip('\n'))
+            if path is None or path != old_path:
+                path = None
+        elif line.startswith('@@ ') and path is not None:
+            try:
+                hunks_by_path.setdefault(path, []).append(_parse_hunk_header(line))
+            except ValueError:
+                pass
+    return hunks_by_path
+
+class LineMap:
+    """
+    Maps line numbers of files at one revision to the same lines at a later revision,
+    using the hunks of git diff -U0 between them.
+    """
+    def __init__(self, hunks_by_path, repo_root=None):
+        self.repo_root = repo_root
+        # path -> (last old line of every hunk, hunks, line offset before every hunk)
+        self.files = {}
+        for path, hunks in hunks_by_path.items():
+            ends = []
+            offsets = []
+            offset = 0
+            for a, b, c, d in hunks:
+                ends.append(a + b - 1 if b else a)
+                offsets.append(offset)
+                offset += d - b
+            offsets.append(offset)
+            self.files[path] = (ends, hunks, offsets)
+
+    def map_line(self, filepath, line_no):
+        """
+        Return the line number that line line_no of filepath has at the later revision,
+        or None if the line was changed or removed in between.
+        """
+        entry = self.files.get(git_utils.get_path_for_git(filepath, self.repo_root))
+        if entry is None:
+            return line_no
+        ends, hunks, offsets = entry
+        # First hunk that ends at or after the line
+        index = bisect.bisect_left(ends, line_no)
+        if index < len(hunks):
+            a, b, _, _ = hunks[index]
+            if b and a <= line_no:
+                return None
+        return line_no + offsets[index]
+
+def build_line_map(repo_root, old_rev, new_rev="HEAD"):
+    """
+    Build a LineMap from old_rev to new_rev with a single git diff -U0 call.
+    Returns None if git diff failed.
+    """
+    command = ["git", "-c", "core.quotepath=off", "diff", "-U0", "--no-renames", "--no-color", "--no-ext-diff",
+               old_rev, new_rev, "--"]
+    try:
+        hunks_by_path, error = _run_git(command, repo_root, parse_diff_hunks)
+    except FileNotFoundError:
+        git_utils.git_blame_not_found = True
+        logger.error("Error: 'git' command not found. Ensure Git is installed and in your system's PATH.")
+        return None
+    if hunks_by_path is None:
+        logger.error(f"Error: git diff {old_rev} {new_rev} failed: {error}")
+        return None
+    return LineMap(hunks_by_path, repo_root)
@@ -0,0 +1,341 @@
+"""
+Out-of-core comparison of logs with more distinct warnings than fit in memory.
+
+Both logs are counted into warning_table.WarningCounts as usual. When the tables
+of a comparison grow beyond the spill limits (a number of distinct keys or an
+estimate of their memory), the table being filled is written to a temporary file
+as a run sorted by warning key and counting continues in an empty table. Once one
+log has spilled, the other is written as runs as well. The runs of every log are
+then merged (k-way) into one sorted stream per log, and the two streams are
+compared in a single pass, so only the new warnings are held in memory.
+
+The result is the same list of (key, text, extra) as comparison.diff_counts(), in
+the order the keys first appear in the new log: every run record keeps the index
+of its key's first occurrence, and the new warnings are sorted by it at the end.
+
+    limits = external_sort.SpillLimits(max_keys=5000000, max_memory_mb=1024)
+    added = comparison.compare_warnings(old_log, new_log, spill_limits=limits)
+"""
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+from collections.abc import Mapping
+from dataclasses import dataclass
+from operator import itemgetter
+
+import log_utils
+import warning_table
+
+logger = log_utils.get_logger("external_sort")
+
+# Default memory limit of the count tables of a comparison before they are spilled
+DEFAULT_SPILL_MEMORY_MB = 1024
+
+# Warnings counted between two checks of the spill limits
+SPILL_CHECK_INTERVAL = 65536
+
+# Run records pickled together; a batch is the unit read back during the merge
+RUN_BATCH_SIZE = 4096
+
+# Most runs merged at once; more runs are first merged into one run
+MAX_MERGE_WIDTH = 64
+
+@dataclass
+class SpillLimits:
+    """
+    When the count tables of a comparison are written to sorted runs. A limit of 0
+    is not checked; if both are 0, comparisons never spill.
+    """
+    # Distinct warning keys of both logs
+    max_keys: int = 0
+    # Estimated memory of both tables and their strings, in MB
+    max_memory_mb: float = DEFAULT_SPILL_MEMORY_MB
+    # Directory for the temporary run files (None = the system temporary directory)
+    directory: str = None
+
+    @property
+    def enabled(self):
+        return self.max_keys > 0 or self.max_memory_mb > 0
+
+def _read_run(path):
+    with open(path, "rb") as run_file:
+        while True:
+            try:
+                batch = pickle.load(run_file)
+            except EOFError:
+                return
+            yield from batch
+
+def _write_run(path, records):
+    with open(path, "wb") as run_file:
+        while True:
+            batch = list(itertools.islice(records, RUN_BATCH_SIZE))
+            if not batch:
+                return
+            pickle.dump(batch, run_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def merge_records(streams):
+    """
+    Merge record streams sorted by key into one, combining the records of equal keys.
+    Records are (key, count, first, text, info); counts are added up and the first
+    index, text and info of the earliest stream are kept, so streams must be in log order.
+    """
+    current = None
+    # heapq.merge() yields equal keys in the order of the streams
+    for key, count, first, text, info in heapq.merge(*streams, key=itemgetter(0)):
+        if current is not None and current[0] == key:
+            current[1] += count
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [key, count, first, text, info]
+    if current is not None:
+        yield tuple(current)
+
+class SortedRuns:
+    """
+    The run files of one log, in the order they were written.
+    """
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.paths = []
+        # Warnings in all runs, and the first-occurrence index of the next table's first key
+        self.total = 0
+        self.next_first = 0
+        self.written = 0
+
+    def _new_path(self):
+        self.written += 1
+        return os.path.join(self.directory, f"{self.name}_{self.written:05d}.run")
+
+    def write(self, counts):
+        """
+        Write a WarningCounts as a run sorted by key.
+        """
+        order = sorted(range(len(counts)), key=counts.key_of)
+        first = self.next_first
+        records = ((counts.key_of(row), counts.counts[row], first + row, counts.text_of(row), counts.info_of(row))
+                   for row in order)
+        path = self._new_path()
+        _write_run(path, records)
+        self.paths.append(path)
+        self.total += counts.total
+        self.next_first += len(counts)
+        if len(self.paths) >= MAX_MERGE_WIDTH:
+            self._compact()
+
+    def _compact(self):
+        # Merge all runs into one, so the final merge never opens too many files
+        path = self._new_path()
+        _write_run(path, merge_records([_read_run(run_path) for run_path in self.paths]))
+        for run_path in self.paths:
+            os.remove(run_path)
+        self.paths = [path]
+
+    def __iter__(self):
+        return merge_records([_read_run(path) for path in self.paths])
+
+class ExternalCounts(Mapping):
+    """
+    Read-only map: warning key -> number of occurrences, backed by the sorted runs
+    of a log. Iterates in key order, reading the runs again on every pass; lookups
+    scan the runs and are only meant for occasional use.
+    """
+    def __init__(self, runs, keep_details, work_dir):
+        self.runs = runs
+        self.keep_details = keep_details
+        self.total = runs.total
+        # Keeps the temporary directory of the runs alive as long as this map
+        self.work_dir = work_dir
+        self._length = None
+
+    def records(self):
+        """
+        Iterate over (key, count, first, text, info) in key order, where first is the
+        index of the key's first occurrence in the log, text its first warning text and
+        info the project path and compiling source of text (see WarningCounts.info_of()).
+        """
+        return iter(self.runs)
+
+    def items(self):
+        return ((key, count) for key, count, _, _, _ in self.records())
+
+    def details(self):
+        """
+        Return the map key -> first warning text of these counts.
+        """
+        return ExternalTexts(self)
+
+    def __getitem__(self, key):
+        for record in self.records():
+            if record[0] == key:
+                return record[1]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (record[0] for record in self.records())
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for _ in self.records())
+        return self._length
+
+class ExternalTexts(Mapping):
+    """
+    Read-only map: warning key -> first warning text, backed by an ExternalCounts.
+    Empty if the counts do not keep details.
+    """
+    def __init__(self, counts):
+        self.counts = counts
+
+    def __getitem__(self, key):
+        if self.counts.keep_details:
+            for record in self.counts.records():
+                if record[0] == key:
+                    return record[3]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.counts) if self.counts.keep_details else iter(())
+
+    def __len__(self):
+        return len(self.counts) if self.counts.keep_details else 0
+
+class ExternalComparison:
+    """
+    Spill state of one comparison: the old and the new log (sides 0 and 1), the
+    tables kept in memory and, once the limits were exceeded, the runs of both logs.
+    """
+    def __init__(self, limits):
+        self.limits = limits
+        self.spilled = False
+        # Table of each side that is held in memory, until it is spilled
+        self.tables = [None, None]
+        self.runs = [None, None]
+        self.work_dir = None
+        self.old = LogSpill(self, 0)
+        self.new = LogSpill(self, 1)
+
+    def exceeded(self, counts, side):
+        """
+        Return True if counts, being filled for side, and the table of the other
+        side together exceed the limits.
+        """
+        tables = [counts] + [table for table in (self.tables[1 - side],) if table is not None]
+        if self.limits.max_keys > 0 and sum(len(table) for table in tables) > self.limits.max_keys:
+            return True
+        if self.limits.max_memory_mb > 0:
+            string_tables = {id(table.strings): table.strings for table in tables}
+            size = sum(table.memory_size() for table in tables)
+            size += sum(strings.memory_size() for strings in string_tables.values())
+            return size > self.limits.max_memory_mb * 1024 * 1024
+        return False
+
+    def spill(self, side, counts):
+        """
+        Write counts of side as a run. On the first spill, the table held for the
+        other side is written as well and both logs continue in runs.
+        """
+        if not self.spilled:
+            self.spilled = True
+            self.work_dir = tempfile.TemporaryDirectory(prefix="comparewarning_runs_", dir=self.limits.directory)
+            self.runs = [SortedRuns(self.work_dir.name, "old"), SortedRuns(self.work_dir.name, "new")]
+            logger.info(f"Warning counts exceed the spill limits, comparing through sorted runs in '{self.work_dir.name}'.")
+            other = self.tables[1 - side]
+            if other is not None:
+                self.runs[1 - side].write(other)
+                self.tables[1 - side] = None
+        with log_utils.Stage("spill", logger, keys=len(counts)) as stage:
+            self.runs[side].write(counts)
+            stage.counts.update(runs=len(self.runs[side].paths))
+
+    def counts(self, side):
+        """
+        Return the final counts of side: its table, or an ExternalCounts over its runs.
+        """
+        if self.spilled:
+            return ExternalCounts(self.runs[side], side == 1, self.work_dir)
+        return self.tables[side]
+
+class LogSpill:
+    """
+    The side of an ExternalComparison that one log is counted into
+    (see comparison.count_warnings()).
+    """
+    def __init__(self, comparison, side):
+        self.comparison = comparison
+        self.side = side
+
+    def strings(self):
+        """
+        Return the StringTable to count into: the one of the other side's table while
+        it is held in memory, so both tables are compared on integer keys.
+        """
+        other = self.comparison.tables[1 - self.side]
+        return other.strings if other is not None else warning_table.StringTable()
+
+    def check(self, counts):
+        """
+        Return the table to continue counting into: counts, or a new empty table
+        once counts was spilled.
+        """
+        if not len(counts) or not self.comparison.exceeded(counts, self.side):
+            return counts
+        self.comparison.spill(self.side, counts)
+        return warning_table.WarningCounts(warning_table.StringTable(), counts.keep_details)
+
+    def count(self, warnings, counts):
+        """
+        Count an iterable of warnings like WarningCounts.count(), checking the
+        limits every SPILL_CHECK_INTERVAL warnings. Returns the table of the last warnings.
+        """
+        warnings = iter(warnings)
+        while True:
+            before = counts.total
+            counts.count(itertools.islice(warnings, SPILL_CHECK_INTERVAL))
+            if counts.total == before:
+                return counts
+            counts = self.check(counts)
+
+    def finish(self, counts):
+        """
+        Finish counting a log: if the comparison spilled, the last table is written
+        as a run too. Returns the counts of the log (see ExternalComparison.counts()).
+        """
+        counts = self.check(counts)
+        if self.comparison.spilled:
+            if len(counts):
+                self.comparison.spill(self.side, counts)
+        else:
+            self.comparison.tables[self.side] = counts
+        return self.comparison.counts(self.side)
+
+def diff_external(counts1, counts2, infos=None):
+    """
+    Compare two ExternalCounts in one pass over their merged runs.
+    Returns a list of tuples (key, warning_text, additional_count) like
+    comparison.diff_counts(), in the order the keys first occur in the new log.
+    If infos is a dict, the project path and compiling source of every returned
+    key are stored in it, as comparison.diff_counts() does.
+    """
+    added = []
+    with log_utils.Stage("compare", logger, external=True) as stage:
+        old_records = counts1.records()
+        old = next(old_records, None)
+        keys = 0
+        for key, count2, first, text, info in counts2.records():
+            keys += 1
+            while old is not None and old[0] < key:
+                old = next(old_records, None)
+            count1 = old[1] if old is not None and old[0] == key else 0
+            if count2 > count1:
+                added.append((first, key, text, count2 - count1))
+                if infos is not None and info is not None:
+                    infos[key] = info
+        # First-occurrence indexes are unique, so this never compares keys
+        added.sort(key=itemgetter(0))
+        stage.counts.update(keys=keys, increased=len(added))
+    return [(key, text, extra) for _, key, text, extra in added]
@@ -0,0 +1,226 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import git_utils
+import log_utils
+import warning_parser
+
+logger = log_utils.get_logger("follow")
+
+# Seconds to wait before checking a followed log for new output again
+POLL_INTERVAL = 0.5
+
+# Stop following a log when nothing was appended to it for this many seconds
+DEFAULT_IDLE_TIMEOUT = 300
+
+# Last line of an MSBuild console log, e.g. "Time Elapsed 00:12:34.56"
+BUILD_END_PATTERN = re.compile(r'^\s*(?:\d+>)?\s*Time Elapsed \d+:\d\d:\d\d')
+
+def tail_lines(filename, stop_event, poll_interval=POLL_INTERVAL, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    """
+    Yield the lines of a log file that is still being written, as they are completed.
+    Only newly appended bytes are read; a line is yielded once its newline has been
+    written, decoded like a text-mode file opened with encoding='utf-8', errors='ignore'.
+    Waits for the file to appear. Stops after the MSBuild summary line ("Time Elapsed ...")
+    once the file has been read to the end, when nothing was appended for idle_timeout
+    seconds, or when stop_event is set.
+    """
+    f = None
+    buffer = b""
+    position = 0
+    finished = False
+    last_growth = time.monotonic()
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(filename, 'rb')
+                except FileNotFoundError:
+                    pass
+            chunk = f.read(warning_parser.READ_CHUNK_SIZE) if f is not None else b""
+            if chunk:
+                position += len(chunk)
+                last_growth = time.monotonic()
+                buffer += chunk
+                end = buffer.rfind(b'\n')
+                if end >= 0:
+                    segment, buffer = buffer[:end + 1], buffer[end + 1:]
+                    for line in warning_parser._decode_segment(segment):
+                        yield line
+                        if BUILD_END_PATTERN.match(line):
+                            finished = True
+                # Keep reading while there is output, sleep only at the end of the file
+                continue
+
+            if finished or stop_event.is_set() or time.monotonic() - last_growth >= idle_timeout:
+                break
+            if f is not None:
+                try:
+                    size = os.path.getsize(filename)
+                except OSError:
+                    size = position
+                if size < position:
+                    logger.warning(f"Warning: '{filename}' was truncated or replaced while being followed; stopping.")
+                    break
+            stop_event.wait(poll_interval)
+
+        # A last line without a newline
+        if buffer:
+            yield from warning_parser._decode_segment(buffer)
+    finally:
+        if f is not None:
+            f.close()
+
+class LiveComparison:
+    """
+    Running comparison of a log that is still being written against the warning
+    counts of a baseline log.
+    """
+    def __init__(self, baseline_counts):
+        self.baseline_counts = baseline_counts
+        self.counts = {}
+        self.details = {}
+        # Key -> (project path, compiling source) of its first text, see comparison.diff_counts()
+        self.infos = {}
+        self.total = 0
+        # Held while counting, so added_warnings() can be called from another thread
+        self.lock = threading.Lock()
+
+    def add(self, key, text):
+        """
+        Count one warning of the followed log. Returns the number of occurrences of
+        the warning above the baseline (0 if it is not above the baseline).
+        """
+        with self.lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            self.total += 1
+            # Keep the first encountered text for this key
+            if key not in self.details:
+                self.details[key] = text
+                self.infos[key] = warning_parser.extract_warning_info(text)
+        return max(0, count - self.baseline_counts.get(key, 0))
+
+    def added_warnings(self):
+        """
+        Return the current (key, warning_text, additional_count) tuples, in the same
+        form and order as comparison.diff_counts().
+        """
+        baseline_counts = self.baseline_counts
+        with self.lock:
+            return [(key, self.details[key], count - baseline_counts.get(key, 0))
+                    for key, count in self.counts.items() if count > baseline_counts.get(key, 0)]
+
+class LiveWriter:
+    """
+    Calls write() on a background thread after notify(), at most once per interval
+    seconds, so a live output file catches up with new warnings and blame results
+    even when the followed log has no new lines for a while. Notifications that
+    arrive while waiting or writing are combined into the next write.
+    """
+    def __init__(self, write, interval):
+        self.write = write
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="live-writer", daemon=True)
+        self.thread.start()
+
+    def notify(self):
+        self.wake.set()
+
+    def _run(self):
+        last_write = None
+        while True:
+            self.wake.wait()
+            if self.stopped.is_set():
+                return
+            if last_write is not None:
+                delay = last_write + self.interval - time.monotonic()
+                if delay > 0 and self.stopped.wait(delay):
+                    return
+            self.wake.clear()
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning(f"Warning: Cannot update the live output: {e}")
+            last_write = time.monotonic()
+
+    def close(self):
+        """
+        Stop the writer thread; pending notifications are dropped.
+        """
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+
+class AsyncBlamer:
+    """
+    Runs git blame for warning lines in a thread pool, so the reader of a followed log
+    never waits on git. Results go to the global blame cache in git_utils. Lines requested
+    for a file while it is being blamed are blamed together in the next run for that file,
+    so at most one git blame per file runs at a time.
+    """
+    def __init__(self, repo_root=None, max_workers=git_utils.DEFAULT_BLAME_WORKERS):
+        self.repo_root = repo_root
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.lock = threading.Lock()
+        # filepath -> line numbers waiting to be blamed
+        self.waiting = {}
+        # Files that have a blame task queued or running
+        self.running = set()
+        # Called with the file path after each git blame run, see add_listener()
+        self.listeners = []
+
+    def request(self, filepath, line_no):
+        """
+        Queue a warning line for blaming, unless it is already in the blame cache.
+        """
+        if filepath == "N/A" or not line_no.isdigit() or git_utils.git_blame_not_found:
+            return
+        line_no = int(line_no)
+        covered = git_utils.global_blame_covered_lines.get(filepath, set())
+        if filepath in git_utils.global_blame_cache and (covered is None or line_no in covered):
+            return
+        with self.lock:
+            self.waiting.setdefault(filepath, set()).add(line_no)
+            if filepath in self.running:
+                return
+            self.running.add(filepath)
+        self.executor.submit(self._blame_file, filepath)
+
+    def add_listener(self, listener):
+        """
+        Call listener(filepath) on a blame thread whenever new blame results for
+        filepath are in the blame cache.
+        """
+        with self.lock:
+            self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners = [other for other in self.listeners if other is not listener]
+
+    def _blame_file(self, filepath):
+        while True:
+            with self.lock:
+                lines = self.waiting.pop(filepath, None)
+                if not lines:
+                    self.running.discard(filepath)
+                    return
+            try:
+                git_utils.get_blame_map_for_file(filepath, self.repo_root, lines)
+            except Exception as e:
+                logger.warning(f"Warning: git blame failed for '{filepath}': {e}")
+                continue
+            for listener in self.listeners:
+                listener(filepath)
+
+    def shutdown(self):
+        """
+        Wait for all queued blame tasks to finish.
+        """
+        self.executor.shutdown(wait=True)
@@ -1,8 +1,16 @@
 import subprocess
-import sys
-import re
+import io
 import os
-import configparser
+from array import array
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+
+import blame_cache
+import config
+import log_utils
+import path_resolver
+
+logger = log_utils.get_logger("git_utils")
 
 # Initialize a flag to prevent repeated 'git not found' warnings
 git_blame_not_found = False
@@ -11,56 +19,41 @@ git_blame_not_found = False
 # Key: file path, Value: blame map
 global_blame_cache = {}
 
-# Read configuration file
-def read_config():
-    config = configparser.ConfigParser()
-    try:
-        # Use absolute path to read config file
-        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common.config')
-        config.read(config_path)
-        debug_enabled = config.getboolean('DEFAULT', 'enableDebug', fallback=False)
-        return {'enableDebug': debug_enabled}
-    except Exception as e:
-        print(f"Warning: Error reading common.config: {e}", file=sys.stderr)
-        return {'enableDebug': False}
+# Line numbers covered by the blame map of each file in global_blame_cache.
+# Key: file path, Value: set of line numbers, or None if the whole file was blamed
+global_blame_covered_lines = {}
+
+# Characters of a commit hash in git blame --porcelain header lines
+_HEX_DIGITS = "0123456789abcdef"
+
+# Line numbers that are at most this many lines apart are blamed as one -L range
+BLAME_RANGE_MERGE_GAP = 10
 
-# Get debug mode status
+# If the lines of a file need more -L ranges than this, the whole file is blamed instead
+MAX_BLAME_RANGES = 50
+
+# Default number of git blame subprocesses run at the same time by prefetch_blame_maps()
+DEFAULT_BLAME_WORKERS = config.DEFAULT_BLAME_WORKERS
+
+# Get debug mode status from the settings loaded at startup (no file I/O per call)
 def is_debug_enabled():
-    return read_config()['enableDebug']
+    return config.get_settings().enable_debug
 
 def get_actual_case_path(repo_root, rel_path):
     """
     Given the repo_root and a relative path, this function returns the actual stored path 
     using the correct case. On Windows, although the file system is case-insensitive, 
     Git requires the path's case to match exactly what is stored in the repository.
-    This function recursively traverses each component of the path to correct its case.
+    Each path component is looked up in cached directory listings (see path_resolver.py).
+    Components that do not exist are kept as given.
     """
-    components = rel_path.split(os.sep)
-    current_dir = repo_root
-    corrected_components = []
-    for comp in components:
-        try:
-            entries = os.listdir(current_dir)
-        except Exception:
-            corrected_components.append(comp)
-            current_dir = os.path.join(current_dir, comp)
-            continue
-        found = None
-
-        for entry in entries:
-            if entry.lower() == comp.lower():
-                found = entry
-                break
-        if found:
-            corrected_components.append(found)
-            current_dir = os.path.join(current_dir, found)
-        else:
-            corrected_components.append(comp)
-            current_dir = os.path.join(current_dir, comp)
-    return os.path.join(*corrected_components)
+    corrected = get_path_resolver(repo_root).correct_case(rel_path)
+    if corrected is None:
+        return rel_path
+    return corrected.replace('/', os.sep)
 
-def find_git_repo_root():
-    """Attempts to find the root directory of the Git repository based on the current working directory."""
+def find_git_repo_root(cwd=None):
+    """Attempts to find the root directory of the Git repository based on the current working directory (or cwd)."""
     global git_blame_not_found # Allow modification of the global flag
     try:
         # Run git command to find the top-level directory relative to cwd
@@ -73,175 +66,292 @@ def find_git_repo_root():
             check=False, # Don't throw error on failure
             # Ensure subprocess doesn't inherit handles that might cause issues
             stdin=subprocess.DEVNULL,
+            cwd=cwd,
         )
         if result.returncode == 0:
             repo_root = result.stdout.strip()
-            print(f"Info: Determined Git repository root as: {repo_root}")
+            logger.info(f"Info: Determined Git repository root as: {repo_root}")
             return repo_root
         else:
             # This is not necessarily an error, could be running outside a repo.
-            print(f"Warning: Could not determine Git repository root from current directory.", file=sys.stderr)
-            print(f"         'git blame' will run without explicit 'cwd'. Path case sensitivity issues may occur.", file=sys.stderr)
+            logger.warning(f"Warning: Could not determine Git repository root from current directory.")
+            logger.warning(f"         'git blame' will run without explicit 'cwd'. Path case sensitivity issues may occur.")
             if result.stderr:
-                 print(f"         Git error: {result.stderr.strip()}", file=sys.stderr)
+                 logger.warning(f"         Git error: {result.stderr.strip()}")
             return None
     except FileNotFoundError:
         # Git command itself not found.
         if not git_blame_not_found: # Prevent flooding logs if git is missing
-            print(f"Warning: 'git' command not found. Git blame functionality disabled.", file=sys.stderr)
+            logger.warning(f"Warning: 'git' command not found. Git blame functionality disabled.")
             git_blame_not_found = True # Set the global flag
         return None
     except Exception as e:
-        print(f"Warning: Error while trying to find Git repository root: {e}", file=sys.stderr)
+        logger.warning(f"Warning: Error while trying to find Git repository root: {e}")
         return None
 
-def get_blame_map_for_file(filepath, repo_root=None):
+def _to_line_numbers(lines):
     """
-    Preload git blame info for all lines in a file and return a map:
-    line number -> (author, email, commit_hash)
+    Convert an iterable of line numbers (ints or numeric strings) to a set of
+    positive ints, ignoring values such as "N/A".
     """
-    global git_blame_not_found, global_blame_cache
-    
-    # Check if the file's blame map is already in the global cache
-    if filepath in global_blame_cache:
-        if is_debug_enabled():
-            print(f"Cache hit: Getting blame info for file '{filepath}' from global cache")
-        return global_blame_cache[filepath]
-    
-    blame_map = {}
-    # Cache for storing author and email info for each commit
-    commit_info_cache = {}
+    numbers = set()
+    for line in lines:
+        try:
+            number = int(line)
+        except (TypeError, ValueError):
+            continue
+        if number > 0:
+            numbers.add(number)
+    return numbers
 
-    if filepath == "N/A" or git_blame_not_found:
-        return blame_map
+def get_line_ranges(line_numbers, merge_gap=BLAME_RANGE_MERGE_GAP):
+    """
+    Merge a set of line numbers into sorted, inclusive (start, end) ranges.
+    Lines that are at most merge_gap lines apart end up in the same range.
+    """
+    ranges = []
+    for number in sorted(line_numbers):
+        if ranges and number - ranges[-1][1] <= merge_gap + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return [(start, end) for start, end in ranges]
 
-    exec_cwd = repo_root
-    path_for_git = filepath
-    using_relative_path = False
+def get_path_resolver(repo_root=None):
+    """
+    Return the path resolver of this process for repo_root, with the path prefix
+    maps of the current settings.
+    """
+    return path_resolver.get_resolver(repo_root, config.get_settings().path_maps)
 
-    if repo_root and os.path.isabs(filepath):
-        try:
-            norm_repo_root = os.path.normcase(os.path.realpath(repo_root))
-            norm_filepath = os.path.normcase(os.path.realpath(filepath))
-        except OSError:
-            norm_repo_root = os.path.normcase(os.path.normpath(repo_root))
-            norm_filepath = os.path.normcase(os.path.normpath(filepath))
-
-        if norm_filepath.startswith(norm_repo_root + os.sep) or norm_filepath == norm_repo_root:
-            try:
-                relative_path = os.path.relpath(filepath, repo_root)
-                if os.name == "nt":
-                    relative_path = get_actual_case_path(repo_root, relative_path)
-                path_for_git = relative_path.replace(os.sep, '/')
-                using_relative_path = True
-            except ValueError:
-                path_for_git = filepath
-    elif not os.path.isabs(filepath):
-        path_for_git = filepath.replace(os.sep, '/')
-
-    blame_command = [
-        "git", "blame",
-        "--porcelain",
-        "--", path_for_git
-    ]
+def get_path_for_git(filepath, repo_root=None):
+    """
+    Return the path to pass to git for filepath: relative to repo_root (with the
+    case stored in the repository) after applying the path prefix maps, or the path
+    itself if there is no repo_root or it is an absolute path outside repo_root.
+    Returns None if filepath is not a file in the repository; such files are never
+    passed to git. Results are cached per file.
+    """
+    return get_path_resolver(repo_root).resolve(filepath)
+
+class BlameMap(MutableMapping):
+    """
+    Compact map: line number -> (author, email, commit_hash).
+    Each commit's record tuple is stored once and lines hold an index into the
+    record list in an array, instead of a dict entry with a tuple per line.
+    """
+    __slots__ = ("records", "record_index", "line_records", "line_count")
+
+    def __init__(self, items=None):
+        self.records = []
+        self.record_index = {}
+        self.line_records = array('i')
+        self.line_count = 0
+        if items:
+            self.update(items)
+
+    def intern_record(self, author, email, commit_hash):
+        """
+        Return the index of the shared record for a commit, adding it if needed.
+        """
+        index = self.record_index.get(commit_hash)
+        if index is None:
+            index = len(self.records)
+            self.records.append((author, email, commit_hash))
+            self.record_index[commit_hash] = index
+        return index
+
+    def set_line(self, line_no, index):
+        """
+        Point a line at an interned record index.
+        """
+        line_records = self.line_records
+        if line_no >= len(line_records):
+            line_records.extend([-1] * (line_no + 1 - len(line_records)))
+        if line_records[line_no] < 0:
+            self.line_count += 1
+        line_records[line_no] = index
+
+    def __getitem__(self, line_no):
+        if isinstance(line_no, int) and 0 < line_no < len(self.line_records):
+            index = self.line_records[line_no]
+            if index >= 0:
+                return self.records[index]
+        raise KeyError(line_no)
+
+    def __setitem__(self, line_no, record):
+        author, email, commit_hash = record
+        self.set_line(line_no, self.intern_record(author, email, commit_hash))
+
+    def __delitem__(self, line_no):
+        self[line_no]  # Raise KeyError for missing lines
+        self.line_records[line_no] = -1
+        self.line_count -= 1
+
+    def __contains__(self, line_no):
+        return (isinstance(line_no, int) and 0 < line_no < len(self.line_records)
+                and self.line_records[line_no] >= 0)
+
+    def __iter__(self):
+        for line_no, index in enumerate(self.line_records):
+            if index >= 0:
+                yield line_no
+
+    def __len__(self):
+        return self.line_count
+
+def parse_blame_porcelain(lines):
+    """
+    Parse git blame --porcelain output in a single streaming pass.
+    lines is any iterable of output lines (e.g. the stdout pipe of git blame).
+    The committer and committer e-mail are read only from the first header block of
+    each commit; later lines of the same commit reuse its interned record.
+    Returns a BlameMap: line number -> (author, email, commit_hash).
+    """
+    blame_map = BlameMap()
+    record_index = blame_map.record_index
+    set_line = blame_map.set_line
+
+    expect_header = True
+    final_line = 0
+    index = -1
+    # Committer info of a commit seen for the first time, None for known commits
+    new_commit = None
+    committer = "N/A"
+    email = "N/A"
+
+    for line in lines:
+        if expect_header:
+            # "<commit> <original line> <final line> [<lines in group>]"
+            parts = line.split()
+            if (len(parts) < 3 or len(parts[0]) < 40 or parts[0].strip(_HEX_DIGITS)
+                    or not parts[2].isdigit()):
+                continue
+            commit_hash = parts[0]
+            final_line = int(parts[2])
+            index = record_index.get(commit_hash, -1)
+            new_commit = commit_hash if index < 0 else None
+            committer = "N/A"
+            email = "N/A"
+            expect_header = False
+        elif line.startswith('\t'):
+            # Content line: the blamed line itself
+            if new_commit is not None:
+                index = blame_map.intern_record(committer, email, new_commit)
+                new_commit = None
+            if final_line > 0:
+                set_line(final_line, index)
+            expect_header = True
+        elif new_commit is not None:
+            if line.startswith("committer "):
+                committer = line[10:].strip()
+            elif line.startswith("committer-mail "):
+                email = line[15:].strip().strip('<>')
+
+    # A header without a content line at the end of the output still counts
+    if not expect_header and final_line > 0:
+        if new_commit is not None:
+            index = blame_map.intern_record(committer, email, new_commit)
+        set_line(final_line, index)
+    return blame_map
 
+def run_git_blame(path_for_git, exec_cwd=None, line_ranges=None):
+    """
+    Run git blame --porcelain for a file, restricted to line_ranges
+    (a list of inclusive (start, end) tuples) if given.
+    The output is parsed incrementally from the process pipe instead of being buffered.
+    Returns a BlameMap: line number -> (author, email, commit_hash),
+    or None if git blame failed.
+    """
+    global git_blame_not_found
+
+    blame_command = ["git", "blame", "--porcelain"]
+    for start, end in line_ranges or []:
+        blame_command.append(f"-L{start},{end}")
+    blame_command += ["--", path_for_git]
+
+    blame_map = BlameMap()
+    log_utils.add_counts(blame_subprocesses=1)
     try:
-        blame_result = subprocess.run(
+        with subprocess.Popen(
             blame_command,
             cwd=exec_cwd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace',
-            check=False,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             stdin=subprocess.DEVNULL,
-        )
-
-        if blame_result.returncode != 0:
-            return blame_map
-
-        lines = blame_result.stdout.splitlines()
-        current_line = 0
-        pending_commit = None
-        pending_author = None
-        pending_email = None
-        line_index = 0
-            
-        while line_index < len(lines):
-            line = lines[line_index]
-            if re.match(r'^[0-9a-f]{40} ', line):
-                parts = line.split()
-                if len(parts) >= 3:
-                    pending_commit = parts[0]
-                    try:
-                        current_line = int(parts[2])
-                    except ValueError:
-                        current_line = 0
-                
-                # Check if we already have info for this commit in our cache
-                if pending_commit in commit_info_cache:
-                    pending_author, pending_email = commit_info_cache[pending_commit]
-                    line_index += 1  # Increment line index to process next line
-                else:
-                    pending_author = "N/A"
-                    pending_email = "N/A"
-                    line_index += 1  # Increment line index to process next line
-                    
-                    # Save current line index for backtracking
-                    start_index = line_index
-                    
-                    # Look for committer and email information
-                    committer_found = False
-                    email_found = False
-                    committer_value = "N/A"
-                    email_value = "N/A"
-                    
-                    # First scan through to find committer and email info
-                    scan_index = start_index
-                    while scan_index < len(lines) and not lines[scan_index].startswith('\t'):
-                        current_line_content = lines[scan_index]
-                        
-                        if current_line_content.startswith("committer "):
-                            committer_value = current_line_content[10:].strip()
-                            committer_found = True
-                        elif current_line_content.startswith("committer-mail "):
-                            email_value = current_line_content[15:].strip().strip('<>')
-                            email_found = True
-                        
-                        scan_index += 1
-                    
-                    # Update committer and email information
-                    if committer_found:
-                        pending_author = committer_value
-                    if email_found:
-                        pending_email = email_value
-                    
-                    # Store author and email info in commit cache
-                    commit_info_cache[pending_commit] = (pending_author, pending_email)
-                    
-                    # Continue processing other header information
-                    while line_index < len(lines) and not lines[line_index].startswith('\t'):
-                        line_index += 1
-                
-                if line_index < len(lines) and lines[line_index].startswith('\t'):
-                    if current_line > 0 and pending_commit:
-                        blame_map[current_line] = (pending_author, pending_email, pending_commit)
-                    current_line += 1
-                    line_index += 1
-                elif current_line > 0 and pending_commit:
-                    # If no content line is found but we have line number and commit, add to blame_map anyway
-                    blame_map[current_line] = (pending_author, pending_email, pending_commit)
-            else:
-                line_index += 1
+        ) as process:
+            # Split on '\n' only, so '\r' inside source lines cannot break the format
+            output = io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace', newline='\n')
+            blame_map = parse_blame_porcelain(output)
+        if process.returncode != 0:
+            return None
     except FileNotFoundError:
         git_blame_not_found = True
     except Exception:
         pass
-    
-    # Store the blame map in the global cache
-    global_blame_cache[filepath] = blame_map
+    return blame_map
+
+def get_blame_map_for_file(filepath, repo_root=None, lines=None):
+    """
+    Preload git blame info for a file and return a map:
+    line number -> (author, email, commit_hash)
+    If lines is given, only those line numbers are blamed (git blame -L with merged
+    ranges), unless they are spread over so many ranges that blaming the whole file
+    is cheaper. Without lines, all lines of the file are blamed.
+    """
+    global git_blame_not_found, global_blame_cache
+
+    wanted = None if lines is None else _to_line_numbers(lines)
+
+    # Check if the file's blame map is already in the global cache
+    if filepath in global_blame_cache:
+        covered = global_blame_covered_lines.get(filepath)
+        if covered is None or (wanted is not None and wanted <= covered):
+            if is_debug_enabled():
+                logger.debug(f"Cache hit: Getting blame info for file '{filepath}' from global cache")
+            log_utils.add_counts(blame_memory_hits=1)
+            return global_blame_cache[filepath]
+        # Only blame the lines that are not cached yet
+        if wanted is not None:
+            wanted -= covered
+
+    if filepath == "N/A" or git_blame_not_found:
+        return {}
+
+    exec_cwd = repo_root
+    path_for_git = get_path_for_git(filepath, repo_root)
+    if path_for_git is None:
+        # Not a file in the repository: git blame would fail
+        return global_blame_cache.get(filepath, {})
+
+    line_ranges = None
+    if wanted:
+        line_ranges = get_line_ranges(wanted)
+        if len(line_ranges) > MAX_BLAME_RANGES:
+            # Too many separate ranges, a whole-file blame is cheaper
+            line_ranges = None
+
+    blame_map = run_git_blame(path_for_git, exec_cwd, line_ranges)
+    if blame_map is None and line_ranges:
+        # A range can fail, e.g. when a warning line is past the end of the file
+        # at HEAD. Fall back to blaming the whole file.
+        line_ranges = None
+        blame_map = run_git_blame(path_for_git, exec_cwd)
+    if blame_map is None:
+        return global_blame_cache.get(filepath, {})
+
+    # Store the blame map in the global cache, merging with lines blamed earlier
+    if filepath in global_blame_cache:
+        global_blame_cache[filepath].update(blame_map)
+        blame_map = global_blame_cache[filepath]
+    else:
+        global_blame_cache[filepath] = blame_map
+    if line_ranges is None:
+        global_blame_covered_lines[filepath] = None
+    else:
+        global_blame_covered_lines[filepath] = global_blame_covered_lines.get(filepath, set()) | wanted
     if is_debug_enabled():
-        print(f"Cache created: Added blame info for file '{filepath}' to global cache, containing {len(blame_map)} lines")
+        logger.debug(f"Cache created: Added blame info for file '{filepath}' to global cache, containing {len(blame_map)} lines")
     return blame_map
 
 def get_git_blame_info(filepath, line_no, repo_root=None):
@@ -270,5 +380,101 @@ def get_git_blame_info(filepath, line_no, repo_root=None):
         # If not found in blame map, return default values
         return "N/A", "N/A", "N/A"
     except Exception as e:
-        print(f"Warning: An error occurred during git blame for {filepath} at line {line_no}: {e}", file=sys.stderr)
+        logger.warning(f"Warning: An error occurred during git blame for {filepath} at line {line_no}: {e}")
         return "N/A", "N/A", "N/A"
+
+def forget_blame_maps(filepaths=None):
+    """
+    Drop the cached blame maps of filepaths (of all files if None) from the
+    in-memory cache, e.g. after the files or HEAD changed.
+    """
+    if filepaths is None:
+        global_blame_cache.clear()
+        global_blame_covered_lines.clear()
+        return
+    for filepath in filepaths:
+        global_blame_cache.pop(filepath, None)
+        global_blame_covered_lines.pop(filepath, None)
+
+def prefetch_blame_maps(file_lines, repo_root=None, max_workers=DEFAULT_BLAME_WORKERS):
+    """
+    Run git blame for many files concurrently and store the results in the global cache.
+    file_lines maps each file path to the line numbers needed from it (or None to blame
+    the whole file); a plain iterable of file paths blames whole files. "N/A" entries
+    are skipped, and at most max_workers git subprocesses run at a time.
+    Returns the number of files that were blamed.
+    """
+    if not isinstance(file_lines, dict):
+        file_lines = dict.fromkeys(file_lines)
+
+    with log_utils.Stage("blame", logger) as stage:
+        blamed = _prefetch_blame_maps(file_lines, repo_root, max_workers)
+        stage.counts.update(files=len(file_lines), blamed=blamed)
+    return blamed
+
+def _prefetch_blame_maps(file_lines, repo_root, max_workers):
+    """
+    Implementation of prefetch_blame_maps() for a dict of file path -> line numbers.
+    """
+    pending = []
+    for filepath, lines in file_lines.items():
+        if filepath == "N/A" or get_path_for_git(filepath, repo_root) is None:
+            continue
+        if filepath in global_blame_cache:
+            covered = global_blame_covered_lines.get(filepath)
+            if covered is None or (lines is not None and _to_line_numbers(lines) <= covered):
+                continue
+        pending.append((filepath, lines))
+
+    if not pending or git_blame_not_found:
+        return 0
+
+    # Fill the in-memory cache from the persistent blame cache, keyed by blob ID at HEAD
+    cache_keys = {}
+    if blame_cache.is_enabled() and repo_root:
+        paths_for_git = {filepath: get_path_for_git(filepath, repo_root) for filepath, _ in pending}
+        blob_ids_by_path = blame_cache.get_blob_ids(paths_for_git.values(), repo_root)
+        cache_keys = {filepath: blame_cache.make_cache_key(path, blob_ids_by_path[path])
+                      for filepath, path in paths_for_git.items() if path in blob_ids_by_path}
+        still_pending = []
+        for filepath, lines in pending:
+            wanted = None if lines is None else _to_line_numbers(lines)
+            entry = blame_cache.lookup(cache_keys[filepath], wanted) if filepath in cache_keys else None
+            if entry is None:
+                if filepath not in cache_keys:
+                    # Untracked or modified files cannot be cached
+                    blame_cache.cache_stats['misses'] += 1
+                still_pending.append((filepath, lines))
+                continue
+            cached_map, covered = entry
+            cached_map = BlameMap(cached_map)
+            if filepath in global_blame_cache:
+                cached_map.update(global_blame_cache[filepath])
+                if covered is not None:
+                    covered = covered | (global_blame_covered_lines.get(filepath) or set())
+            global_blame_cache[filepath] = cached_map
+            global_blame_covered_lines[filepath] = covered
+            if not (covered is None or (wanted is not None and wanted <= covered)):
+                # Only the lines missing from the cached entry are blamed
+                still_pending.append((filepath, lines))
+        pending = still_pending
+        if not pending:
+            return 0
+
+    max_workers = max(1, min(max_workers, len(pending)))
+    if is_debug_enabled():
+        logger.debug(f"Prefetching blame info for {len(pending)} files using {max_workers} workers")
+    # git blame is bound by the subprocess, so threads are enough to run them in parallel.
+    # get_blame_map_for_file stores each result in global_blame_cache.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(lambda item: get_blame_map_for_file(item[0], repo_root, item[1]), pending):
+            pass
+
+    # Save the new blame results to the persistent cache
+    if cache_keys:
+        for filepath, _ in pending:
+            if filepath in cache_keys and filepath in global_blame_cache:
+                blame_cache.store(cache_keys[filepath], global_blame_cache[filepath],
+                                  global_blame_covered_lines.get(filepath))
+        blame_cache.evict()
+    return len(pending)
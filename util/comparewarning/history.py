@@ -0,0 +1,284 @@
+"""
+Warning history database: every run's parsed warnings, new warnings and their
+committers are stored in a local SQLite database, so trends can be queried
+without the original logs.
+
+Recording is enabled with compare_warnings.py --history-db [PATH]. Queries:
+    python history.py runs
+    python history.py first-seen --code C4267 --file proreden.cpp
+    python history.py trend --code C4267 --days 30
+    python history.py committers --days 30
+"""
+import argparse
+import csv
+import datetime
+import os
+import sqlite3
+import sys
+
+import log_utils
+
+logger = log_utils.get_logger("history")
+
+# Default location of the history database
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.history', 'warnings.sqlite3')
+
+# Version of the database schema, stored in the meta table
+SCHEMA_VERSION = 1
+
+# Rows inserted per executemany() call
+INSERT_BATCH_SIZE = 10000
+
+# Names passed per "IN (...)" lookup of interned ids
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    old_folder TEXT,
+    new_folder TEXT,
+    old_rev TEXT,
+    new_rev TEXT
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    old_path TEXT,
+    new_path TEXT,
+    old_total INTEGER,
+    new_total INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS codes (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE);
+-- Occurrences of every warning key in the new log of a run
+CREATE TABLE IF NOT EXISTS warnings (
+    log_id INTEGER NOT NULL REFERENCES logs (id),
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    code_id INTEGER NOT NULL REFERENCES codes (id),
+    line INTEGER,
+    col INTEGER,
+    count INTEGER NOT NULL
+);
+-- Warnings reported as new by a run, with the committer they were attributed to.
+-- date is the start time of the run that reported them.
+CREATE TABLE IF NOT EXISTS new_warnings (
+    log_id INTEGER NOT NULL REFERENCES logs (id),
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    code_id INTEGER NOT NULL REFERENCES codes (id),
+    line INTEGER,
+    col INTEGER,
+    extra INTEGER NOT NULL,
+    committer TEXT,
+    email TEXT,
+    commit_hash TEXT,
+    date TEXT NOT NULL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS warnings_file_code ON warnings (file_id, code_id);
+CREATE INDEX IF NOT EXISTS warnings_log ON warnings (log_id);
+CREATE INDEX IF NOT EXISTS new_warnings_file_code ON new_warnings (file_id, code_id);
+CREATE INDEX IF NOT EXISTS new_warnings_committer_date ON new_warnings (committer, date);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+"""
+
+def _to_int(value):
+    # Line and column numbers are stored as integers, "N/A" as NULL
+    return int(value) if isinstance(value, str) and value.isdigit() else None
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def open_database(path):
+    """
+    Open the history database at path, creating it and its schema if needed.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.executescript(SCHEMA)
+    connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+    connection.commit()
+    return connection
+
+class HistoryStore:
+    """
+    Writes runs to the history database. File paths and warning codes are interned
+    in their own tables; ids already looked up are kept in memory for the whole run.
+    """
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.connection = open_database(path)
+        self.file_ids = {}
+        self.code_ids = {}
+
+    def _intern(self, table, column, cache, names):
+        """
+        Return the ids of names in an interned table, inserting missing names.
+        """
+        missing = [name for name in set(names) if name not in cache]
+        if missing:
+            self.connection.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)",
+                                        [(name,) for name in missing])
+            for batch in _batches(missing, LOOKUP_BATCH_SIZE):
+                placeholders = ",".join("?" * len(batch))
+                for row_id, name in self.connection.execute(
+                        f"SELECT id, {column} FROM {table} WHERE {column} IN ({placeholders})", batch):
+                    cache[name] = row_id
+        return cache
+
+    def start_run(self, old_folder, new_folder, settings):
+        """
+        Record the start of a run and return its id.
+        """
+        self.started_at = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at, old_folder, new_folder, old_rev, new_rev) VALUES (?, ?, ?, ?, ?)",
+                (self.started_at, old_folder, new_folder, settings.old_rev or None,
+                 settings.new_rev if settings.old_rev else None))
+        return cursor.lastrowid
+
+    def record_log(self, run_id, log_name, old_file, new_file, counts, old_total, new_total, rows, commit_url_prefix=""):
+        """
+        Store the comparison of one log pair in a single transaction: the counts of
+        every warning key in the new log and the new warnings with their committers.
+        rows are the CSV rows written for the log (see compare_warnings.make_csv_row).
+        """
+        with log_utils.Stage("history", logger, log=log_name) as stage, self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO logs (run_id, name, old_path, new_path, old_total, new_total) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, log_name, old_file, new_file, old_total, new_total))
+            log_id = cursor.lastrowid
+
+            file_ids = self._intern("files", "path", self.file_ids,
+                                    [key[0] for key in counts] + [row[7] for row in rows])
+            code_ids = self._intern("codes", "code", self.code_ids,
+                                    [key[3] for key in counts] + [row[3] for row in rows])
+
+            warning_rows = [(log_id, file_ids[filepath], code_ids[code], _to_int(line_no), _to_int(column), count)
+                            for (filepath, line_no, column, code), count in counts.items()]
+            for batch in _batches(warning_rows, INSERT_BATCH_SIZE):
+                self.connection.executemany(
+                    "INSERT INTO warnings (log_id, file_id, code_id, line, col, count) VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+            new_rows = []
+            for author, email, commit_display, code, text, _, _, filepath, line_no, column, extra in rows:
+                commit_hash = commit_display
+                if commit_url_prefix and commit_hash.startswith(commit_url_prefix):
+                    commit_hash = commit_hash[len(commit_url_prefix):]
+                new_rows.append((log_id, file_ids[filepath], code_ids[code], _to_int(line_no), _to_int(column), extra,
+                                 author, email, commit_hash, self.started_at, text))
+            for batch in _batches(new_rows, INSERT_BATCH_SIZE):
+                self.connection.executemany(
+                    "INSERT INTO new_warnings (log_id, file_id, code_id, line, col, extra, committer, email, commit_hash, date, message)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            stage.counts.update(warnings=len(warning_rows), new=len(new_rows))
+
+    def close(self):
+        self.connection.close()
+
+def _cutoff(days):
+    if not days:
+        return None
+    return (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat(sep=' ', timespec='seconds')
+
+def _filters(args, date_column):
+    """
+    Build the WHERE clause and parameters for the --code, --file and --days options.
+    --file matches the end of the path, e.g. "proreden.cpp" or "pfsproc\\proreden.cpp".
+    """
+    clauses = []
+    params = []
+    if getattr(args, "code", None):
+        clauses.append("codes.code = ?")
+        params.append(args.code)
+    if getattr(args, "file", None):
+        clauses.append("files.path LIKE ?")
+        params.append("%" + args.file)
+    cutoff = _cutoff(getattr(args, "days", None))
+    if cutoff:
+        clauses.append(f"{date_column} >= ?")
+        params.append(cutoff)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def query_runs(connection, args):
+    where, params = _filters(args, "runs.started_at")
+    return ["Run", "Started", "Logs", "Warnings", "New warnings"], connection.execute(
+        "SELECT runs.id, runs.started_at, COUNT(logs.id), COALESCE(SUM(logs.new_total), 0),"
+        " (SELECT COALESCE(SUM(extra), 0) FROM new_warnings JOIN logs AS l ON new_warnings.log_id = l.id WHERE l.run_id = runs.id)"
+        f" FROM runs LEFT JOIN logs ON logs.run_id = runs.id{where} GROUP BY runs.id ORDER BY runs.started_at", params)
+
+def query_first_seen(connection, args):
+    where, params = _filters(args, "runs.started_at")
+    return ["File", "Code", "Line", "First seen", "Last seen", "Runs"], connection.execute(
+        "SELECT files.path, codes.code, warnings.line, MIN(runs.started_at), MAX(runs.started_at), COUNT(DISTINCT runs.id)"
+        " FROM warnings JOIN files ON warnings.file_id = files.id JOIN codes ON warnings.code_id = codes.id"
+        " JOIN logs ON warnings.log_id = logs.id JOIN runs ON logs.run_id = runs.id"
+        f"{where} GROUP BY files.path, codes.code, warnings.line ORDER BY MIN(runs.started_at), files.path, warnings.line",
+        params)
+
+def query_trend(connection, args):
+    where, params = _filters(args, "runs.started_at")
+    return ["Run", "Started", "Warnings"], connection.execute(
+        "SELECT runs.id, runs.started_at, SUM(warnings.count)"
+        " FROM warnings JOIN files ON warnings.file_id = files.id JOIN codes ON warnings.code_id = codes.id"
+        " JOIN logs ON warnings.log_id = logs.id JOIN runs ON logs.run_id = runs.id"
+        f"{where} GROUP BY runs.id ORDER BY runs.started_at", params)
+
+def query_committers(connection, args):
+    where, params = _filters(args, "new_warnings.date")
+    return ["Committer", "E-Mail", "New warnings", "Types"], connection.execute(
+        "SELECT new_warnings.committer, new_warnings.email, SUM(new_warnings.extra), COUNT(*)"
+        " FROM new_warnings JOIN files ON new_warnings.file_id = files.id JOIN codes ON new_warnings.code_id = codes.id"
+        f"{where} GROUP BY new_warnings.committer, new_warnings.email ORDER BY SUM(new_warnings.extra) DESC", params)
+
+QUERIES = {
+    "runs": (query_runs, "List the recorded runs"),
+    "first-seen": (query_first_seen, "When each warning first and last appeared"),
+    "trend": (query_trend, "Number of warnings per run"),
+    "committers": (query_committers, "New warnings per committer"),
+}
+
+def print_table(header, rows, as_csv=False):
+    rows = [["N/A" if value is None else str(value) for value in row] for row in rows]
+    if as_csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return
+    widths = [max([len(title)] + [len(row[index]) for row in rows]) for index, title in enumerate(header)]
+    print("  ".join(title.ljust(width) for title, width in zip(header, widths)).rstrip())
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the warning history database.")
+    parser.add_argument("--db", default=DEFAULT_HISTORY_PATH, metavar="PATH",
+                        help="History database (default: .history/warnings.sqlite3 next to this script)")
+    parser.add_argument("--csv", action="store_true", help="Print the result as CSV")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    for name, (_, description) in QUERIES.items():
+        subparser = subparsers.add_parser(name, help=description, description=description)
+        subparser.add_argument("--days", type=int, default=None, help="Only the last N days")
+        if name != "runs":
+            subparser.add_argument("--code", default=None, help="Only this warning code, e.g. C4267")
+            subparser.add_argument("--file", default=None, help="Only files whose path ends with this, e.g. proreden.cpp")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Error: History database '{args.db}' not found.", file=sys.stderr)
+        sys.exit(1)
+    connection = sqlite3.connect(args.db)
+    try:
+        header, rows = QUERIES[args.query][0](connection, args)
+        print_table(header, rows.fetchall(), args.csv)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
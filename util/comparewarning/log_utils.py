@@ -0,0 +1,226 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Extra level between INFO and DEBUG for per-warning messages
+VERBOSE = 15
+logging.addLevelName(VERBOSE, "VERBOSE")
+
+# Console verbosity names accepted on the command line
+LOG_LEVELS = {
+    "quiet": logging.WARNING,
+    "normal": logging.INFO,
+    "verbose": VERBOSE,
+    "debug": logging.DEBUG,
+}
+
+# Parent logger of all modules of this tool
+LOGGER_NAME = "comparewarning"
+
+# Minimum number of seconds between two progress bar updates
+PROGRESS_INTERVAL = 0.5
+
+# Metrics of this process: a record of every finished Stage and named counters
+# (see add_counts()). Both are cheap enough to be always collected; memory is only
+# traced after start_memory_tracing().
+_metrics_lock = threading.Lock()
+_stage_records = []
+_counters = {}
+# Stages being timed while memory is traced, innermost last
+_open_stages = []
+# Highest traced memory of the process seen so far
+_memory_peak = 0
+
+def get_logger(name):
+    """
+    Return the logger of a module, e.g. get_logger("git_utils").
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+class ConsoleHandler(logging.Handler):
+    """
+    Write INFO and lower records to stdout and WARNING and higher to stderr.
+    The streams are looked up on every record, so output redirected with
+    contextlib.redirect_stdout (e.g. in worker processes) is captured too.
+    """
+    def emit(self, record):
+        try:
+            stream = sys.stderr if record.levelno >= logging.WARNING else sys.stdout
+            stream.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+def setup_logging(level_name="normal"):
+    """
+    Configure console logging for the given verbosity (quiet, normal, verbose or debug).
+    Safe to call more than once, e.g. again in worker processes.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(LOG_LEVELS.get(level_name, logging.INFO))
+    if not any(isinstance(handler, ConsoleHandler) for handler in logger.handlers):
+        handler = ConsoleHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+def _child_cpu_time():
+    # CPU time of finished subprocesses, e.g. git blame (always 0 on Windows)
+    times = os.times()
+    return times.children_user + times.children_system
+
+def _update_memory_peak():
+    """
+    Fold the traced peak since the last reset into the process peak and into the
+    peak of every open stage, then reset it, so each stage sees its own peak.
+    """
+    global _memory_peak
+    peak = tracemalloc.get_traced_memory()[1]
+    _memory_peak = max(_memory_peak, peak)
+    for stage in _open_stages:
+        stage.memory_peak = max(stage.memory_peak, peak)
+    tracemalloc.reset_peak()
+
+class Stage:
+    """
+    Context manager that times one processing stage and logs a summary line with
+    the elapsed time and the counts collected in self.counts when the stage ends.
+
+        with Stage("Parse", logger, log=filename) as stage:
+            ...
+            stage.counts["warnings"] = total
+
+    The wall and CPU time of every stage (and its peak memory, while memory is
+    traced) are also kept in the metrics of the process (see metrics_snapshot()).
+    """
+    def __init__(self, name, logger, **counts):
+        self.name = name
+        self.logger = logger
+        self.counts = dict(counts)
+        self.start = None
+        self.elapsed = 0.0
+        self.cpu_start = None
+        self.cpu = 0.0
+        self.child_cpu = 0.0
+        self.memory_peak = None
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            _update_memory_peak()
+            self.memory_peak = 0
+            _open_stages.append(self)
+        self.cpu_start = (time.process_time(), _child_cpu_time())
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        self.cpu = time.process_time() - self.cpu_start[0]
+        self.child_cpu = _child_cpu_time() - self.cpu_start[1]
+        if self in _open_stages:
+            if tracemalloc.is_tracing():
+                _update_memory_peak()
+            _open_stages.remove(self)
+        record = {"stage": self.name, "wall": round(self.elapsed, 6), "cpu": round(self.cpu, 6),
+                  "child_cpu": round(self.child_cpu, 6), "counts": dict(self.counts)}
+        if self.memory_peak is not None:
+            record["memory_peak"] = self.memory_peak
+        with _metrics_lock:
+            _stage_records.append(record)
+        details = ", ".join(f"{name}: {value}" for name, value in self.counts.items())
+        self.logger.info(f"[{self.name}] finished in {self.elapsed:.2f}s" + (f" ({details})" if details else ""))
+        return False
+
+def add_counts(**counts):
+    """
+    Add to the named counters of this process, e.g. add_counts(rows_written=10).
+    """
+    with _metrics_lock:
+        for name, value in counts.items():
+            _counters[name] = _counters.get(name, 0) + value
+
+def start_memory_tracing():
+    """
+    Trace Python memory allocations from now on (slows the process down), so stages
+    and the process report their peak memory.
+    """
+    global _memory_peak
+    _memory_peak = 0
+    tracemalloc.start()
+
+def reset_metrics():
+    """
+    Forget the stages and counters collected so far.
+    """
+    with _metrics_lock:
+        _stage_records.clear()
+        _counters.clear()
+
+def metrics_snapshot():
+    """
+    Return the metrics of this process: {"stages": [stage records], "counters": {name: value},
+    "memory_peak": bytes or None if memory is not traced}.
+    """
+    if tracemalloc.is_tracing():
+        _update_memory_peak()
+    with _metrics_lock:
+        return {"stages": [dict(record) for record in _stage_records], "counters": dict(_counters),
+                "memory_peak": _memory_peak if tracemalloc.is_tracing() else None}
+
+def merge_metrics(snapshot):
+    """
+    Add the metrics of another process (a metrics_snapshot(), e.g. of a worker) to this one.
+    Memory peaks of other processes are kept on their stage records.
+    """
+    with _metrics_lock:
+        _stage_records.extend(snapshot["stages"])
+        for name, value in snapshot["counters"].items():
+            _counters[name] = _counters.get(name, 0) + value
+
+def call_with_metrics(func, *args, **kwargs):
+    """
+    Worker-process entry point: run func and return (result, metrics), where metrics
+    are the metrics_snapshot() of this call only, for merge_metrics() in the caller.
+    """
+    reset_metrics()
+    result = func(*args, **kwargs)
+    return result, metrics_snapshot()
+
+class ProgressReporter:
+    """
+    Time-throttled console progress bar. update() is cheap to call for every item;
+    the bar is redrawn at most once per interval seconds.
+    """
+    def __init__(self, total, enabled=True, interval=PROGRESS_INTERVAL, bar_length=30):
+        self.total = total
+        self.enabled = enabled and total > 0
+        self.interval = interval
+        self.bar_length = bar_length
+        self.last_update = 0.0
+        self.drawn = False
+
+    def _draw(self, count):
+        percent = int(count / self.total * 100)
+        filled_length = int(self.bar_length * count / self.total)
+        bar = '█' * filled_length + '░' * (self.bar_length - filled_length)
+        print(f"\rProgress: [{bar}] {percent}% ({count}/{self.total})", end='', flush=True)
+        self.drawn = True
+
+    def update(self, count):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self.last_update >= self.interval:
+            self.last_update = now
+            self._draw(count)
+
+    def finish(self):
+        """
+        Draw the final state and end the progress line, if the bar was shown.
+        """
+        if self.enabled and self.drawn:
+            self._draw(self.total)
+            print()
@@ -0,0 +1,254 @@
+"""
+Maps the file paths found in build logs to repository paths for git.
+
+Logs are written on the build machine, e.g. D:\\pam\\pam32\\console\\NAICSubGrpUtl.cpp,
+and may be compared on another machine or checkout. Path prefix maps rewrite the
+start of such paths, e.g. "D:\\pam" -> the repository root:
+
+    python compare_warnings.py old new --path-map "D:\\pam=."
+
+or in common.config:
+
+    PATH_PREFIX_MAP = D:\\pam=.
+
+Every file path is resolved once per process. Directory listings used to correct
+the case of path components are cached, and paths that cannot be resolved are
+remembered, so warnings in them never start a git subprocess. The case of a path
+is only corrected where case does not matter to the file system (e.g. Windows), or
+when a prefix map rewrote it: there the log's path is the build machine's spelling.
+Absolute paths outside the repository that no prefix map covers are passed to git
+as they are, as before prefix maps existed.
+"""
+import os
+import re
+import threading
+
+import log_utils
+
+logger = log_utils.get_logger("path_resolver")
+
+# Absolute Windows path (drive letter), also recognized when running on other systems
+_windows_path_pattern = re.compile(r'^[A-Za-z]:[\\/]')
+
+# Resolvers by (repo_root, prefix maps), see get_resolver()
+_resolvers = {}
+_resolvers_lock = threading.Lock()
+
+# Set once the first unresolvable path has been reported
+_reported_unresolved = False
+
+def _normalize(path):
+    # Forward slashes, no trailing slash: "D:\pam\" -> "D:/pam"
+    return path.replace('\\', '/').rstrip('/')
+
+def ignores_case(directory):
+    """
+    Check whether the file system of directory finds file names in any case, by
+    looking up the nearest component with letters in the other case.
+    """
+    path = os.path.realpath(directory)
+    while True:
+        parent, name = os.path.split(path)
+        if name != name.swapcase():
+            try:
+                return os.path.samefile(path, os.path.join(parent, name.swapcase()))
+            except OSError:
+                return False
+        if parent == path:
+            # No letters up to the root
+            return os.path.normcase("A") == "a"
+        path = parent
+
+def parse_prefix_maps(value):
+    """
+    Parse path prefix maps written as "FROM=TO" entries, separated by ';' or newlines,
+    e.g. "D:\\pam=.;E:\\build\\src=src". Returns a tuple of (from, to) pairs; invalid
+    entries are skipped with a warning.
+    """
+    prefix_maps = []
+    for entry in re.split(r'[;\n]', value or ""):
+        entry = entry.strip()
+        if not entry:
+            continue
+        source, separator, target = entry.partition('=')
+        if not separator or not source.strip():
+            logger.warning(f"Warning: Ignoring path prefix map '{entry}', expected FROM=TO.")
+            continue
+        prefix_maps.append((source.strip(), target.strip()))
+    return tuple(prefix_maps)
+
+class PathResolver:
+    """
+    Resolves log file paths to repository-relative paths ('/'-separated) for one
+    repository root, or to None for files that are not in the repository.
+    """
+    def __init__(self, repo_root=None, prefix_maps=()):
+        self.repo_root = repo_root
+        # Longest prefix first, so the most specific map wins
+        self.prefix_maps = sorted(((_normalize(source), target) for source, target in prefix_maps),
+                                  key=lambda item: len(item[0]), reverse=True)
+        self.norm_roots = set()
+        if repo_root:
+            self.norm_roots.add(os.path.normcase(os.path.normpath(repo_root)))
+            try:
+                self.norm_roots.add(os.path.normcase(os.path.realpath(repo_root)))
+            except OSError:
+                pass
+        # Log path -> repository path, or None if it cannot be resolved
+        self.paths = {}
+        # Directory -> (entry names, {lower-case entry name: entry name}),
+        # or None if it cannot be listed
+        self.listings = {}
+        # Whether paths that no prefix map rewrote are matched ignoring case
+        self.ignore_case = ignores_case(repo_root) if repo_root else False
+        self.stats = {'resolved': 0, 'unresolved': 0, 'listings': 0}
+
+    def map_prefix(self, filepath):
+        """
+        Apply the first matching prefix map to filepath. Prefixes match whole path
+        components, case-insensitively, with either kind of slash. A relative target
+        is relative to the repository root. Returns filepath unchanged if no map matches.
+        """
+        return self._map_prefix(filepath)[0]
+
+    def _map_prefix(self, filepath):
+        # (path, whether a prefix map matched), see map_prefix()
+        normalized = _normalize(filepath)
+        lower = normalized.lower()
+        for source, target in self.prefix_maps:
+            if lower == source.lower() or lower.startswith(source.lower() + '/'):
+                rest = normalized[len(source):].lstrip('/')
+                if not os.path.isabs(target) and self.repo_root:
+                    target = os.path.join(self.repo_root, target)
+                return (os.path.normpath(os.path.join(target, rest)) if rest else os.path.normpath(target)), True
+        return filepath, False
+
+    def _list_directory(self, directory):
+        listing = self.listings.get(directory, False)
+        if listing is False:
+            try:
+                entries = os.listdir(directory)
+                by_lower = {}
+                for entry in entries:
+                    by_lower.setdefault(entry.lower(), entry)
+                listing = (frozenset(entries), by_lower)
+            except OSError:
+                listing = None
+            self.listings[directory] = listing
+            self.stats['listings'] += 1
+        return listing
+
+    def correct_case(self, relative_path, fold_case=None):
+        """
+        Return relative_path (relative to the repository root) with every component
+        spelled as it is on disk, looked up in cached directory listings; ignoring
+        case if fold_case is True (default: if the file system ignores case).
+        Returns None if a component does not exist.
+        """
+        if fold_case is None:
+            fold_case = self.ignore_case
+        directory = self.repo_root
+        corrected = []
+        for component in relative_path.replace('\\', '/').split('/'):
+            if component in ('', '.'):
+                continue
+            listing = self._list_directory(directory)
+            if listing is None:
+                return None
+            names, by_lower = listing
+            # An exact match wins over a case-insensitive one
+            if component in names:
+                actual = component
+            else:
+                actual = by_lower.get(component.lower()) if fold_case else None
+            if actual is None:
+                return None
+            corrected.append(actual)
+            directory = os.path.join(directory, actual)
+        return '/'.join(corrected) if corrected else None
+
+    def _relative_to_root(self, path):
+        """
+        Return path relative to the repository root, or None if it lies outside it.
+        """
+        candidates = {os.path.normcase(os.path.normpath(path))}
+        try:
+            candidates.add(os.path.normcase(os.path.realpath(path)))
+        except OSError:
+            pass
+        for norm_path in candidates:
+            for norm_root in self.norm_roots:
+                if norm_path == norm_root:
+                    return ""
+                if norm_path.startswith(norm_root.rstrip(os.sep) + os.sep):
+                    return norm_path[len(norm_root.rstrip(os.sep)) + 1:]
+        return None
+
+    def _resolve(self, filepath):
+        path, mapped = self._map_prefix(filepath)
+        if not self.repo_root:
+            # Without a repository root git runs in the current directory with the path as is
+            return path if os.path.isabs(path) else path.replace(os.sep, '/')
+        if os.path.isabs(path):
+            relative_path = self._relative_to_root(path)
+            if relative_path is None:
+                # Outside the repository root: git is given the path as it is, and
+                # finds it if it is in the repository by another route (e.g. a symlink)
+                return path
+        elif _windows_path_pattern.match(path):
+            # A Windows path of the build machine that no prefix map covers
+            return None
+        else:
+            relative_path = os.path.normpath(path)
+            if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+                return None
+        # Where the file system tells case apart, an unmapped path is taken as spelled
+        return self.correct_case(relative_path, fold_case=mapped or self.ignore_case)
+
+    def resolve(self, filepath):
+        """
+        Return the path to pass to git for filepath: relative to the repository root,
+        with the case stored on disk (see correct_case()), or the absolute path itself
+        if it lies outside the repository root. Returns None if filepath does not map
+        to an existing file in the repository ("N/A" never does). Results are cached.
+        """
+        if filepath in self.paths:
+            return self.paths[filepath]
+        path = None if filepath == "N/A" else self._resolve(filepath)
+        self.paths[filepath] = path
+        if path is None:
+            self.stats['unresolved'] += 1
+            _report_unresolved(filepath, self.repo_root)
+        else:
+            self.stats['resolved'] += 1
+        return path
+
+def _report_unresolved(filepath, repo_root):
+    global _reported_unresolved
+    if filepath == "N/A":
+        return
+    if not _reported_unresolved:
+        _reported_unresolved = True
+        logger.warning(f"Warning: '{filepath}' does not map to a file in the repository at '{repo_root}' "
+                       f"(see --path-map); warnings in files outside the repository are not blamed.")
+    else:
+        logger.log(log_utils.VERBOSE, "Cannot map '%s' to a file in the repository", filepath)
+
+def get_resolver(repo_root=None, prefix_maps=()):
+    """
+    Return the shared resolver of this process for repo_root and prefix_maps.
+    """
+    key = (repo_root, tuple(prefix_maps))
+    resolver = _resolvers.get(key)
+    if resolver is None:
+        with _resolvers_lock:
+            resolver = _resolvers.setdefault(key, PathResolver(repo_root, prefix_maps))
+    return resolver
+
+def reset_resolvers():
+    """
+    Forget all resolvers of this process and what they cached, e.g. after files
+    were added to or removed from the repository.
+    """
+    with _resolvers_lock:
+        _resolvers.clear()
@@ -0,0 +1,365 @@
+"""
+Rolling comparison of a log archive laid out as dated folders:
+
+    /archive/20250219/core.log
+    /archive/20250220/core.log
+    /archive/20250221/core.log
+
+Every consecutive pair of dated folders (YYYYMMDD) under the root is compared like
+compare_warnings.py old new, for the logs listed in compare.config:
+
+    python rolling.py /archive [--output DIR]
+
+writes the CSV files of 20250219 -> 20250220 to DIR/20250219_20250220/, and so on.
+Each day's logs are parsed once: the counts of a pair's new logs are the baseline
+of the next pair. Finished pairs are recorded in DIR/rolling_state.json and skipped
+when the job runs again, and the counts of the newest day are saved as snapshots
+(see snapshot.py) in DIR/baselines/, so a nightly run only parses the new folder.
+"""
+import argparse
+import datetime
+import functools
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+
+import blame_cache
+import compare_warnings
+import comparison
+import config
+import git_utils
+import history
+import log_utils
+import path_resolver
+import snapshot
+import warning_filter
+import warning_parser
+
+logger = log_utils.get_logger("rolling")
+
+# Default folder the CSV files, the state and the baselines are written to
+DEFAULT_OUTPUT_DIR = "output_rolling"
+
+# File in the output folder that records the finished pairs
+STATE_FILENAME = "rolling_state.json"
+
+# Folder in the output folder with the snapshots of the newest compared day
+BASELINE_DIRNAME = "baselines"
+
+# Version of the state file; state files of other versions are ignored
+STATE_VERSION = 1
+
+# Names of dated log folders
+_date_folder_pattern = re.compile(r'^\d{8}$')
+
+def find_dated_folders(root, since=None):
+    """
+    Return the names of the dated folders (YYYYMMDD) directly under root, oldest
+    first. Folders before since (a YYYYMMDD name) are left out.
+    """
+    folders = []
+    for name in os.listdir(root):
+        if not _date_folder_pattern.match(name) or not os.path.isdir(os.path.join(root, name)):
+            continue
+        try:
+            datetime.datetime.strptime(name, "%Y%m%d")
+        except ValueError:
+            continue
+        if since is None or name >= since:
+            folders.append(name)
+    return sorted(folders)
+
+def pair_name(old_day, new_day):
+    return f"{old_day}_{new_day}"
+
+def load_state(state_path):
+    """
+    Return the state saved at state_path, or an empty state if there is none.
+    """
+    empty = {'version': STATE_VERSION, 'pairs': {}}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return empty
+    except (OSError, ValueError) as e:
+        logger.warning(f"Warning: Cannot read state file '{state_path}': {e}; comparing all pairs.")
+        return empty
+    if state.get('version') != STATE_VERSION:
+        logger.warning(f"Warning: State file '{state_path}' has version {state.get('version')}, "
+                       f"expected {STATE_VERSION}; comparing all pairs.")
+        return empty
+    return state
+
+def save_state(state_path, state):
+    """
+    Write state to state_path, replacing the file atomically.
+    """
+    temp_path = state_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, state_path)
+
+class RollingComparison:
+    """
+    Compares the pairs of dated folders under root one after another, keeping the
+    parsed logs of the last new folder as the baseline of the next pair.
+    """
+    def __init__(self, root, output_dir, log_names, repo_root, settings, store=None):
+        self.root = root
+        self.output_dir = output_dir
+        self.log_names = log_names
+        self.repo_root = repo_root
+        self.settings = settings
+        self.store = store
+        self.baseline_dir = os.path.join(output_dir, BASELINE_DIRNAME)
+        # Day of the parsed logs in baselines, and log name -> (counts, details, total)
+        self.baseline_day = None
+        self.baselines = {}
+        self.stats = {'reused': 0, 'loaded': 0, 'parsed': 0}
+
+    def _log_path(self, day, log_name):
+        # A log may also be archived compressed, e.g. core.log.gz for core.log
+        return warning_parser.find_log_file(os.path.join(self.root, day, log_name))
+
+    def _saved_baseline(self, day, log_name):
+        return os.path.join(self.baseline_dir, day, log_name + snapshot.SNAPSHOT_EXTENSION)
+
+    def get_baseline(self, day, log_name):
+        """
+        Return (counts, details, total) of a log of day and its path: the counts kept
+        from the previous pair, or the saved baseline or the log parsed now.
+        Returns None if the log does not exist.
+        """
+        if self.baseline_day == day and log_name in self.baselines:
+            self.stats['reused'] += 1
+            return self.baselines[log_name], self._log_path(day, log_name)
+        old_file = self._log_path(day, log_name)
+        saved = self._saved_baseline(day, log_name)
+        if os.path.exists(saved):
+            self.stats['loaded'] += 1
+            path = saved
+            logger.info(f"Loading the saved baseline {path}...")
+        else:
+            # A baseline snapshot saved next to the old log is loaded instead of parsing it
+            path = snapshot.find_snapshot(old_file) or old_file
+            if not os.path.exists(path):
+                return None
+            self.stats['parsed'] += 1
+            logger.info(f"Parsing warnings from {path}...")
+        return comparison.count_warnings(path, self.settings.use_mmap, self.settings.match_moved,
+                                         self.settings.parse_workers,
+                                         warning_filter=warning_filter.get_filter(self.settings)), old_file
+
+    def compare_pair(self, old_day, new_day, save_baseline=False):
+        """
+        Compare every log of old_day with the same log of new_day and write the CSV
+        files to the pair's output folder. The new logs become the baseline of the
+        next pair; with save_baseline, they are also saved as snapshots.
+        Returns the summary of every compared log, or None if a CSV file could not be written.
+        """
+        output_folder = os.path.join(self.output_dir, pair_name(old_day, new_day))
+        os.makedirs(output_folder, exist_ok=True)
+        logger.info(f"\nComparing {old_day} -> {new_day}, writing to '{output_folder}'...")
+        recorder = None
+        if self.store is not None:
+            run_id = self.store.start_run(os.path.join(self.root, old_day), os.path.join(self.root, new_day),
+                                          self.settings)
+            recorder = functools.partial(self.store.record_log, run_id,
+                                         commit_url_prefix=self.settings.commit_url_prefix)
+
+        rules = warning_filter.get_filter(self.settings)
+        parsed = {}
+        summary = {}
+        failed = False
+        for log_name in self.log_names:
+            new_file = self._log_path(new_day, log_name)
+            if not os.path.exists(new_file):
+                logger.warning(f"Warning: File {new_file} does not exist, skipping comparison for '{log_name}'.")
+                continue
+            source = snapshot.describe_source(new_file) if save_baseline else None
+            logger.info(f"Parsing warnings from {new_file}...")
+            counts2, details2, total2 = comparison.count_warnings(new_file, self.settings.use_mmap, True,
+                                                                  self.settings.parse_workers,
+                                                                  warning_filter=rules)
+            parsed[log_name] = (counts2, details2, total2)
+            if save_baseline:
+                saved = self._saved_baseline(new_day, log_name)
+                os.makedirs(os.path.dirname(saved), exist_ok=True)
+                snapshot.write_snapshot(counts2, source, saved, rules)
+
+            baseline = self.get_baseline(old_day, log_name)
+            if baseline is None:
+                logger.warning(f"Warning: '{log_name}' does not exist in {old_day}, skipping comparison for '{log_name}'.")
+                continue
+            (counts1, details1, total1), old_file = baseline
+            infos = {}
+            if self.settings.match_moved:
+                added_warnings = comparison.match_counts(counts1, details1, counts2, details2, infos=infos)
+            else:
+                added_warnings = comparison.diff_counts(counts1, counts2, details2, infos)
+            logger.info(f"[{log_name}] {total1} -> {total2} warnings, "
+                        f"{len(added_warnings)} types with increased counts.")
+
+            rows = compare_warnings.write_comparison_csv(log_name, added_warnings, output_folder, self.repo_root,
+                                                         self.settings, infos=infos)
+            if rows is None:
+                failed = True
+                continue
+            if recorder is not None:
+                recorder(log_name, old_file, new_file, counts2, total1, total2, rows)
+            summary[log_name] = {
+                'old_total': total1,
+                'new_total': total2,
+                'new_warnings': sum(extra for _, _, extra in added_warnings),
+            }
+
+        # The old day's counts are no longer needed
+        self.baseline_day = new_day
+        self.baselines = parsed
+        if save_baseline:
+            self.prune_baselines(new_day)
+        return None if failed else summary
+
+    def prune_baselines(self, keep_day):
+        """
+        Remove the saved baselines of every day but keep_day.
+        """
+        if not os.path.isdir(self.baseline_dir):
+            return
+        for name in os.listdir(self.baseline_dir):
+            if name != keep_day:
+                shutil.rmtree(os.path.join(self.baseline_dir, name), ignore_errors=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare every consecutive pair of dated log folders (YYYYMMDD) under a root folder.")
+    parser.add_argument("root", help="Folder containing the dated log folders")
+    parser.add_argument("--output", "-o", default=DEFAULT_OUTPUT_DIR, metavar="DIR",
+                        help=f"Folder for the CSV files of every pair, the state and the baselines "
+                             f"(default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--since", default=None, metavar="YYYYMMDD",
+                        help="Ignore dated folders before this day")
+    parser.add_argument("--force", action="store_true",
+                        help=f"Compare all pairs again, including those recorded in {STATE_FILENAME}")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Scan logs with the memory-mapped fast path")
+    parser.add_argument("--parse-workers", type=int, default=None, metavar="N",
+                        help="Split each large log into byte ranges parsed by N worker processes (0 = number of CPUs)")
+    parser.add_argument("--match-moved", action="store_true", default=None,
+                        help="Do not report warnings that only moved to another line as new")
+    parser.add_argument("--path-map", action="append", default=None, metavar="FROM=TO",
+                        help="Map build machine paths starting with FROM to TO; can be repeated")
+    parser.add_argument("--include-path", action="append", default=None, metavar="PATH",
+                        help="Only compare warnings in files under PATH; can be repeated")
+    parser.add_argument("--exclude-path", action="append", default=None, metavar="PATH",
+                        help="Do not compare warnings in files under PATH; can be repeated")
+    parser.add_argument("--include-project", action="append", default=None, metavar="PROJECT",
+                        help="Only compare warnings of projects under PROJECT; can be repeated")
+    parser.add_argument("--exclude-project", action="append", default=None, metavar="PROJECT",
+                        help="Do not compare warnings of projects under PROJECT; can be repeated")
+    parser.add_argument("--include-code", action="append", default=None, metavar="CODE",
+                        help="Only compare warnings with the code CODE; can be repeated")
+    parser.add_argument("--exclude-code", action="append", default=None, metavar="CODE",
+                        help="Do not compare warnings with the code CODE; can be repeated")
+    parser.add_argument("--config", dest="common_config", default=None, metavar="PATH",
+                        help="Settings file to use instead of common.config")
+    parser.add_argument("--no-blame-cache", action="store_true",
+                        help="Do not read or write the persistent git blame cache")
+    parser.add_argument("--history-db", nargs="?", const=history.DEFAULT_HISTORY_PATH, default=None, metavar="PATH",
+                        help="Also record every compared pair in a SQLite history database (see history.py)")
+    parser.add_argument("--log-level", choices=list(log_utils.LOG_LEVELS), default=None,
+                        help="Console verbosity: quiet (warnings and errors only), normal (default), verbose or debug")
+    parser.add_argument("-q", "--quiet", dest="log_level", action="store_const", const="quiet",
+                        help="Same as --log-level quiet")
+    parser.add_argument("-v", "--verbose", dest="log_level", action="store_const", const="verbose",
+                        help="Same as --log-level verbose")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = config.load_settings(
+        args.common_config,
+        use_mmap=args.mmap,
+        parse_workers=args.parse_workers,
+        match_moved=args.match_moved,
+        path_maps=path_resolver.parse_prefix_maps(";".join(args.path_map)) if args.path_map else None,
+        log_level=args.log_level,
+        include_paths=compare_warnings.parse_rule_args(args.include_path),
+        exclude_paths=compare_warnings.parse_rule_args(args.exclude_path),
+        include_projects=compare_warnings.parse_rule_args(args.include_project),
+        exclude_projects=compare_warnings.parse_rule_args(args.exclude_project),
+        include_codes=compare_warnings.parse_rule_args(args.include_code),
+        exclude_codes=compare_warnings.parse_rule_args(args.exclude_code),
+    )
+    if settings.parse_workers <= 0:
+        settings.parse_workers = os.cpu_count() or 1
+    config.set_settings(settings)
+    log_utils.setup_logging(settings.log_level)
+
+    if not os.path.isdir(args.root):
+        logger.error(f"Error: Log folder '{args.root}' does not exist.")
+        sys.exit(1)
+    try:
+        log_names = compare_warnings.read_log_names()
+    except OSError as e:
+        logger.error(f"Error: Cannot read '{compare_warnings.LOG_LIST_FILENAME}': {e}")
+        sys.exit(1)
+    if not log_names:
+        logger.warning(f"Warning: No log files specified in '{compare_warnings.LOG_LIST_FILENAME}'.")
+        sys.exit(0)
+
+    days = find_dated_folders(args.root, args.since)
+    try:
+        os.makedirs(args.output, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Error creating output directory '{args.output}': {e}")
+        sys.exit(1)
+    state_path = os.path.join(args.output, STATE_FILENAME)
+    state = load_state(state_path)
+    pairs = [(old_day, new_day) for old_day, new_day in zip(days, days[1:])
+             if args.force or pair_name(old_day, new_day) not in state['pairs']]
+    logger.info(f"Found {len(days)} dated folders in '{args.root}', {len(pairs)} pairs to compare.")
+    if not pairs:
+        return
+
+    repo_root = git_utils.find_git_repo_root()
+    blame_cache.configure(enabled=not args.no_blame_cache and repo_root is not None)
+    store = None
+    if args.history_db:
+        try:
+            store = history.HistoryStore(args.history_db)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error: Cannot open history database '{args.history_db}': {e}")
+            sys.exit(1)
+
+    rolling = RollingComparison(args.root, args.output, log_names, repo_root, settings, store)
+    failed = False
+    for index, (old_day, new_day) in enumerate(pairs):
+        # Only the newest day is saved, as the baseline of the next run
+        summary = rolling.compare_pair(old_day, new_day, save_baseline=index == len(pairs) - 1)
+        if summary is None:
+            # Not recorded, so the pair is compared again on the next run
+            logger.error(f"Error: Not all results of {old_day} -> {new_day} could be written.")
+            failed = True
+            continue
+        state['pairs'][pair_name(old_day, new_day)] = {
+            'finished_at': datetime.datetime.now().isoformat(sep=' ', timespec='seconds'),
+            'logs': summary,
+        }
+        save_state(state_path, state)
+
+    if store is not None:
+        logger.info(f"\nRecorded {len(pairs)} pairs in the history database '{store.path}'.")
+        store.close()
+    if blame_cache.is_enabled():
+        logger.info(f"\n{blame_cache.format_stats()}")
+    logger.info(f"\nCompared {len(pairs)} pairs: {rolling.stats['reused']} baselines reused from the previous pair, "
+                f"{rolling.stats['loaded']} loaded from saved baselines, {rolling.stats['parsed']} parsed.")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
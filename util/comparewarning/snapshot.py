@@ -0,0 +1,240 @@
+"""
+Baseline snapshots: the warning counts of a log, parsed once and saved for reuse.
+
+Usage:
+    python snapshot.py path/to/old_logs/core.log [more logs...] [--output FILE]
+
+writes path/to/old_logs/core.log.snapshot, which is used instead of parsing
+core.log whenever core.log is the old log of a comparison.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import zlib
+
+import log_utils
+import warning_parser
+import warning_table
+
+logger = log_utils.get_logger("snapshot")
+
+# Extension of snapshot files, appended to the log file name
+SNAPSHOT_EXTENSION = ".snapshot"
+
+# Leading bytes of every snapshot file, followed by the zlib-compressed JSON body
+SNAPSHOT_MAGIC = b"CWSNAP\n"
+
+# Version of the snapshot format; snapshots of other versions are rebuilt from the log.
+# Also raised when the parser's output changes, since a snapshot holds parsed warnings.
+SNAPSHOT_VERSION = 2
+
+# Bytes read at a time when hashing a log
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def is_snapshot(path):
+    """
+    Check whether path is a snapshot file (by its magic bytes).
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    except OSError:
+        return False
+
+def find_snapshot(log_path):
+    """
+    Return the snapshot saved next to log_path (log_path + SNAPSHOT_EXTENSION), or None.
+    """
+    snapshot_path = log_path + SNAPSHOT_EXTENSION
+    return snapshot_path if os.path.exists(snapshot_path) else None
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def describe_source(path):
+    """
+    Return the size, modification time and SHA-256 hash of a log, used to detect
+    snapshots that no longer match their log.
+    """
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': hash_file(path),
+    }
+
+def save_snapshot(log_path, snapshot_path=None, use_mmap=False):
+    """
+    Parse log_path once and save its warning counts and the first text of every
+    warning key to snapshot_path (default: log_path + SNAPSHOT_EXTENSION).
+    File paths and warning codes are stored once in string tables.
+    Returns the snapshot path, or None if the log could not be read.
+    """
+    snapshot_path = snapshot_path or log_path + SNAPSHOT_EXTENSION
+    try:
+        source = describe_source(log_path)
+    except OSError as e:
+        logger.error(f"Error: Cannot read log file '{log_path}': {e}")
+        return None
+    counts = warning_table.WarningCounts(keep_details=True)
+    with log_utils.Stage("parse", logger, log=log_path) as stage:
+        counts.count(warning_parser.iter_warnings(log_path, use_mmap))
+        stage.counts.update(warnings=counts.total, unique=len(counts))
+    write_snapshot(counts, source, snapshot_path)
+    logger.info(f"Saved snapshot of {counts.total} warnings ({len(counts)} unique) from '{log_path}' to '{snapshot_path}'.")
+    return snapshot_path
+
+def write_snapshot(counts, source, snapshot_path, warning_filter=None):
+    """
+    Save counts, a WarningCounts that keeps details, to snapshot_path. source is the
+    describe_source() of the log the counts were parsed from, taken before parsing.
+    warning_filter is the filter the log was parsed with, if any; its rules are saved
+    so the snapshot is only used with the same rules. The file is replaced atomically.
+    """
+    total = counts.total
+    strings = counts.strings.strings
+    files = {}
+    codes = {}
+    entries = []
+    for row in range(len(counts)):
+        file_index = files.setdefault(strings[counts.files[row]], len(files))
+        code_index = codes.setdefault(strings[counts.codes[row]], len(codes))
+        entries.append([file_index, strings[counts.lines[row]], strings[counts.columns[row]], code_index,
+                        counts.counts[row], counts.text_of(row)])
+
+    body = {
+        'version': SNAPSHOT_VERSION,
+        'source': source,
+        'total': total,
+        'rules': [list(rules) for rules in warning_filter.rules] if warning_filter is not None else None,
+        'files': list(files),
+        'codes': list(codes),
+        'entries': entries,
+    }
+    data = zlib.compress(json.dumps(body, separators=(',', ':')).encode('utf-8'))
+    temp_path = snapshot_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(data)
+    os.replace(temp_path, snapshot_path)
+
+def _read_body(snapshot_path):
+    with open(snapshot_path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("not a snapshot file")
+    return json.loads(zlib.decompress(data[len(SNAPSHOT_MAGIC):]).decode('utf-8'))
+
+def get_source_path(snapshot_path, body=None):
+    """
+    Return the log a snapshot was made from: the log next to the snapshot if it
+    exists, otherwise the path recorded in the snapshot.
+    """
+    if snapshot_path.endswith(SNAPSHOT_EXTENSION):
+        next_to = snapshot_path[:-len(SNAPSHOT_EXTENSION)]
+        if os.path.exists(next_to):
+            return next_to
+    if body is None:
+        try:
+            body = _read_body(snapshot_path)
+        except (OSError, ValueError, zlib.error):
+            return None
+    return body.get('source', {}).get('path')
+
+def check_source(body, source_path):
+    """
+    Return None if the snapshot body matches the log at source_path, otherwise the
+    reason why it does not. Size and modification time are compared first; the hash
+    is only computed when the size matches but the modification time does not
+    (e.g. a copied log).
+    """
+    source = body.get('source', {})
+    try:
+        stat = os.stat(source_path)
+    except OSError:
+        return "the log cannot be read"
+    if stat.st_size != source.get('size'):
+        return "the log's size changed"
+    if stat.st_mtime_ns != source.get('mtime_ns') and hash_file(source_path) != source.get('sha256'):
+        return "the log's content changed"
+    return None
+
+def load_snapshot(snapshot_path, keep_details=False, strings=None, warning_filter=None):
+    """
+    Load the warning counts saved in a snapshot, in the same form as
+    comparison.count_warnings(): (counts, details, total), with the keys interned in
+    the StringTable strings (a new one if None); details is only filled if
+    keep_details is True. If warning_filter is given, only the warnings it accepts
+    are loaded. A snapshot saved with filter rules (see write_snapshot()) is only
+    used with the same rules; a snapshot of all warnings keeps one text per key, not
+    the project of every occurrence, so it is not used with project rules.
+    Returns None if the snapshot is unreadable, of another format version, or does
+    not match its log any more; the caller then parses the log instead. A snapshot
+    whose log no longer exists is used with a warning, since it cannot be checked.
+    """
+    try:
+        body = _read_body(snapshot_path)
+    except (OSError, ValueError, zlib.error) as e:
+        logger.warning(f"Warning: Cannot read snapshot '{snapshot_path}': {e}")
+        return None
+    if body.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Warning: Snapshot '{snapshot_path}' has format version {body.get('version')}, "
+                       f"expected {SNAPSHOT_VERSION}; not using it.")
+        return None
+
+    source_path = get_source_path(snapshot_path, body)
+    if source_path and os.path.exists(source_path):
+        reason = check_source(body, source_path)
+        if reason:
+            logger.warning(f"Warning: Snapshot '{snapshot_path}' is stale ({reason}); not using it.")
+            return None
+    else:
+        logger.warning(f"Warning: The log of snapshot '{snapshot_path}' was not found; using the snapshot unchecked.")
+
+    rules = [list(rules) for rules in warning_filter.rules] if warning_filter is not None else None
+    if body.get('rules') is not None:
+        if body['rules'] != rules:
+            logger.info(f"Not using snapshot '{snapshot_path}', which was saved with other filter rules.")
+            return None
+        # Already filtered with these rules
+        warning_filter = None
+    elif warning_filter is not None and warning_filter.project_tests is not None:
+        logger.info(f"Not using snapshot '{snapshot_path}', which cannot be filtered by project.")
+        return None
+
+    files = body['files']
+    codes = body['codes']
+    counts = warning_table.WarningCounts(strings, keep_details)
+    accepts = warning_filter.accepts if warning_filter is not None else None
+    for file_index, line_no, column, code_index, count, text in body['entries']:
+        key = (files[file_index], line_no, column, codes[code_index])
+        if accepts is None or accepts(key, text):
+            counts.add(key, text, count)
+    return counts, counts.details(), counts.total
+
+def main():
+    parser = argparse.ArgumentParser(description="Save baseline snapshots of build logs for faster comparisons.")
+    parser.add_argument("logs", nargs="+", help="Log files to snapshot")
+    parser.add_argument("--output", "-o", default=None, metavar="FILE",
+                        help=f"Snapshot file (only with a single log; default: the log name + {SNAPSHOT_EXTENSION})")
+    parser.add_argument("--mmap", action="store_true", help="Scan the logs with the memory-mapped fast path")
+    args = parser.parse_args()
+    if args.output and len(args.logs) > 1:
+        parser.error("--output can only be used with a single log")
+
+    log_utils.setup_logging("normal")
+    failed = False
+    for log_path in args.logs:
+        if save_snapshot(log_path, args.output, args.mmap) is None:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Tests of the streaming git blame --porcelain parser (git_utils.parse_blame_porcelain()).
+
+tests/data/blame/*.porcelain is real git blame --porcelain output of a small
+repository: a whole file with an uncommitted line (full), -L 3,4 -L 9,11 (ranges)
+and the range HEAD~1.. whose older lines belong to a boundary commit (boundary).
+Commits repeat, so only their first header block has committer lines. The parser
+must give the expected maps and agree with the previous regex-based parser
+(legacy_parse() of benchmarks/bench_blame_parser.py).
+"""
+import os
+import sys
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), "benchmarks"))
+
+import bench_blame_parser
+import git_utils
+
+BLAME_DIR = os.path.join(TESTS_DIR, "data", "blame")
+
+ALICE = ("Alice", "alice@example.com", "dc34cf2f78959802812fa11e110821bd3a1f37ae")
+# Authored by Bob, committed by Carol Build: the committer is reported
+CAROL = ("Carol Build", "carol@example.com", "3d42c89e9874ccce8d4d26f3c9871951af972663")
+DAVE = ("Dave", "dave@example.com", "9c67bb01a0640f7280f8f45db20bcfb2146c38e4")
+UNCOMMITTED = ("Not Committed Yet", "not.committed.yet", "0" * 40)
+
+EXPECTED = {
+    "full": {1: ALICE, 2: UNCOMMITTED, 3: CAROL, 4: DAVE, 5: ALICE, 6: DAVE, 7: ALICE, 8: ALICE, 9: CAROL,
+             10: DAVE, 11: ALICE},
+    "ranges": {3: CAROL, 4: DAVE, 9: CAROL, 10: DAVE, 11: ALICE},
+    "boundary": {1: CAROL, 2: CAROL, 3: CAROL, 4: DAVE, 5: CAROL, 6: DAVE, 7: CAROL, 8: CAROL, 9: CAROL,
+                 10: DAVE, 11: CAROL},
+}
+
+def read_porcelain(name):
+    with open(os.path.join(BLAME_DIR, name + ".porcelain"), "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+class BlameParserTest(unittest.TestCase):
+    def test_fixtures(self):
+        for name, expected in EXPECTED.items():
+            with self.subTest(name):
+                blame_map = git_utils.parse_blame_porcelain(read_porcelain(name).splitlines(keepends=True))
+                self.assertEqual(dict(blame_map), expected)
+                # One record per commit, shared by all of its lines
+                self.assertEqual(len(blame_map.records), len(set(expected.values())))
+
+    def test_legacy_parser_agrees(self):
+        for name in EXPECTED:
+            with self.subTest(name):
+                stdout = read_porcelain(name)
+                self.assertEqual(dict(git_utils.parse_blame_porcelain(stdout.splitlines(keepends=True))),
+                                 bench_blame_parser.legacy_parse(stdout))
+
+    def test_generated_output(self):
+        # Many lines of few commits, most without their header lines
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                stdout = bench_blame_parser.generate_porcelain(2000, 7, seed)
+                blame_map = git_utils.parse_blame_porcelain(stdout.splitlines(keepends=True))
+                self.assertEqual(len(blame_map), 2000)
+                self.assertEqual(dict(blame_map), bench_blame_parser.legacy_parse(stdout))
+
+    def test_line_endings(self):
+        stdout = read_porcelain("ranges")
+        self.assertEqual(dict(git_utils.parse_blame_porcelain(stdout.replace("\n", "\r\n").splitlines(keepends=True))),
+                         EXPECTED["ranges"])
+        self.assertEqual(dict(git_utils.parse_blame_porcelain(stdout.splitlines())), EXPECTED["ranges"])
+
+    def test_header_without_content_line(self):
+        # Output cut after the last header still counts the line
+        lines = read_porcelain("ranges").splitlines(keepends=True)[:-1]
+        self.assertEqual(dict(git_utils.parse_blame_porcelain(lines)), EXPECTED["ranges"])
+
+    def test_garbage_is_skipped(self):
+        lines = ["fatal: not a commit\n", "1234 1 1 1\n"] + read_porcelain("ranges").splitlines(keepends=True)
+        self.assertEqual(dict(git_utils.parse_blame_porcelain(lines)), EXPECTED["ranges"])
+
+if __name__ == "__main__":
+    unittest.main()
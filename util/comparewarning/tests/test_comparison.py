@@ -0,0 +1,100 @@
+"""
+Tests of the nearest-line matching of moved warnings (comparison.match_counts()).
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import log_utils
+
+log_utils.setup_logging("quiet")
+
+def unmatched(items):
+    return sorted(line for line, count in items for _ in range(count))
+
+def warning(line, code="C4267", message="conversion from 'size_t' to 'int'", filepath="D:\\pam\\proc.cpp"):
+    key = (filepath, str(line), "5", code)
+    return key, f"{filepath}({line},5): warning {code}: {message} [D:\\pam\\proc.vcxproj]"
+
+def counts_of(warnings):
+    counts = {}
+    details = {}
+    for key, text in warnings:
+        counts[key] = counts.get(key, 0) + 1
+        details.setdefault(key, text)
+    return counts, details
+
+class MatchNearestTest(unittest.TestCase):
+    def test_shifted_block_pairs_one_to_one(self):
+        old_items = [[10, 1], [20, 1], [30, 1]]
+        new_items = [[15, 1], [25, 1], [35, 1]]
+        self.assertEqual(comparison._match_nearest(old_items, new_items), 3)
+        self.assertEqual(unmatched(new_items), [])
+        self.assertEqual(unmatched(old_items), [])
+
+    def test_shift_up(self):
+        old_items = [[15, 1], [25, 2], [35, 1]]
+        new_items = [[10, 1], [20, 2], [30, 1]]
+        self.assertEqual(comparison._match_nearest(old_items, new_items), 4)
+        self.assertEqual(unmatched(new_items), [])
+
+    def test_equally_near_pairs_lowest_lines_first(self):
+        # 20 is as near to 15 as to 25: the lower pair wins, so 30 goes to 25
+        old_items = [[15, 1], [25, 1]]
+        new_items = [[20, 1], [30, 1]]
+        self.assertEqual(comparison._match_nearest(old_items, new_items), 2)
+        self.assertEqual(unmatched(new_items), [])
+        old_items = [[20, 1]]
+        new_items = [[15, 1], [25, 1]]
+        comparison._match_nearest(old_items, new_items)
+        self.assertEqual(unmatched(new_items), [25])
+
+    def test_more_new_lines(self):
+        # The new occurrences farthest from every old line are left unmatched
+        old_items = [[100, 2]]
+        new_items = [[3, 1], [99, 1], [101, 1], [400, 1]]
+        self.assertEqual(comparison._match_nearest(old_items, new_items), 2)
+        self.assertEqual(unmatched(new_items), [3, 400])
+
+    def test_more_old_lines(self):
+        old_items = [[1, 1], [50, 1], [52, 3]]
+        new_items = [[51, 2]]
+        self.assertEqual(comparison._match_nearest(old_items, new_items), 2)
+        self.assertEqual(unmatched(new_items), [])
+        self.assertEqual(unmatched(old_items), [1, 52, 52])
+
+    def test_far_moves_are_not_quadratic(self):
+        count = 50000
+        old_items = [[line * 3, 1] for line in range(count)]
+        new_items = [[line * 3 + 1000000, 1] for line in range(count)]
+        start = time.perf_counter()
+        self.assertEqual(comparison._match_nearest(old_items, new_items), count)
+        self.assertLess(time.perf_counter() - start, 10)
+
+class MatchCountsTest(unittest.TestCase):
+    def test_moved_warnings_are_not_new(self):
+        counts1, details1 = counts_of([warning(10), warning(20), warning(30, code="C4996", message="unsafe")])
+        counts2, details2 = counts_of([warning(13), warning(23), warning(33, code="C4996", message="unsafe"),
+                                       warning(40)])
+        added = comparison.match_counts(counts1, details1, counts2, details2)
+        self.assertEqual([(key[1], extra) for key, _, extra in added], [("40", 1)])
+
+    def test_other_message_is_new(self):
+        counts1, details1 = counts_of([warning(10)])
+        counts2, details2 = counts_of([warning(11, message="another message")])
+        added = comparison.match_counts(counts1, details1, counts2, details2)
+        self.assertEqual([key[1] for key, _, _ in added], ["11"])
+
+    def test_line_map(self):
+        counts1, details1 = counts_of([warning(10), warning(50)])
+        counts2, details2 = counts_of([warning(12), warning(52), warning(60)])
+        line_map = lambda filepath, line: line + 2
+        added = comparison.match_counts(counts1, details1, counts2, details2, line_map)
+        self.assertEqual([key[1] for key, _, _ in added], ["60"])
+
+if __name__ == "__main__":
+    unittest.main()
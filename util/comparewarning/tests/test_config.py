@@ -0,0 +1,61 @@
+"""
+Tests of the order in which settings sources apply (config.load_settings()):
+common.config, then environment variables, then command-line flags.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+class LogLevelTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def load(self, config_debug=False, environ=None, **overrides):
+        # overrides are the command-line flags
+        config_path = os.path.join(self.work_dir, "common.config")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(f"[DEFAULT]\nenableDebug = {'true' if config_debug else 'false'}\n")
+        return config.load_settings(config_path, environ or {}, **overrides)
+
+    def assert_level(self, settings, log_level):
+        self.assertEqual(settings.log_level, log_level)
+        self.assertEqual(settings.enable_debug, log_level == "debug")
+
+    def test_defaults(self):
+        self.assert_level(self.load(), "normal")
+
+    def test_enable_debug_selects_debug(self):
+        self.assert_level(self.load(config_debug=True), "debug")
+        self.assert_level(self.load(environ={config.ENV_DEBUG: "1"}), "debug")
+        self.assert_level(self.load(enable_debug=True), "debug")
+        self.assert_level(self.load(config_debug=True, log_level=None), "debug")
+
+    def test_debug_log_level_enables_debug(self):
+        self.assert_level(self.load(log_level="debug"), "debug")
+        self.assert_level(self.load(environ={config.ENV_LOG_LEVEL: "debug"}), "debug")
+
+    def test_command_line_level_wins_over_config_and_environment(self):
+        self.assert_level(self.load(config_debug=True, log_level="quiet"), "quiet")
+        self.assert_level(self.load(environ={config.ENV_DEBUG: "true"}, log_level="verbose"), "verbose")
+
+    def test_environment_level_wins_over_config(self):
+        self.assert_level(self.load(config_debug=True, environ={config.ENV_LOG_LEVEL: "quiet"}), "quiet")
+
+    def test_debug_from_the_same_or_a_higher_source_wins(self):
+        self.assert_level(self.load(environ={config.ENV_LOG_LEVEL: "quiet"}, enable_debug=True), "debug")
+        self.assert_level(self.load(environ={config.ENV_LOG_LEVEL: "quiet", config.ENV_DEBUG: "1"}), "debug")
+
+    def test_environment_debug_off(self):
+        self.assert_level(self.load(config_debug=True, environ={config.ENV_DEBUG: "0"}), "normal")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Tests of the attribution from the changes between two revisions (diff_attribution.py).
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diff_attribution
+import git_utils
+
+ALICE = ("Alice", "alice@example.com", "a" * 40)
+BOB = ("Bob", "bob@example.com", "b" * 40)
+
+def commit_header(record):
+    committer, email, commit_hash = record
+    return f"\0{commit_hash}\0{committer}\0{email}\n"
+
+def file_diff(path, hunks, created=False):
+    lines = [f"diff --git a/{path} b/{path}\n",
+             "--- /dev/null\n" if created else f"--- a/{path}\n",
+             f"+++ b/{path}\n"]
+    for header, body in hunks:
+        lines.append(header + "\n")
+        lines.extend(line + "\n" for line in body)
+    return lines
+
+class ApplyHunksTest(unittest.TestCase):
+    def test_added_lines(self):
+        line_map = diff_attribution.apply_hunks({}, [(0, 0, 1, 3)], ALICE)
+        self.assertEqual(line_map, {1: ALICE, 2: ALICE, 3: ALICE})
+
+    def test_lines_move_below_insertions_and_removals(self):
+        line_map = {1: ALICE, 5: ALICE, 10: ALICE}
+        # Two lines inserted after line 2, line 7 removed
+        line_map = diff_attribution.apply_hunks(line_map, [(2, 0, 3, 2), (7, 1, 8, 0)], BOB)
+        self.assertEqual(line_map, {1: ALICE, 3: BOB, 4: BOB, 7: ALICE, 11: ALICE})
+
+    def test_replaced_lines_take_the_new_record(self):
+        line_map = {4: ALICE, 5: ALICE, 6: ALICE}
+        line_map = diff_attribution.apply_hunks(line_map, [(5, 1, 5, 1)], BOB)
+        self.assertEqual(line_map, {4: ALICE, 5: BOB, 6: ALICE})
+
+class LineMapTest(unittest.TestCase):
+    def setUp(self):
+        hunks = {"src/proc.cpp": [(2, 0, 3, 2), (7, 1, 8, 0), (10, 2, 10, 1)]}
+        self.line_map = diff_attribution.LineMap(hunks)
+
+    def test_map_line(self):
+        map_line = self.line_map.map_line
+        self.assertEqual(map_line("src/proc.cpp", 1), 1)
+        self.assertEqual(map_line("src/proc.cpp", 2), 2)
+        self.assertEqual(map_line("src/proc.cpp", 3), 5)
+        self.assertIsNone(map_line("src/proc.cpp", 7))
+        self.assertEqual(map_line("src/proc.cpp", 8), 9)
+        self.assertIsNone(map_line("src/proc.cpp", 10))
+        self.assertIsNone(map_line("src/proc.cpp", 11))
+        self.assertEqual(map_line("src/proc.cpp", 12), 12)
+
+    def test_unchanged_file(self):
+        self.assertEqual(self.line_map.map_line("src/other.cpp", 42), 42)
+
+class ParsePatchTest(unittest.TestCase):
+    def test_removed_and_added_lines_that_look_like_headers(self):
+        # "-- comment" removed and "++ counter" added must not switch the current file
+        lines = [commit_header(ALICE)]
+        lines += file_diff("db/schema.sql", [("@@ -0,0 +1,3 @@", ["+-- comment", "+create table t;", "+++ counter"])],
+                           created=True)
+        lines += [commit_header(BOB)]
+        lines += file_diff("db/schema.sql", [("@@ -1 +0,0 @@", ["--- comment"]),
+                                             ("@@ -3 +2,2 @@", ["-++ counter", "+++ counter2", "+++ b/other.sql"])])
+        index = diff_attribution.parse_log_patch(lines)
+        self.assertEqual(set(index), {"db/schema.sql"})
+        self.assertEqual(index["db/schema.sql"], {1: ALICE, 2: BOB, 3: BOB})
+
+    def test_no_newline_marker(self):
+        lines = [commit_header(ALICE)]
+        lines += file_diff("src/a.cpp", [("@@ -1 +1 @@", ["-int a;", "\\ No newline at end of file", "+int b;",
+                                                        "\\ No newline at end of file"])])
+        self.assertEqual(diff_attribution.parse_log_patch(lines), {"src/a.cpp": {1: ALICE}})
+
+    def test_diff_hunks_with_header_like_lines(self):
+        lines = file_diff("src/a.lua", [("@@ -2,2 +2 @@", ["--- a/other.lua", "-x = 1", "+++ b/other.lua"]),
+                                        ("@@ -9,0 +9,2 @@", ["+y = 2", "+z = 3"])])
+        lines += file_diff("src/b.lua", [("@@ -1 +1 @@", ["-a", "+b"])])
+        self.assertEqual(diff_attribution.parse_diff_hunks(lines),
+                         {"src/a.lua": [(2, 2, 2, 1), (9, 0, 9, 2)], "src/b.lua": [(1, 1, 1, 1)]})
+
+@unittest.skipIf(shutil.which("git") is None, "git is not installed")
+class BuildIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.git("init", "-q")
+
+    def tearDown(self):
+        shutil.rmtree(self.repo, ignore_errors=True)
+
+    def git(self, *args, name="Alice"):
+        env = dict(os.environ, GIT_AUTHOR_NAME=name, GIT_COMMITTER_NAME=name,
+                   GIT_AUTHOR_EMAIL=f"{name.lower()}@example.com", GIT_COMMITTER_EMAIL=f"{name.lower()}@example.com")
+        return subprocess.run(["git", *args], cwd=self.repo, env=env, check=True, capture_output=True,
+                              text=True).stdout.strip()
+
+    def commit(self, files, name):
+        for path, text in files.items():
+            with open(os.path.join(self.repo, path), "w", encoding="utf-8", newline="\n") as f:
+                f.write(text)
+        self.git("add", "-A")
+        self.git("commit", "-q", "-m", f"change by {name}", name=name)
+        return self.git("rev-parse", "HEAD")
+
+    def test_sql_comments(self):
+        base = self.commit({"schema.sql": "-- header\ncreate table a;\n", "other.sql": "x\n"}, "Alice")
+        first = self.commit({"schema.sql": "-- header\n++ added\ncreate table a;\n"}, "Bob")
+        second = self.commit({"schema.sql": "++ added\ncreate table a;\ncreate table b;\n"}, "Carol")
+        index = diff_attribution.build_index(self.repo, base, "HEAD")
+        self.assertEqual(set(index), {"schema.sql"})
+        self.assertEqual(index["schema.sql"][1], ("Bob", "bob@example.com", first))
+        self.assertEqual(index["schema.sql"][3], ("Carol", "carol@example.com", second))
+        self.assertNotIn(2, index["schema.sql"])
+
+        line_map = diff_attribution.build_line_map(self.repo, base, "HEAD")
+        self.assertIsNone(line_map.map_line("schema.sql", 1))
+        self.assertEqual(line_map.map_line("schema.sql", 2), 2)
+
+    def test_bad_revision(self):
+        self.commit({"a.txt": "a\n"}, "Alice")
+        self.assertIsNone(diff_attribution.build_index(self.repo, "no-such-revision", "HEAD"))
+        self.assertFalse(git_utils.git_blame_not_found)
+
+if __name__ == "__main__":
+    unittest.main()
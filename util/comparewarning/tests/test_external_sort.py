@@ -0,0 +1,80 @@
+"""
+Tests of comparisons through sorted runs on disk (external_sort.py): a comparison
+forced to spill must give the same rows, in the same order, as one in memory.
+The logs are built from the golden logs of tests/data.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import compare_warnings
+import external_sort
+import log_utils
+
+log_utils.setup_logging("quiet")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+FORMAT_NAMES = ("msvc", "csc", "cl", "gcc")
+
+def read_lines(format_name):
+    with open(os.path.join(DATA_DIR, format_name + ".log"), "r", encoding="utf-8") as f:
+        return f.readlines()
+
+class SpillTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        logs = {name: read_lines(name) for name in FORMAT_NAMES}
+        # The old build has part of the warnings; the new one all of them, some twice
+        old_lines = logs["msvc"] + logs["gcc"][:len(logs["gcc"]) // 2] + logs["cl"]
+        new_lines = logs["csc"] + logs["msvc"] + logs["gcc"] + logs["cl"] + logs["msvc"] + logs["gcc"]
+        self.old_log = self.write_log("old.log", old_lines)
+        self.new_log = self.write_log("new.log", new_lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def write_log(self, name, lines):
+        path = os.path.join(self.work_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        return path
+
+    def compare(self, spill_limits=None, parse_workers=1):
+        infos = {}
+        added, counts2, total1, total2 = comparison.compare_logs(self.old_log, self.new_log, spill_limits=spill_limits,
+                                                                 parse_workers=parse_workers, infos=infos)
+        rows = [compare_warnings.make_csv_row(key, text, extra, {}, "", infos.get(key)) for key, text, extra in added]
+        return rows, counts2, total1, total2
+
+    def test_spilled_rows_match_in_memory_rows(self):
+        rows, counts2, total1, total2 = self.compare()
+        self.assertFalse(isinstance(counts2, external_sort.ExternalCounts))
+        self.assertTrue(rows)
+        for max_keys in (1, 2, 5):
+            for check_interval, merge_width in ((1, 2), (3, 3), (external_sort.SPILL_CHECK_INTERVAL, 64)):
+                with self.subTest(max_keys=max_keys, check_interval=check_interval, merge_width=merge_width), \
+                        mock.patch.object(external_sort, "SPILL_CHECK_INTERVAL", check_interval), \
+                        mock.patch.object(external_sort, "MAX_MERGE_WIDTH", merge_width):
+                    limits = external_sort.SpillLimits(max_keys, 0, self.work_dir)
+                    spilled_rows, spilled_counts2, spilled_total1, spilled_total2 = self.compare(limits)
+                    self.assertIsInstance(spilled_counts2, external_sort.ExternalCounts)
+                    self.assertEqual(spilled_rows, rows)
+                    self.assertEqual((spilled_total1, spilled_total2), (total1, total2))
+                    self.assertEqual(dict(spilled_counts2.items()), dict(counts2.items()))
+
+    def test_spilled_rows_with_parse_workers(self):
+        rows = self.compare()[0]
+        with mock.patch.object(external_sort, "SPILL_CHECK_INTERVAL", 2):
+            spilled_rows, spilled_counts2, _, _ = self.compare(external_sort.SpillLimits(2, 0, self.work_dir), 2)
+        self.assertIsInstance(spilled_counts2, external_sort.ExternalCounts)
+        self.assertEqual(spilled_rows, rows)
+
+if __name__ == "__main__":
+    unittest.main()
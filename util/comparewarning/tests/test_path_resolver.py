@@ -0,0 +1,97 @@
+"""
+Tests of the mapping of log file paths to repository paths (path_resolver.py):
+prefix maps, case correction and paths outside the repository.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_utils
+import path_resolver
+
+log_utils.setup_logging("quiet")
+
+class PathResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.repo_root = os.path.join(self.work_dir, "repo")
+        os.makedirs(os.path.join(self.repo_root, "src", "Console"))
+        for name in ("Main.cpp", "util.cpp"):
+            with open(os.path.join(self.repo_root, "src", "Console", name), "w", encoding="utf-8") as f:
+                f.write("int x;\n")
+        self.case_sensitive = not path_resolver.ignores_case(self.repo_root)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def resolver(self, prefix_maps=(), ignore_case=None):
+        resolver = path_resolver.PathResolver(self.repo_root, prefix_maps)
+        if ignore_case is not None:
+            resolver.ignore_case = ignore_case
+        return resolver
+
+    def test_ignores_case_matches_the_file_system(self):
+        probe = os.path.join(self.work_dir, "CaseProbe")
+        os.mkdir(probe)
+        self.assertEqual(path_resolver.ignores_case(probe), os.path.exists(os.path.join(self.work_dir, "caseprobe")))
+
+    def test_paths_inside_the_repository(self):
+        resolver = self.resolver()
+        self.assertEqual(resolver.resolve(os.path.join(self.repo_root, "src", "Console", "Main.cpp")),
+                         "src/Console/Main.cpp")
+        self.assertEqual(resolver.resolve("src/Console/util.cpp"), "src/Console/util.cpp")
+        self.assertIsNone(resolver.resolve("src/Console/missing.cpp"))
+        self.assertIsNone(resolver.resolve("../outside.cpp"))
+        self.assertIsNone(resolver.resolve("N/A"))
+
+    def test_unmapped_absolute_paths_outside_the_repository_are_kept(self):
+        outside = os.path.join(self.work_dir, "other", "lib.cpp")
+        resolver = self.resolver()
+        self.assertEqual(resolver.resolve(outside), outside)
+        self.assertEqual(path_resolver.PathResolver(None).resolve(outside), outside)
+
+    @unittest.skipIf(os.name == "nt", "Windows paths are absolute on Windows")
+    def test_unmapped_windows_paths(self):
+        self.assertIsNone(self.resolver().resolve("D:\\pam\\src\\Console\\Main.cpp"))
+
+    def test_case_sensitive_file_system_takes_paths_as_spelled(self):
+        resolver = self.resolver(ignore_case=False)
+        self.assertIsNone(resolver.resolve(os.path.join(self.repo_root, "src", "console", "main.cpp")))
+        self.assertIsNone(resolver.resolve("SRC/Console/Main.cpp"))
+        self.assertEqual(resolver.resolve("src/Console/Main.cpp"), "src/Console/Main.cpp")
+
+    def test_case_insensitive_file_system_corrects_case(self):
+        resolver = self.resolver(ignore_case=True)
+        self.assertEqual(resolver.resolve(os.path.join(self.repo_root, "src", "console", "main.cpp")),
+                         "src/Console/Main.cpp")
+        self.assertEqual(resolver.resolve("SRC/CONSOLE/UTIL.CPP"), "src/Console/util.cpp")
+
+    def test_mapped_paths_are_corrected_on_any_file_system(self):
+        resolver = self.resolver(prefix_maps=[("D:\\pam", ".")], ignore_case=False)
+        self.assertEqual(resolver.map_prefix("d:/PAM/src/x.cpp"), os.path.normpath(os.path.join(self.repo_root, "src/x.cpp")))
+        self.assertEqual(resolver.resolve("D:\\PAM\\SRC\\console\\main.cpp"), "src/Console/Main.cpp")
+        self.assertEqual(resolver.map_prefix("D:\\pamela\\x.cpp"), "D:\\pamela\\x.cpp")
+
+    def test_exact_name_wins(self):
+        if not self.case_sensitive:
+            self.skipTest("the file system ignores case")
+        with open(os.path.join(self.repo_root, "src", "Console", "main.cpp"), "w", encoding="utf-8") as f:
+            f.write("int y;\n")
+        resolver = self.resolver(prefix_maps=[("D:\\pam", ".")])
+        self.assertEqual(resolver.resolve("D:\\pam\\src\\Console\\main.cpp"), "src/Console/main.cpp")
+        self.assertEqual(resolver.resolve("D:\\pam\\src\\Console\\Main.cpp"), "src/Console/Main.cpp")
+
+    def test_results_are_cached(self):
+        resolver = self.resolver(ignore_case=False)
+        resolver.resolve("src/Console/Main.cpp")
+        resolver.resolve("src/Console/Main.cpp")
+        resolver.resolve("src/Console/missing.cpp")
+        self.assertEqual(resolver.stats["resolved"], 1)
+        self.assertEqual(resolver.stats["unresolved"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
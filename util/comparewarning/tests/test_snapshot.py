@@ -0,0 +1,144 @@
+"""
+Tests of when a baseline snapshot (snapshot.py) is used and when it is stale:
+size and modification time checks, the SHA-256 fallback, format versions and
+filter rules.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import log_utils
+import snapshot
+import warning_filter
+import warning_parser
+import warning_table
+
+log_utils.setup_logging("quiet")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.work_dir, "msvc.log")
+        shutil.copyfile(os.path.join(DATA_DIR, "msvc.log"), self.log_path)
+        self.snapshot_path = snapshot.save_snapshot(self.log_path)
+        self.expected = list(warning_parser.iter_warnings(self.log_path))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def load(self, warning_filter=None):
+        return snapshot.load_snapshot(self.snapshot_path, True, warning_filter=warning_filter)
+
+    def touch(self, offset_ns=10 ** 9):
+        stat = os.stat(self.log_path)
+        os.utime(self.log_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+    def rewrite_log(self, old, new):
+        # Replaces text and keeps the modification time
+        stat = os.stat(self.log_path)
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        self.assertIn(old, data)
+        with open(self.log_path, "wb") as f:
+            f.write(data.replace(old, new, 1))
+        os.utime(self.log_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    def rewrite_body(self, **changes):
+        body = snapshot._read_body(self.snapshot_path)
+        body.update(changes)
+        with open(self.snapshot_path, "wb") as f:
+            f.write(snapshot.SNAPSHOT_MAGIC + zlib.compress(json.dumps(body).encode("utf-8")))
+
+    def test_fresh_snapshot(self):
+        with mock.patch.object(snapshot, "hash_file", wraps=snapshot.hash_file) as hash_file:
+            counts, details, total = self.load()
+        # Size and modification time match, so the log is not hashed
+        hash_file.assert_not_called()
+        self.assertEqual(total, len(self.expected))
+        first_texts = {}
+        for key, text in self.expected:
+            first_texts.setdefault(key, text)
+        self.assertEqual(dict(details), first_texts)
+        self.assertEqual(list(counts), list(first_texts))
+
+    def test_size_changed(self):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write("Build succeeded.\n")
+        with mock.patch.object(snapshot, "hash_file", wraps=snapshot.hash_file) as hash_file:
+            self.assertIsNone(self.load())
+        hash_file.assert_not_called()
+
+    def test_only_mtime_changed(self):
+        # e.g. a copied log: the hash decides
+        self.touch()
+        with mock.patch.object(snapshot, "hash_file", wraps=snapshot.hash_file) as hash_file:
+            loaded = self.load()
+        self.assertEqual(hash_file.call_count, 1)
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded[2], len(self.expected))
+
+    def test_content_changed_with_the_same_size(self):
+        self.rewrite_log(b"(120,15)", b"(121,15)")
+        self.touch()
+        self.assertIsNone(self.load())
+
+    def test_content_changed_with_the_same_size_and_mtime(self):
+        # Only size and modification time are compared while they match
+        self.rewrite_log(b"(120,15)", b"(121,15)")
+        self.assertIsNotNone(self.load())
+
+    def test_version_mismatch(self):
+        self.rewrite_body(version=snapshot.SNAPSHOT_VERSION + 1)
+        self.assertIsNone(self.load())
+        self.rewrite_body(version=snapshot.SNAPSHOT_VERSION)
+        self.assertIsNotNone(self.load())
+
+    def test_unreadable_snapshot(self):
+        with open(self.snapshot_path, "wb") as f:
+            f.write(snapshot.SNAPSHOT_MAGIC + b"not zlib")
+        self.assertIsNone(self.load())
+        with open(self.snapshot_path, "wb") as f:
+            f.write(b"plain text")
+        self.assertIsNone(self.load())
+
+    def test_missing_log_is_used_unchecked(self):
+        moved_path = os.path.join(self.work_dir, "moved.snapshot")
+        os.replace(self.snapshot_path, moved_path)
+        os.remove(self.log_path)
+        self.snapshot_path = moved_path
+        self.assertIsNotNone(self.load())
+
+    def test_rules_must_match(self):
+        rules = warning_filter.WarningFilter(include_projects=["console.vcxproj"])
+        counts = warning_table.WarningCounts(keep_details=True)
+        counts.count((key, text) for key, text in self.expected if rules.accepts(key, text))
+        snapshot.write_snapshot(counts, snapshot.describe_source(self.log_path), self.snapshot_path, rules)
+
+        loaded = self.load(warning_filter.WarningFilter(include_projects=["console.vcxproj"]))
+        self.assertIsNotNone(loaded)
+        self.assertEqual(loaded[2], counts.total)
+        self.assertIsNone(self.load(warning_filter.WarningFilter(include_projects=["pfsproc.vcxproj"])))
+        self.assertIsNone(self.load(warning_filter.WarningFilter(include_projects=["console.vcxproj"],
+                                                                 exclude_codes=["C4996"])))
+        # Nor without rules: the snapshot lacks the filtered warnings
+        self.assertIsNone(self.load())
+
+    def test_stale_snapshot_falls_back_to_the_log(self):
+        self.rewrite_log(b"(120,15)", b"(121,15)")
+        self.touch()
+        counts, details, total = comparison.count_warnings(self.snapshot_path, keep_details=True)
+        self.assertEqual(total, len(self.expected))
+        self.assertIn(("D:\\pam\\pam32\\console\\NAICSubGrpUtl.cpp", "121", "15", "C4267"), details)
+
+if __name__ == "__main__":
+    unittest.main()
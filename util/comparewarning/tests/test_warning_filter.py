@@ -0,0 +1,189 @@
+"""
+Tests of the include and exclude rules (warning_filter.py): the path trie, the code
+set, the decision caches of WarningFilter and the filtering of loaded snapshots.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import log_utils
+import snapshot
+import warning_filter
+import warning_parser
+import warning_table
+
+log_utils.setup_logging("quiet")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+def warning(filepath, code="C4267", project="D:\\pam\\pam32\\console\\console.vcxproj", line=10):
+    key = (filepath, str(line), "5", code)
+    text = f"{filepath}({line},5): warning {code}: conversion from 'size_t' to 'int'"
+    if project:
+        text += f" [{project}]"
+    return key, text
+
+class CountingTest:
+    """
+    Wraps a rule test and counts its calls.
+    """
+    def __init__(self, test):
+        self.test = test
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        return self.test(value)
+
+class ParseRulesTest(unittest.TestCase):
+    def test_separators(self):
+        self.assertEqual(warning_filter.parse_rules("pam32/dll; pam32/console,C4996\n -Wall ;;"),
+                         ("pam32/dll", "pam32/console", "C4996", "-Wall"))
+        self.assertEqual(warning_filter.parse_rules(None), ())
+
+class PathTrieTest(unittest.TestCase):
+    def setUp(self):
+        self.trie = warning_filter.PathTrie(["pam32/dll/pfsproc", "console.vcxproj", "", "./"])
+
+    def test_prefix_at_any_component(self):
+        self.assertTrue(self.trie.matches("D:\\pam\\pam32\\dll\\pfsproc\\proc.cpp"))
+        self.assertTrue(self.trie.matches("/home/build/pam/pam32/dll/pfsproc/sub/x.cpp"))
+        self.assertTrue(self.trie.matches("D:\\pam\\pam32\\console\\console.vcxproj"))
+
+    def test_case_and_slashes_are_ignored(self):
+        self.assertTrue(self.trie.matches("d:/PAM/Pam32\\DLL/PfsProc/proc.cpp"))
+
+    def test_whole_components_only(self):
+        self.assertFalse(self.trie.matches("D:\\pam\\pam32\\dll\\pfsprocx\\proc.cpp"))
+        self.assertFalse(self.trie.matches("D:\\pam\\pam32\\dll\\proc.cpp"))
+        self.assertFalse(self.trie.matches("D:\\pam\\pam32\\console\\myconsole.vcxproj"))
+
+    def test_empty_prefixes_are_dropped(self):
+        self.assertEqual(set(self.trie.root), {"pam32", "console.vcxproj"})
+        self.assertFalse(warning_filter.PathTrie([""]).matches("D:\\pam\\proc.cpp"))
+
+class CodeSetTest(unittest.TestCase):
+    def test_whole_codes_ignoring_case(self):
+        codes = warning_filter.CodeSet(["C4996", "-Wdeprecated-declarations"])
+        self.assertTrue(codes.matches("c4996"))
+        self.assertTrue(codes.matches("-WDEPRECATED-declarations"))
+        self.assertFalse(codes.matches("C499"))
+
+class WarningFilterTest(unittest.TestCase):
+    def test_include_and_exclude_paths(self):
+        rules = warning_filter.WarningFilter(include_paths=["pam32/dll"], exclude_paths=["pam32/dll/generated"])
+        self.assertTrue(rules.accepts(*warning("D:\\pam\\pam32\\dll\\proc.cpp")))
+        self.assertFalse(rules.accepts(*warning("D:\\pam\\pam32\\dll\\generated\\gen.cpp")))
+        self.assertFalse(rules.accepts(*warning("D:\\pam\\pam32\\console\\main.cpp")))
+
+    def test_every_kind_with_include_rules_must_match(self):
+        rules = warning_filter.WarningFilter(include_paths=["pam32"], include_codes=["C4996"])
+        self.assertTrue(rules.accepts(*warning("D:\\pam\\pam32\\proc.cpp", code="C4996")))
+        self.assertFalse(rules.accepts(*warning("D:\\pam\\pam32\\proc.cpp", code="C4267")))
+        self.assertFalse(rules.accepts(*warning("D:\\other\\proc.cpp", code="C4996")))
+
+    def test_missing_values(self):
+        # "N/A" matches no rule: dropped by include rules, kept by exclude rules
+        key, text = warning("N/A", project=None)
+        self.assertFalse(warning_filter.WarningFilter(include_paths=["pam32"]).accepts(key, text))
+        self.assertTrue(warning_filter.WarningFilter(exclude_paths=["pam32"]).accepts(key, text))
+        self.assertFalse(warning_filter.WarningFilter(include_projects=["console.vcxproj"]).accepts(key, text))
+        self.assertTrue(warning_filter.WarningFilter(exclude_projects=["console.vcxproj"]).accepts(key, text))
+
+    def test_projects(self):
+        rules = warning_filter.WarningFilter(include_projects=["pfsproc.vcxproj"])
+        self.assertTrue(rules.accepts(*warning("D:\\pam\\a.cpp", project="D:\\pam\\pam32\\dll\\pfsproc\\pfsproc.vcxproj")))
+        self.assertFalse(rules.accepts(*warning("D:\\pam\\a.cpp")))
+
+    def test_path_and_code_decisions_are_cached(self):
+        rules = warning_filter.WarningFilter(include_paths=["pam32/dll"], exclude_codes=["C4996"])
+        path_test = CountingTest(rules.path_tests[0])
+        code_test = CountingTest(rules.code_tests[1])
+        rules.path_tests = (path_test, None)
+        rules.code_tests = (None, code_test)
+        for line in range(100):
+            rules.accepts(*warning("D:\\pam\\pam32\\dll\\proc.cpp", line=line))
+            rules.accepts(*warning("D:\\pam\\pam32\\console\\main.cpp", line=line))
+        self.assertEqual(path_test.calls, 2)
+        self.assertEqual(code_test.calls, 1)
+        self.assertEqual(rules.paths, {"D:\\pam\\pam32\\dll\\proc.cpp": True, "D:\\pam\\pam32\\console\\main.cpp": False})
+        self.assertEqual(rules.codes, {"C4267": True})
+
+    def test_project_is_extracted_once_per_project_text(self):
+        rules = warning_filter.WarningFilter(exclude_projects=["console.vcxproj"])
+        with mock.patch.object(warning_parser, "extract_project_path",
+                               wraps=warning_parser.extract_project_path) as extract:
+            for line in range(100):
+                self.assertFalse(rules.accepts(*warning("D:\\pam\\pam32\\console\\main.cpp", line=line)))
+                self.assertTrue(rules.accepts(*warning("D:\\pam\\pam32\\dll\\proc.cpp", line=line,
+                                                       project="D:\\pam\\pam32\\dll\\dll.vcxproj")))
+                self.assertTrue(rules.accepts(*warning("D:\\pam\\pam32\\dll\\proc.cpp", line=line, project=None)))
+        self.assertEqual(extract.call_count, 3)
+        self.assertEqual(len(rules.projects), 3)
+
+    def test_no_project_rules_no_extraction(self):
+        rules = warning_filter.WarningFilter(include_codes=["C4267"])
+        with mock.patch.object(warning_parser, "extract_project_path") as extract:
+            self.assertTrue(rules.accepts(*warning("D:\\pam\\a.cpp")))
+        extract.assert_not_called()
+
+    def test_describe(self):
+        rules = warning_filter.WarningFilter(include_paths=["pam32/dll", "pam32/console"], exclude_codes=["C4996"])
+        self.assertEqual(rules.describe(), "include paths: pam32/dll, pam32/console; exclude codes: C4996")
+
+class GetFilterTest(unittest.TestCase):
+    def test_shared_per_rules(self):
+        self.assertIsNone(warning_filter.get_filter(config.Settings()))
+        settings = config.Settings(include_codes=("C4996",))
+        first = warning_filter.get_filter(settings)
+        self.assertIs(warning_filter.get_filter(config.Settings(include_codes=("C4996",))), first)
+        self.assertIsNot(warning_filter.get_filter(config.Settings(include_codes=("C4267",))), first)
+
+class SnapshotFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.work_dir, "msvc.log")
+        shutil.copyfile(os.path.join(DATA_DIR, "msvc.log"), self.log_path)
+        self.snapshot_path = snapshot.save_snapshot(self.log_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def parsed(self, rules):
+        return [(key, text) for key, text in warning_parser.iter_warnings(self.log_path) if rules.accepts(key, text)]
+
+    def assert_loaded_like_parsed(self, rules):
+        counts, details, total = snapshot.load_snapshot(self.snapshot_path, True, warning_filter=rules)
+        parsed = self.parsed(rules)
+        self.assertEqual(total, len(parsed))
+        first_texts = {}
+        for key, text in parsed:
+            first_texts.setdefault(key, text)
+        self.assertEqual(dict(details), first_texts)
+        self.assertEqual({key: counts[key] for key in counts},
+                         {key: sum(1 for other, _ in parsed if other == key) for key in first_texts})
+
+    def test_path_and_code_rules_filter_on_load(self):
+        self.assert_loaded_like_parsed(warning_filter.WarningFilter(include_paths=["pam32/console"]))
+        self.assert_loaded_like_parsed(warning_filter.WarningFilter(exclude_codes=["C4267", "C4005"]))
+
+    def test_project_rules_are_not_applied_to_unfiltered_snapshots(self):
+        # The snapshot keeps one text per key, not the project of every occurrence
+        rules = warning_filter.WarningFilter(include_projects=["console.vcxproj"])
+        self.assertIsNone(snapshot.load_snapshot(self.snapshot_path, True, warning_filter=rules))
+
+    def test_snapshot_saved_with_the_same_rules(self):
+        rules = warning_filter.WarningFilter(include_projects=["console.vcxproj"])
+        filtered = warning_table.WarningCounts(keep_details=True)
+        filtered.count(self.parsed(rules))
+        snapshot.write_snapshot(filtered, snapshot.describe_source(self.log_path), self.snapshot_path, rules)
+        self.assert_loaded_like_parsed(warning_filter.WarningFilter(include_projects=["console.vcxproj"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Golden-output tests for the warning formats of warning_parser.WARNING_FORMATS.
+
+tests/data/<format>.log is a sample build log of each format, and
+<format>.expected.json the (key, text) pairs the parser yields from it, in order.
+The streaming, mmap and parallel (--parse-workers) parsers must all give exactly
+that output.
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import warning_parser
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+FORMAT_NAMES = ("msvc", "csc", "cl", "gcc")
+
+def load_expected(format_name):
+    with open(os.path.join(DATA_DIR, format_name + ".expected.json"), "r", encoding="utf-8") as f:
+        return [(tuple(key), text) for key, text in json.load(f)]
+
+def log_path(format_name):
+    return os.path.join(DATA_DIR, format_name + ".log")
+
+class WarningFormatTest(unittest.TestCase):
+    def test_formats_are_covered(self):
+        self.assertEqual(set(FORMAT_NAMES), set(warning_parser.WARNING_FORMATS))
+
+    def test_streaming(self):
+        for format_name in FORMAT_NAMES:
+            with self.subTest(format_name):
+                self.assertEqual(list(warning_parser.iter_warnings(log_path(format_name))),
+                                 load_expected(format_name))
+
+    def test_mmap(self):
+        for format_name in FORMAT_NAMES:
+            with self.subTest(format_name):
+                self.assertEqual(list(warning_parser.iter_warnings(log_path(format_name), use_mmap=True)),
+                                 load_expected(format_name))
+
+    def test_ranges(self):
+        # Ranges of a few lines each, so warnings and their compiling source lines meet range boundaries
+        for format_name in FORMAT_NAMES:
+            with self.subTest(format_name):
+                path = log_path(format_name)
+                ranges = warning_parser.split_log(path, 8, min_chunk_size=1)
+                self.assertGreater(len(ranges), 1)
+                warnings = []
+                for start, end in ranges:
+                    warnings.extend(warning_parser.iter_warnings_range(path, start, end))
+                self.assertEqual(warnings, load_expected(format_name))
+
+    def test_parse_workers(self):
+        for format_name in FORMAT_NAMES:
+            with self.subTest(format_name):
+                path = log_path(format_name)
+                expected = load_expected(format_name)
+                ranges = warning_parser.split_log(path, 4, min_chunk_size=1)
+                counts = comparison.count_warnings_parallel(path, ranges, keep_details=True)
+                first_texts = {}
+                for key, text in expected:
+                    first_texts.setdefault(key, text)
+                self.assertEqual(list(counts), list(first_texts))
+                self.assertEqual(dict(counts.details()), first_texts)
+                self.assertEqual({key: counts[key] for key in counts},
+                                 {key: sum(1 for other, _ in expected if other == key) for key in first_texts})
+                self.assertEqual(counts.total, len(expected))
+
+    def test_match_warning(self):
+        for format_name in FORMAT_NAMES:
+            with self.subTest(format_name):
+                for key, text in load_expected(format_name):
+                    # The joined compiling source is not part of the matched line
+                    self.assertEqual(warning_parser.match_warning(text.split("\n")[0]), key)
+
+if __name__ == "__main__":
+    unittest.main()
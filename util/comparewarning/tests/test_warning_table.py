@@ -0,0 +1,88 @@
+"""
+Tests of the project path and compiling source kept with every warning text of a
+WarningCounts (warning_table.py), and of their use for the CSV rows.
+"""
+import os
+import pickle
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparison
+import compare_warnings
+import log_utils
+import warning_parser
+import warning_table
+
+log_utils.setup_logging("quiet")
+
+PROJECT = "D:\\pam\\pam32\\dll\\pfsproc\\pfsproc.vcxproj"
+
+WARNINGS = [
+    (("D:\\pam\\proc.cpp", "10", "5", "C4267"),
+     f"D:\\pam\\proc.cpp(10,5): warning C4267: conversion [{PROJECT}]"),
+    (("D:\\pam\\proc.cpp", "20", "5", "C4267"),
+     f"D:\\pam\\proc.cpp(20,5): warning C4267: conversion [{PROJECT}]"),
+    (("D:\\pam\\common.h", "3", "1", "C4005"),
+     f"D:\\pam\\common.h(3,1): warning C4005: redefinition [{PROJECT}] (compiling source file 'proc.cpp')"),
+    (("/src/a.c", "7", "2", "-Wunused"), "/src/a.c:7:2: warning: unused variable [-Wunused]"),
+]
+
+def expected_info(text):
+    return warning_parser.extract_project_path(text), warning_parser.extract_compiling_source(text)
+
+class WarningInfoTest(unittest.TestCase):
+    def test_extracted_once_per_text(self):
+        counts = warning_table.WarningCounts(keep_details=True)
+        with mock.patch.object(warning_parser, "extract_warning_info",
+                               wraps=warning_parser.extract_warning_info) as extract:
+            counts.count(WARNINGS + WARNINGS)
+            # Both C4267 warnings share the text after their location
+            self.assertEqual(extract.call_count, 3)
+            for row, (_, text) in enumerate(WARNINGS):
+                self.assertEqual(counts.info_of(row), expected_info(text))
+            self.assertEqual(extract.call_count, 3)
+        self.assertEqual(counts.info_of(2), (PROJECT, "proc.cpp"))
+        self.assertEqual(counts.info_of(3), ("N/A", "N/A"))
+
+    def test_without_details(self):
+        counts = warning_table.WarningCounts()
+        counts.count(WARNINGS)
+        self.assertIsNone(counts.info_of(0))
+        self.assertIsNone(counts.details().info(WARNINGS[0][0]))
+
+    def test_merge_and_pickle_keep_infos(self):
+        first = warning_table.WarningCounts(keep_details=True)
+        first.count(WARNINGS[:2])
+        second = warning_table.WarningCounts(keep_details=True)
+        second.count(WARNINGS[2:])
+        with mock.patch.object(warning_parser, "extract_warning_info") as extract:
+            first.merge(pickle.loads(pickle.dumps(second)))
+            texts = first.details()
+            for key, text in WARNINGS:
+                self.assertEqual(texts.info(key), expected_info(text))
+        extract.assert_not_called()
+
+class CsvRowInfoTest(unittest.TestCase):
+    def test_rows_use_the_stored_infos(self):
+        counts1 = warning_table.WarningCounts()
+        counts2 = warning_table.WarningCounts(counts1.strings, keep_details=True)
+        counts1.count(WARNINGS[:1])
+        counts2.count(WARNINGS)
+        infos = {}
+        added = comparison.diff_counts(counts1, counts2, counts2.details(), infos)
+        self.assertEqual(set(infos), {key for key, _, _ in added})
+        with mock.patch.object(warning_parser, "extract_warning_info") as extract:
+            rows = [compare_warnings.make_csv_row(key, text, extra, {}, "", infos[key]) for key, text, extra in added]
+        extract.assert_not_called()
+        self.assertEqual([row[5:7] for row in rows], [list(expected_info(text)) for _, text in WARNINGS[1:]])
+
+    def test_rows_without_infos(self):
+        key, text = WARNINGS[2]
+        row = compare_warnings.make_csv_row(key, text, 1, {}, "")
+        self.assertEqual(row[5:7], [PROJECT, "proc.cpp"])
+
+if __name__ == "__main__":
+    unittest.main()
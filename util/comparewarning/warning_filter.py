@@ -0,0 +1,174 @@
+"""
+Include and exclude rules for warnings, by file path, project file and warning code.
+
+Rules come from common.config or the command line:
+
+    INCLUDE_PATHS = pam32/dll/pfsproc; pam32/console
+    EXCLUDE_PATHS = pam32/dll/pfsproc/generated
+    INCLUDE_PROJECTS = pfsproc.vcxproj
+    EXCLUDE_CODES = C4996, -Wdeprecated-declarations
+
+    python compare_warnings.py old new --include-path pam32/dll/pfsproc --exclude-code C4996
+
+A warning is kept if it matches an include rule of every kind that has include
+rules, and no exclude rule. Path and project rules are prefixes of whole path
+components, compared ignoring case and the kind of slash, that may start at any
+component: "pam32/dll/pfsproc" matches D:\\pam\\pam32\\dll\\pfsproc\\proc.cpp, and
+"pfsproc.vcxproj" any project file of that name. Code rules are whole codes,
+compared ignoring case. The rules are applied by the parser (see
+warning_parser.iter_warnings()), so filtered warnings are never counted, compared
+or blamed.
+"""
+import re
+import threading
+
+import warning_parser
+
+# Filters by rules, see get_filter()
+_filters = {}
+_filters_lock = threading.Lock()
+
+def parse_rules(value):
+    """
+    Parse rules separated by ';', ',' or newlines, e.g. "pam32/dll; pam32/console".
+    Returns a tuple of the non-empty rules.
+    """
+    return tuple(rule.strip() for rule in re.split(r'[;,\n]', value or "") if rule.strip())
+
+def _components(path):
+    # "D:\pam\pam32\" -> ["d:", "pam", "pam32"]
+    return [component for component in path.replace('\\', '/').lower().split('/') if component not in ('', '.')]
+
+class PathTrie:
+    """
+    Path prefixes stored as a trie of lower-case path components.
+    """
+    # Key that marks the end of a prefix; never a component, since empty components are dropped
+    END = ""
+
+    def __init__(self, prefixes=()):
+        self.root = {}
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix):
+        components = _components(prefix)
+        if not components:
+            return
+        node = self.root
+        for component in components:
+            node = node.setdefault(component, {})
+        node[self.END] = True
+
+    def matches(self, path):
+        """
+        Check whether the components of a prefix occur in path, starting at any component.
+        """
+        components = _components(path)
+        root = self.root
+        for start in range(len(components)):
+            node = root
+            for component in components[start:]:
+                node = node.get(component)
+                if node is None:
+                    break
+                if self.END in node:
+                    return True
+        return False
+
+def _passes(value, tests):
+    include, exclude = tests
+    if value == "N/A":
+        # A missing value matches no rule
+        return include is None
+    if include is not None and not include(value):
+        return False
+    return exclude is None or not exclude(value)
+
+def _rule_tests(include, exclude, make_test):
+    # (include test, exclude test) of one kind of rules, or None if it has no rules
+    if not include and not exclude:
+        return None
+    return (make_test(include) if include else None, make_test(exclude) if exclude else None)
+
+class CodeSet:
+    """
+    Warning codes, compared ignoring case.
+    """
+    def __init__(self, codes=()):
+        self.codes = frozenset(code.lower() for code in codes)
+
+    def matches(self, code):
+        return code.lower() in self.codes
+
+class WarningFilter:
+    """
+    Decides for every warning whether it is kept. Decisions are cached per file path
+    and code, and per text from the first '[' of a warning for project rules (a
+    project path starts at a '['), so each distinct value goes through the rules once.
+    """
+    def __init__(self, include_paths=(), exclude_paths=(), include_projects=(), exclude_projects=(),
+                 include_codes=(), exclude_codes=()):
+        self.rules = (tuple(include_paths), tuple(exclude_paths), tuple(include_projects), tuple(exclude_projects),
+                      tuple(include_codes), tuple(exclude_codes))
+        # Bound methods, so a filter can be sent to worker processes
+        self.path_tests = _rule_tests(include_paths, exclude_paths, lambda rules: PathTrie(rules).matches)
+        self.project_tests = _rule_tests(include_projects, exclude_projects, lambda rules: PathTrie(rules).matches)
+        self.code_tests = _rule_tests(include_codes, exclude_codes, lambda rules: CodeSet(rules).matches)
+        # Value -> whether it passes the rules of its kind
+        self.paths = {}
+        self.codes = {}
+        # Text from the first '[' of a warning ("" if none) -> whether its project passes the project rules
+        self.projects = {}
+
+    @staticmethod
+    def _check(cache, tests, value):
+        accepted = cache.get(value)
+        if accepted is None:
+            accepted = cache[value] = _passes(value, tests)
+        return accepted
+
+    def accepts(self, key, text):
+        """
+        Check whether a warning (key, text), as yielded by the parser, is kept.
+        A warning without a file path, project or code ("N/A") is filtered out by
+        include rules of that kind. The project is only extracted from text if
+        there are project rules, once per distinct text from the first '['.
+        """
+        filepath, _, _, code = key
+        if self.path_tests is not None and not self._check(self.paths, self.path_tests, filepath):
+            return False
+        if self.code_tests is not None and not self._check(self.codes, self.code_tests, code):
+            return False
+        if self.project_tests is not None:
+            start = text.find('[')
+            tail = text[start:] if start >= 0 else ""
+            accepted = self.projects.get(tail)
+            if accepted is None:
+                accepted = self.projects[tail] = _passes(warning_parser.extract_project_path(tail), self.project_tests)
+            if not accepted:
+                return False
+        return True
+
+    def describe(self):
+        """
+        Return the rules as a short text for log messages.
+        """
+        names = ("include paths", "exclude paths", "include projects", "exclude projects",
+                 "include codes", "exclude codes")
+        return "; ".join(f"{name}: {', '.join(rules)}" for name, rules in zip(names, self.rules) if rules)
+
+def get_filter(settings):
+    """
+    Return the shared filter of this process for the rules in settings, or None if
+    settings have no rules.
+    """
+    key = (settings.include_paths, settings.exclude_paths, settings.include_projects, settings.exclude_projects,
+           settings.include_codes, settings.exclude_codes)
+    if not any(key):
+        return None
+    warning_filter = _filters.get(key)
+    if warning_filter is None:
+        with _filters_lock:
+            warning_filter = _filters.setdefault(key, WarningFilter(*key))
+    return warning_filter
@@ -1,11 +1,29 @@
+import bz2
+import gzip
+import lzma
+import mmap
+import os
 import re
-import sys
+
+import log_utils
+
+logger = log_utils.get_logger("warning_parser")
+
+# Project path in square brackets, e.g. [D:\pam\pam32\dll\pfsproc\pfsproc.vcxproj]
+project_pattern = re.compile(r'\[([^[\]]*?(?:\.vcxproj|\.csproj|/|\\)[^[\]]*?)\]')
+
+# Compiling source file, e.g. (compiling source file 'D:\pam\pam32\console\main.cpp')
+source_pattern = re.compile(r"compiling source file ['\"](.+?)['\"]", re.IGNORECASE)
 
 def extract_project_path(warning_text):
     """
     Extract project path from the warning text, typically enclosed in square brackets.
+    A project path starts at a '[', so only the text from the first '[' on is searched.
     """
-    project_match = re.search(r'\[([^[\]]*?(?:\.vcxproj|\.csproj|/|\\)[^[\]]*?)\]', warning_text)
+    start = warning_text.find('[')
+    if start < 0:
+        return "N/A"
+    project_match = project_pattern.search(warning_text, start)
     if project_match:
         path = project_match.group(1).strip()
         # Return the path if it contains backslashes, forward slashes, or specific project file extensions.
@@ -30,11 +48,21 @@ def extract_compiling_source(warning_text):
     Extract the compiling source file path from the warning text,
     expected in the format: compiling source file 'xxx.cpp'
     """
-    source_match = re.search(r"compiling source file ['\"](.+?)['\"]", warning_text, re.IGNORECASE)
+    source_match = source_pattern.search(warning_text)
     return source_match.group(1) if source_match else "N/A"
 
+def extract_warning_info(warning_text):
+    """
+    Return (project path, compiling source file) of a warning text, "N/A" for
+    what it does not have. warning_table.WarningCounts stores them once per
+    distinct text as the text is counted, for the Project and Compiling Source
+    columns of the CSV file.
+    """
+    return extract_project_path(warning_text), extract_compiling_source(warning_text)
+
 
-# Regex pattern for the original warning format:
+# Regex pattern for the original warning format (the "msvc" entry of WARNING_FORMATS,
+# with its original group names; the parser itself uses the combined warning_pattern):
 # Optional numeric prefix (e.g., "80>") then a Windows file path followed by (line,column): warning <code>: message
 original_pattern = re.compile(
     r"(?:(?:\d+>\s*)?)"                               # optional numeric prefix like "80>"
@@ -44,72 +72,412 @@ original_pattern = re.compile(
     r"(?P<message>.*)"                                # the rest is treated as message
 )
 
-def parse_warnings(filename):
+# Warning formats recognized by the parser, in the order they are tried at each
+# position of a line. The groups of a format are named "<format>_<field>", with the
+# fields filepath, line, column and code; fields a format does not have are "N/A".
+WARNING_FORMATS = {
+    # Visual C++ / MSBuild: D:\pam\pam32\console\NAICSubGrpUtl.cpp(12,5): warning C4267: message
+    "msvc": (
+        r"(?:(?:\d+>\s*)?)"
+        r"(?P<msvc_filepath>[A-Za-z]:[\\/][^(]+)"
+        r"\((?P<msvc_line>\d+),(?P<msvc_column>\d+)\):\s*"
+        r"warning\s+(?P<msvc_code>\S+):\s*"
+        r"(?P<msvc_message>.*)"
+    ),
+    # C# compiler without a source location: CSC : warning CS8032: message
+    "csc": r"\bCSC\s*:\s*warning\s+(?P<csc_code>[A-Za-z]+\d+)\s*:\s*(?P<csc_message>.*)",
+    # Visual C++ command line: cl : command line warning D9025: message
+    "cl": r"\bcl\s*:\s*[Cc]ommand line warning\s+(?P<cl_code>[A-Za-z]+\d+)\s*:\s*(?P<cl_message>.*)",
+    # GCC / Clang: src/file.cpp:12:5: warning: message [-Wflag]; the flag is the code
+    "gcc": (
+        r"(?P<gcc_filepath>(?:[A-Za-z]:)?[^\s:][^:]*?)"
+        r":(?P<gcc_line>\d+):(?:(?P<gcc_column>\d+):)?\s*"
+        r"warning:\s*"
+        r"(?P<gcc_message>.*?)(?:\s*\[(?P<gcc_code>-W[^\]]+)\])?\s*$"
+    ),
+}
+
+# Key fields of a warning, in key order
+WARNING_FIELDS = ("filepath", "line", "column", "code")
+
+def _build_format_matcher(formats):
     """
-    Parse warning messages from the log file and return a list.
-    Each element in the list is a tuple (key, warning_text),
-    where key is a tuple (file path, line number, column number, warning code),
-    and warning_text is the complete warning message.
+    Compile all formats into one regex with a named alternative per format, so each
+    line is scanned once however many formats there are. Returns the regex and, per
+    format name, the group names of its key fields (None for fields it does not have).
+    """
+    pattern = re.compile("|".join(f"(?P<{name}>{regex})" for name, regex in formats.items()))
+    fields = {}
+    for name in formats:
+        fields[name] = tuple(f"{name}_{field}" if f"{name}_{field}" in pattern.groupindex else None
+                             for field in WARNING_FIELDS)
+    return pattern, fields
+
+warning_pattern, warning_format_fields = _build_format_matcher(WARNING_FORMATS)
+
+# Literal every supported warning line contains. Lines without it are skipped
+# before the combined regex runs.
+WARNING_PREFILTER = "warning"
+
+def match_warning(line):
+    """
+    Match a log line against all warning formats.
+    Returns the warning key (file path, line number, column number, warning code),
+    with "N/A" for fields the format does not have, or None if the line is not a warning.
     """
-    warnings = []
+    if WARNING_PREFILTER not in line:
+        return None
+    match = warning_pattern.search(line)
+    if match is None:
+        return None
+    # The outermost group closes last, so lastgroup is the name of the matching format
+    key = []
+    for group in warning_format_fields[match.lastgroup]:
+        value = match.group(group) if group else None
+        key.append(value.strip() if value else "N/A")
+    return tuple(key)
+
+# Size of the read buffer used when streaming a log file. The parser never holds
+# more than this buffer plus one line of lookahead in memory.
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Smallest byte range a log is split into for parallel parsing (see split_log())
+PARALLEL_MIN_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Compressed log formats: extension, leading magic bytes and stdlib opener
+COMPRESSED_FORMATS = [
+    ('.gz', b'\x1f\x8b', gzip.open),
+    ('.bz2', b'BZh', bz2.open),
+    ('.xz', b'\xfd7zXZ\x00', lzma.open),
+]
+
+# Regex for the numeric MSBuild prefix (e.g. "80>") at the start of a line
+prefix_pattern = re.compile(r'^\d+>\s*')
+
+# Byte anchor used by the mmap scanner to find candidate lines. Every line a
+# warning format can match contains this literal, so lines without it are skipped
+# without being decoded.
+WARNING_ANCHOR = WARNING_PREFILTER.encode('ascii')
 
+def get_compressed_opener(filename):
+    """
+    Return the stdlib open function for a compressed log (gzip, bzip2 or xz),
+    detected by its extension or, for files without one, by its magic bytes.
+    Returns None for uncompressed logs.
+    """
+    lower_name = filename.lower()
+    for extension, _, opener in COMPRESSED_FORMATS:
+        if lower_name.endswith(extension):
+            return opener
     try:
-        with open(filename, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        print(f"Error: Log file '{filename}' not found.", file=sys.stderr)
-        return [] # Return empty list if file not found
-    except Exception as e:
-        print(f"Error reading log file '{filename}': {e}", file=sys.stderr)
-        return [] # Return empty list on other read errors
+        with open(filename, 'rb') as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for _, magic, opener in COMPRESSED_FORMATS:
+        if head.startswith(magic):
+            return opener
+    return None
 
+def strip_compressed_extension(filename):
+    """
+    Remove a compression extension: "core.log.gz" -> "core.log".
+    """
+    lower_name = filename.lower()
+    for extension, _, _ in COMPRESSED_FORMATS:
+        if lower_name.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+def find_log_file(path):
+    """
+    Return path if it exists, otherwise the first existing compressed variant of it
+    (path + ".gz", ".bz2" or ".xz"). Returns path unchanged if none exists.
+    """
+    if os.path.exists(path):
+        return path
+    for extension, _, _ in COMPRESSED_FORMATS:
+        if os.path.exists(path + extension):
+            return path + extension
+    return path
+
+def open_log(filename):
+    """
+    Open a log file for reading as text. Compressed logs are decompressed as a
+    stream while they are read, never to disk. Lines are decoded with
+    encoding='utf-8', errors='ignore' and universal newlines in both cases.
+    """
+    opener = get_compressed_opener(filename)
+    if opener is not None:
+        return opener(filename, 'rt', encoding='utf-8', errors='ignore')
+    return open(filename, 'r', encoding='utf-8', errors='ignore', buffering=READ_CHUNK_SIZE)
 
-    current_warning_text = None
-    current_key = None
-    i = 0
+def _join_warnings(filename, located_lines, location_label="line", warning_filter=None):
+    """
+    Core warning state machine shared by the streaming and mmap readers.
+    located_lines yields (location, raw_line) pairs, where location is the line number
+    or byte offset (named by location_label) used in log messages. A matched warning
+    is held until the following line has been seen, so a "compiling source file" line
+    can be joined. Warnings rejected by warning_filter (a warning_filter.WarningFilter)
+    are dropped once they are complete, and their compiling source line is still consumed.
+    """
+    # Per-warning messages are only formatted when verbose logging is on
+    log_verbose = logger.isEnabledFor(log_utils.VERBOSE)
+    accepts = warning_filter.accepts if warning_filter is not None else None
+    # Warning waiting for its next line to be checked for compiling source info
+    pending_key = None
+    pending_text = None
+    pending_where = None
+    # Lines read, lines matched and warnings filtered out, added to the process counters at the end
+    lines_scanned = 0
+    regex_hits = 0
+    filtered = 0
 
-    while i < len(lines):
+    for where, raw_line in located_lines:
+        lines_scanned += 1
         # Remove trailing spaces from the original line
-        line = lines[i].rstrip(' ')
+        line = raw_line.rstrip(' ')
         # Remove numeric prefix such as "80>" if present at the start
-        clean_line = re.sub(r'^\\d+>\\s*', '', line)
-
-        # Check if the line matches the original warning format.
-        original_match = original_pattern.search(clean_line)
-        if original_match:
-            # Extract info for the warning
-            filepath = original_match.group("filepath").strip()
-            line_no = original_match.group("line").strip()
-            column = original_match.group("column").strip()
-            warning_code = original_match.group("warning_num").strip()
-            
-            key_tuple = (filepath, line_no, column, warning_code)
-            # Warning text starts with the current matched line
-            warning_text_for_this_warning = clean_line
-            
-            # Check the *next* line for compiling source information
-            consumed_next_line_for_compiling_source = False
-            if i + 1 < len(lines):
-                next_line_raw = lines[i+1].rstrip(' ')
-                # Clean the next line similarly (remove numeric prefix)
-                next_line_clean_for_compile_source = re.sub(r'^\\d+>\\s*', '', next_line_raw)
-                if has_compiling_source(next_line_clean_for_compile_source):
-                    extracted_source = extract_compiling_source(next_line_clean_for_compile_source)
-                    if extracted_source != "N/A":
-                        # Append the standard compiling source format to the warning text
-                        warning_text_for_this_warning += f" (compiling source file '{extracted_source}')"
-                        print(f"[LOG] ({filename} line {i+2}) Appended compiling source from next line: '{extracted_source}' to warning from line {i+1}")
-                        consumed_next_line_for_compiling_source = True
-            
-            print(f"[LOG] ({filename} line {i+1}) detected new warning: key={key_tuple}, text={warning_text_for_this_warning}")
-            warnings.append((key_tuple, warning_text_for_this_warning.strip()))
-            
-            # Advance index 'i'
-            if consumed_next_line_for_compiling_source:
-                i += 1 # Skip the consumed compiling source line
-            i += 1 # Move past the current warning line
+        clean_line = prefix_pattern.sub('', line)
+
+        if pending_key is not None:
+            key_tuple, warning_text_for_this_warning = pending_key, pending_text
+            pending_key = pending_text = None
+            # Check this line for compiling source information of the previous warning
+            if has_compiling_source(clean_line):
+                extracted_source = extract_compiling_source(clean_line)
+                if extracted_source != "N/A":
+                    # Append the standard compiling source format to the warning text
+                    warning_text_for_this_warning += f" (compiling source file '{extracted_source}')"
+                    if log_verbose:
+                        logger.log(log_utils.VERBOSE, "[LOG] (%s %s %s) Appended compiling source from next line: '%s' to warning from %s %s",
+                                   filename, location_label, where, extracted_source, location_label, pending_where)
+                        logger.log(log_utils.VERBOSE, "[LOG] (%s %s %s) detected new warning: key=%s, text=%s",
+                                   filename, location_label, pending_where, key_tuple, warning_text_for_this_warning.strip())
+                    warning_text_for_this_warning = warning_text_for_this_warning.strip()
+                    if accepts is None or accepts(key_tuple, warning_text_for_this_warning):
+                        yield key_tuple, warning_text_for_this_warning
+                    else:
+                        filtered += 1
+                    # The compiling source line is consumed by the warning
+                    continue
+            if log_verbose:
+                logger.log(log_utils.VERBOSE, "[LOG] (%s %s %s) detected new warning: key=%s, text=%s",
+                           filename, location_label, pending_where, key_tuple, warning_text_for_this_warning.strip())
+            warning_text_for_this_warning = warning_text_for_this_warning.strip()
+            if accepts is None or accepts(key_tuple, warning_text_for_this_warning):
+                yield key_tuple, warning_text_for_this_warning
+            else:
+                filtered += 1
+
+        # Check if the line matches one of the warning formats
+        key_tuple = match_warning(clean_line)
+        if key_tuple is not None:
+            regex_hits += 1
+            # Hold the warning until the next line has been seen
+            pending_key = key_tuple
+            pending_text = clean_line
+            pending_where = where
+
+    if pending_key is not None:
+        if log_verbose:
+            logger.log(log_utils.VERBOSE, "[LOG] (%s %s %s) detected new warning: key=%s, text=%s",
+                       filename, location_label, pending_where, pending_key, pending_text.strip())
+        pending_text = pending_text.strip()
+        if accepts is None or accepts(pending_key, pending_text):
+            yield pending_key, pending_text
         else:
-            # This line is not a new warning start, skip it.
-            i += 1
+            filtered += 1
+    log_utils.add_counts(lines_scanned=lines_scanned, regex_hits=regex_hits, warnings_filtered=filtered)
+
+def _iter_file_lines(filename, f):
+    """
+    Yield (line number, line) pairs from an open text file, stopping with an error
+    message if the file cannot be read.
+    """
+    try:
+        yield from enumerate(f, 1)
+    except Exception as e:
+        logger.error(f"Error reading log file '{filename}': {e}")
 
-    return warnings
\ No newline at end of file
+def _decode_segment(segment):
+    """
+    Decode a newline-terminated byte segment into text lines exactly as a text-mode
+    file opened with encoding='utf-8', errors='ignore' would return them, including
+    the translation of '\\r\\n' and lone '\\r' line endings to '\\n'.
+    """
+    text = segment.decode('utf-8', errors='ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    parts = text.split('\n')
+    lines = [part + '\n' for part in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+def _iter_candidate_lines(mm, begin=0, size=None):
+    """
+    Yield (byte offset, line) pairs for the lines of a memory-mapped log that can
+    contribute to a warning: every line containing WARNING_ANCHOR, plus the line
+    right after it (which may carry compiling source info). All other lines are
+    skipped with a byte search and never decoded.
+    Only the byte range [begin, size) is scanned; begin must be the start of a line.
+    """
+    if size is None:
+        size = len(mm)
+    pos = begin
+    follow = False
+    while pos < size:
+        if follow:
+            # The line after a candidate is always needed for the lookahead
+            start = pos
+            anchor = pos
+        else:
+            anchor = mm.find(WARNING_ANCHOR, pos, size)
+            if anchor == -1:
+                return
+            newline = mm.rfind(b'\n', pos, anchor)
+            start = newline + 1 if newline != -1 else pos
+        end = mm.find(b'\n', anchor, size)
+        end = size if end == -1 else end + 1
+        segment = mm[start:end]
+        for line in _decode_segment(segment):
+            yield start, line
+        follow = WARNING_ANCHOR in segment
+        pos = end
+
+def iter_warnings_mmap(filename, warning_filter=None):
+    """
+    Memory-mapped fast path for iter_warnings(). The log is mapped with mmap and
+    scanned for the warning anchor at byte level; only candidate lines and their
+    following line are decoded and run through the warning regex. Yields exactly
+    the same (key, warning_text) records as iter_warnings(). Falls back to the
+    streaming reader if the file cannot be memory-mapped or is compressed.
+    """
+    if os.path.exists(filename) and get_compressed_opener(filename) is not None:
+        yield from iter_warnings(filename, warning_filter=warning_filter)
+        return
+
+    try:
+        f = open(filename, 'rb')
+    except FileNotFoundError:
+        logger.error(f"Error: Log file '{filename}' not found.")
+        return
+    except Exception as e:
+        logger.error(f"Error reading log file '{filename}': {e}")
+        return
+
+    with f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped and contain no warnings
+            return
+        except (OSError, mmap.error):
+            yield from iter_warnings(filename, warning_filter=warning_filter)
+            return
+        with mm:
+            yield from _join_warnings(filename, _iter_candidate_lines(mm), "offset", warning_filter)
+
+def _next_chunk_start(mm, pos):
+    """
+    Return the first line start at or after byte pos whose line is not a "compiling
+    source file" line, or len(mm) if there is none.
+    """
+    size = len(mm)
+    if pos > 0:
+        newline = mm.find(b'\n', pos - 1)
+        pos = size if newline == -1 else newline + 1
+    while pos < size:
+        end = mm.find(b'\n', pos)
+        end = size if end == -1 else end + 1
+        if not has_compiling_source(mm[pos:end].decode('utf-8', errors='ignore')):
+            return pos
+        pos = end
+    return size
+
+def split_log(filename, chunk_count, min_chunk_size=PARALLEL_MIN_CHUNK_SIZE):
+    """
+    Split an uncompressed log into at most chunk_count byte ranges (start, end) of
+    at least about min_chunk_size bytes, for parsing in parallel with
+    iter_warnings_range(). Every range starts at the beginning of a line, and never
+    at a "compiling source file" line: the line after the last warning of a range can
+    then never be joined to it, so parsing the ranges one after another gives exactly
+    the warnings of a serial parse, in the same order.
+    Returns a single range for small, compressed or unmappable logs.
+    """
+    size = os.path.getsize(filename)
+    chunk_count = max(1, min(chunk_count, size // max(1, min_chunk_size)))
+    if chunk_count == 1 or get_compressed_opener(filename) is not None:
+        return [(0, size)]
+    bounds = [0]
+    try:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for index in range(1, chunk_count):
+                start = _next_chunk_start(mm, max(size * index // chunk_count, bounds[-1] + 1))
+                if start >= size:
+                    break
+                bounds.append(start)
+    except (OSError, ValueError, mmap.error):
+        return [(0, size)]
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def iter_warnings_range(filename, start, end, warning_filter=None):
+    """
+    Yield the (key, warning_text) tuples of the byte range [start, end) of an
+    uncompressed log, scanned like iter_warnings_mmap(). The range should come
+    from split_log(), so that no warning is split from its compiling source line.
+    """
+    try:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _join_warnings(filename, _iter_candidate_lines(mm, start, end), "offset", warning_filter)
+    except (OSError, ValueError, mmap.error) as e:
+        logger.error(f"Error reading log file '{filename}': {e}")
+
+def iter_warnings(filename, use_mmap=False, warning_filter=None):
+    """
+    Stream warning messages from the log file, yielding one (key, warning_text)
+    tuple at a time in log order. The file is read in buffered chunks and only
+    one line of lookahead is kept for the "compiling source file" join, so memory
+    use does not grow with the size of the log.
+    key is a tuple (file path, line number, column number, warning code),
+    and warning_text is the complete warning message.
+    If use_mmap is True, the memory-mapped scanner iter_warnings_mmap() is used.
+    Compressed logs (.gz, .bz2, .xz) are decompressed on the fly.
+    If warning_filter (a warning_filter.WarningFilter) is given, only the warnings
+    it accepts are yielded.
+    """
+    if use_mmap:
+        yield from iter_warnings_mmap(filename, warning_filter)
+        return
+
+    try:
+        f = open_log(filename)
+    except FileNotFoundError:
+        logger.error(f"Error: Log file '{filename}' not found.")
+        return
+    except Exception as e:
+        logger.error(f"Error reading log file '{filename}': {e}")
+        return
+
+    with f:
+        yield from _join_warnings(filename, _iter_file_lines(filename, f), warning_filter=warning_filter)
+
+def iter_warnings_from_lines(filename, lines, warning_filter=None):
+    """
+    Yield (key, warning_text) tuples from an iterable of log lines instead of a file,
+    e.g. the lines of a log that is still being written. filename is only used in
+    log messages. A warning is yielded once the line after it has been seen.
+    """
+    yield from _join_warnings(filename, enumerate(lines, 1), warning_filter=warning_filter)
+
+def parse_warnings(filename, use_mmap=False):
+    """
+    Parse warning messages from the log file and return a list.
+    Each element in the list is a tuple (key, warning_text),
+    where key is a tuple (file path, line number, column number, warning code),
+    and warning_text is the complete warning message.
+    Prefer iter_warnings() for large logs, which does not build the list.
+    """
+    return list(iter_warnings(filename, use_mmap))
@@ -0,0 +1,394 @@
+"""
+Compact warning counts: the file paths, line and column numbers and codes of the
+warning keys of a log are stored once in a string table, and every distinct key is
+a row of integer string IDs in array columns. A warning text that starts with its
+own location ("<file>(<line>,<column>): warning ") is stored as the ID of the rest
+of the text, which is shared by all warnings with the same code, message and project.
+The project path and compiling source file of every distinct text are extracted
+once, when the text is first counted, and kept with its ID (see info_of()).
+
+WarningCounts is a read-only mapping key -> count and WarningTexts a mapping
+key -> first warning text, so they can be used wherever the dicts returned by
+comparison.count_warnings() were used. comparison.diff_counts() compares two
+WarningCounts on their integer keys and only builds key tuples for the warnings
+whose count increased.
+"""
+import sys
+from array import array
+from collections.abc import Mapping
+
+import warning_parser
+
+# Bits of every string ID in a packed key; a packed key holds four string IDs
+KEY_ID_BITS = 32
+
+# Approximate bytes of the objects of one entry of the packed key -> row dict:
+# the packed key and the row number (the dict's own slots are in its getsizeof())
+_ROW_ENTRY_SIZE = sys.getsizeof(1 << (4 * KEY_ID_BITS - 1)) + sys.getsizeof(1 << 30)
+
+class StringTable:
+    """
+    Strings stored once, each with an integer ID (its index in strings).
+    """
+    __slots__ = ("strings", "ids", "size", "infos")
+
+    def __init__(self, strings=None):
+        self.strings = list(strings or [])
+        self.ids = {string: index for index, string in enumerate(self.strings)}
+        # Bytes of the string objects, see memory_size()
+        self.size = sum(map(sys.getsizeof, self.strings))
+        # ID of a warning text -> (project path ID, compiling source file ID), see describe()
+        self.infos = {}
+
+    def intern(self, string):
+        """
+        Return the ID of string, adding it to the table if needed.
+        """
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+            self.size += sys.getsizeof(string)
+        return string_id
+
+    def describe(self, text_id):
+        """
+        Extract the project path and compiling source file of the warning text with
+        ID text_id, unless that was done before. Returns their IDs.
+        """
+        info = self.infos.get(text_id)
+        if info is None:
+            project, source = warning_parser.extract_warning_info(self.strings[text_id])
+            info = self.infos[text_id] = (self.intern(project), self.intern(source))
+        return info
+
+    def memory_size(self):
+        """
+        Return the approximate number of bytes held by the table.
+        """
+        return self.size + sys.getsizeof(self.strings) + sys.getsizeof(self.ids) + sys.getsizeof(self.infos)
+
+    def translate(self, other, add=False):
+        """
+        Return an array that maps the IDs of other to the IDs of the same strings in
+        this table. Strings missing here are added if add is True, otherwise mapped to -1.
+        """
+        if other is self:
+            return None
+        if add:
+            return array('q', (self.intern(string) for string in other.strings))
+        ids = self.ids
+        return array('q', (ids.get(string, -1) for string in other.strings))
+
+    def __getstate__(self):
+        # The ID dict is rebuilt on unpickling instead of being sent between processes
+        return self.strings, self.infos
+
+    def __setstate__(self, state):
+        self.strings, self.infos = state
+        self.ids = {string: index for index, string in enumerate(self.strings)}
+        self.size = sum(map(sys.getsizeof, self.strings))
+
+def _pack(file_id, line_id, column_id, code_id):
+    return ((file_id << KEY_ID_BITS | line_id) << KEY_ID_BITS | column_id) << KEY_ID_BITS | code_id
+
+class WarningCounts(Mapping):
+    """
+    Read-only map: warning key (file path, line number, column number, warning code)
+    -> number of occurrences, in first-seen order. Keys are rows of string IDs in a
+    StringTable that can be shared by several logs; the first text of every key is
+    kept if keep_details is True (see text_of() and info_of()).
+    """
+    __slots__ = ("strings", "keep_details", "rows", "files", "lines", "columns", "codes", "counts",
+                 "text_ids", "total")
+
+    # Text IDs at or above this mark a text stored whole; below it, the text is the
+    # location of the key followed by the string with that ID
+    WHOLE_TEXT = 1 << 31
+
+    def __init__(self, strings=None, keep_details=False):
+        self.strings = strings if strings is not None else StringTable()
+        self.keep_details = keep_details
+        # Packed key -> row
+        self.rows = {}
+        self.files = array('i')
+        self.lines = array('i')
+        self.columns = array('i')
+        self.codes = array('i')
+        self.counts = array('q')
+        # First text of every row as a text ID (see WHOLE_TEXT), -1 if details are not kept
+        self.text_ids = array('q')
+        self.total = 0
+
+    def _text_id(self, key, text):
+        if not self.keep_details or text is None:
+            return -1
+        head = f"{key[0]}({key[1]},{key[2]}): warning "
+        if text.startswith(head):
+            string_id = self.strings.intern(text[len(head):])
+            self.strings.describe(string_id)
+            return string_id
+        string_id = self.strings.intern(text)
+        self.strings.describe(string_id)
+        return self.WHOLE_TEXT + string_id
+
+    def text_of(self, row):
+        """
+        Return the first warning text of a row, or None if details are not kept.
+        """
+        text_id = self.text_ids[row]
+        if text_id < 0:
+            return None
+        strings = self.strings.strings
+        if text_id >= self.WHOLE_TEXT:
+            return strings[text_id - self.WHOLE_TEXT]
+        return f"{strings[self.files[row]]}({strings[self.lines[row]]},{strings[self.columns[row]]}): warning " \
+               f"{strings[text_id]}"
+
+    def info_of(self, row):
+        """
+        Return (project path, compiling source file) of the first warning text of a
+        row, as extracted when the text was counted ("N/A" for what it does not
+        have), or None if details are not kept.
+        """
+        text_id = self.text_ids[row]
+        if text_id < 0:
+            return None
+        if text_id >= self.WHOLE_TEXT:
+            text_id -= self.WHOLE_TEXT
+        strings = self.strings.strings
+        project_id, source_id = self.strings.describe(text_id)
+        return strings[project_id], strings[source_id]
+
+    def _add_row(self, packed, file_id, line_id, column_id, code_id, count, text_id):
+        row = len(self.counts)
+        self.rows[packed] = row
+        self.files.append(file_id)
+        self.lines.append(line_id)
+        self.columns.append(column_id)
+        self.codes.append(code_id)
+        self.counts.append(count)
+        self.text_ids.append(text_id)
+        return row
+
+    def add(self, key, text, count=1):
+        """
+        Count count occurrences of a warning; text is kept if it is the first of its key.
+        """
+        intern = self.strings.intern
+        filepath, line_no, column, code = key
+        file_id, line_id, column_id, code_id = intern(filepath), intern(line_no), intern(column), intern(code)
+        packed = _pack(file_id, line_id, column_id, code_id)
+        row = self.rows.get(packed)
+        if row is None:
+            self._add_row(packed, file_id, line_id, column_id, code_id, count, self._text_id(key, text))
+        else:
+            self.counts[row] += count
+        self.total += count
+
+    def count(self, warnings):
+        """
+        Count every (key, text) of an iterable of warnings, like add() for each.
+        """
+        ids = self.strings.ids
+        intern = self.strings.intern
+        infos, describe = self.strings.infos, self.strings.describe
+        rows = self.rows
+        counts = self.counts
+        append_file, append_line = self.files.append, self.lines.append
+        append_column, append_code = self.columns.append, self.codes.append
+        append_count, append_text = counts.append, self.text_ids.append
+        keep_details = self.keep_details
+        whole_text = self.WHOLE_TEXT
+        total = 0
+        for key, text in warnings:
+            total += 1
+            filepath, line_no, column, code = key
+            # Most strings are already interned; only new ones go through intern()
+            file_id = ids.get(filepath)
+            if file_id is None:
+                file_id = intern(filepath)
+            line_id = ids.get(line_no)
+            if line_id is None:
+                line_id = intern(line_no)
+            column_id = ids.get(column)
+            if column_id is None:
+                column_id = intern(column)
+            code_id = ids.get(code)
+            if code_id is None:
+                code_id = intern(code)
+            packed = ((file_id << KEY_ID_BITS | line_id) << KEY_ID_BITS | column_id) << KEY_ID_BITS | code_id
+            row = rows.get(packed)
+            if row is not None:
+                counts[row] += 1
+                continue
+            # New key: the same as _add_row() and _text_id(), inlined
+            rows[packed] = len(counts)
+            append_file(file_id)
+            append_line(line_id)
+            append_column(column_id)
+            append_code(code_id)
+            append_count(1)
+            if not keep_details or text is None:
+                append_text(-1)
+                continue
+            head = f"{filepath}({line_no},{column}): warning "
+            if text.startswith(head):
+                tail = text[len(head):]
+                text_id = ids.get(tail)
+                if text_id is None:
+                    text_id = intern(tail)
+                append_text(text_id)
+            else:
+                text_id = intern(text)
+                append_text(whole_text + text_id)
+            # Project and compiling source, once per distinct text
+            if text_id not in infos:
+                describe(text_id)
+        self.total += total
+
+    def merge(self, other):
+        """
+        Add the counts of other (e.g. the next byte range of the same log) to this
+        table. New keys are appended in other's order, and existing keys keep their text.
+        """
+        id_map = self.strings.translate(other.strings, add=True)
+        for row in range(len(other.counts)):
+            ids = (other.files[row], other.lines[row], other.columns[row], other.codes[row])
+            if id_map is not None:
+                ids = tuple(id_map[string_id] for string_id in ids)
+            packed = _pack(*ids)
+            own_row = self.rows.get(packed)
+            if own_row is None:
+                text_id = other.text_ids[row]
+                if id_map is not None and text_id >= 0:
+                    whole = text_id >= self.WHOLE_TEXT
+                    string_id = text_id - self.WHOLE_TEXT if whole else text_id
+                    # The project and compiling source come along, so they are not extracted again
+                    info = other.strings.infos.get(string_id)
+                    string_id = id_map[string_id]
+                    if info is not None and string_id not in self.strings.infos:
+                        self.strings.infos[string_id] = (id_map[info[0]], id_map[info[1]])
+                    text_id = self.WHOLE_TEXT + string_id if whole else string_id
+                self._add_row(packed, *ids, other.counts[row], text_id)
+            else:
+                self.counts[own_row] += other.counts[row]
+        self.total += other.total
+
+    def key_of(self, row):
+        """
+        Return the warning key tuple of a row.
+        """
+        strings = self.strings.strings
+        return (strings[self.files[row]], strings[self.lines[row]], strings[self.columns[row]],
+                strings[self.codes[row]])
+
+    def find(self, key):
+        """
+        Return the row of a warning key, or None.
+        """
+        ids = self.strings.ids
+        try:
+            filepath, line_no, column, code = key
+            packed = _pack(ids[filepath], ids[line_no], ids[column], ids[code])
+        except (KeyError, TypeError, ValueError):
+            return None
+        return self.rows.get(packed)
+
+    def counts_in(self, other):
+        """
+        Return an array with, for every row of this table, the count of the same key
+        in other (0 if other does not have it). Compares packed integer keys; if the
+        tables do not share a StringTable, the IDs of this table are translated once.
+        """
+        other_rows = other.rows
+        other_counts = other.counts
+        result = array('q', bytes(8 * len(self.counts)))
+        id_map = other.strings.translate(self.strings)
+        if id_map is None:
+            for packed, row in self.rows.items():
+                other_row = other_rows.get(packed)
+                if other_row is not None:
+                    result[row] = other_counts[other_row]
+            return result
+        for row in range(len(self.counts)):
+            ids = (id_map[self.files[row]], id_map[self.lines[row]], id_map[self.columns[row]],
+                   id_map[self.codes[row]])
+            if min(ids) < 0:
+                continue
+            other_row = other_rows.get(_pack(*ids))
+            if other_row is not None:
+                result[row] = other_counts[other_row]
+        return result
+
+    def memory_size(self):
+        """
+        Return the approximate number of bytes held by the table, without its StringTable.
+        """
+        columns = (self.files, self.lines, self.columns, self.codes, self.counts, self.text_ids)
+        return sys.getsizeof(self.rows) + len(self.rows) * _ROW_ENTRY_SIZE + sum(map(sys.getsizeof, columns))
+
+    def details(self):
+        """
+        Return the map key -> first warning text of this table.
+        """
+        return WarningTexts(self)
+
+    def __getitem__(self, key):
+        row = self.find(key)
+        if row is None:
+            raise KeyError(key)
+        return self.counts[row]
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def __iter__(self):
+        for row in range(len(self.counts)):
+            yield self.key_of(row)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getstate__(self):
+        # The packed key dict is rebuilt on unpickling instead of being sent between processes
+        return (self.strings, self.keep_details, self.files, self.lines, self.columns, self.codes, self.counts,
+                self.text_ids, self.total)
+
+    def __setstate__(self, state):
+        (self.strings, self.keep_details, self.files, self.lines, self.columns, self.codes, self.counts,
+         self.text_ids, self.total) = state
+        self.rows = {_pack(self.files[row], self.lines[row], self.columns[row], self.codes[row]): row
+                     for row in range(len(self.counts))}
+
+class WarningTexts(Mapping):
+    """
+    Read-only map: warning key -> first warning text, backed by a WarningCounts.
+    Empty if the table does not keep details.
+    """
+    __slots__ = ("table",)
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, key):
+        row = self.table.find(key) if self.table.keep_details else None
+        if row is None:
+            raise KeyError(key)
+        return self.table.text_of(row)
+
+    def info(self, key):
+        """
+        Return (project path, compiling source file) of the first text of a key
+        (see WarningCounts.info_of()), or None if the key or its text is missing.
+        """
+        row = self.table.find(key) if self.table.keep_details else None
+        return None if row is None else self.table.info_of(row)
+
+    def __iter__(self):
+        if self.table.keep_details:
+            yield from self.table
+
+    def __len__(self):
+        return len(self.table) if self.table.keep_details else 0